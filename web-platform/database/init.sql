@@ -29,7 +29,8 @@ CREATE TYPE display_type AS ENUM ('standard', 'multi_file', 'reading', 'testgen'
 -- 提交状态
 CREATE TYPE submission_status AS ENUM (
     'pending', 'running', 'accepted', 'wrong_answer',
-    'compile_error', 'runtime_error', 'time_limit_exceeded', 'system_error'
+    'compile_error', 'runtime_error', 'time_limit_exceeded', 'output_limit_exceeded',
+    'system_error'
 );
 
 -- 难度级别
@@ -175,10 +176,10 @@ CREATE TABLE judge_configs (
     main_file VARCHAR(100),
     compile_cmd TEXT,
     expected_output TEXT,
-    grader_code TEXT,
+    grader_code TEXT,  -- 判题服务不使用（评测程序由 config 的 grader 选择）
     test_cases JSONB DEFAULT '[]',
-    time_limit_ms INT NOT NULL DEFAULT 5000,
-    memory_limit_mb INT NOT NULL DEFAULT 256,
+    time_limit_ms INT,  -- NULL 表示使用判题服务的默认限制
+    memory_limit_mb INT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
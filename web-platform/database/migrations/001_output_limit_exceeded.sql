@@ -0,0 +1,6 @@
+-- ============================================================
+-- 提交状态增加 output_limit_exceeded（输出超限）
+-- init.sql 已包含该状态；在此之前创建的数据库执行一次即可，可重复执行
+-- ============================================================
+
+ALTER TYPE submission_status ADD VALUE IF NOT EXISTS 'output_limit_exceeded' AFTER 'time_limit_exceeded';
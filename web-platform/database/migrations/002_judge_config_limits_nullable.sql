@@ -0,0 +1,24 @@
+-- ============================================================
+-- judge_configs.time_limit_ms / memory_limit_mb 改为可空：NULL 表示使用判题服务的默认限制，
+-- 只有管理员明确填写的值才覆盖内置配置
+-- 旧版本中这两列 NOT NULL DEFAULT 5000 / 256，无法区分默认值和明确填写的值；
+-- 升级时（列仍为 NOT NULL）把等于旧默认值的行改为 NULL，之后重复执行不再修改数据
+-- ============================================================
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'judge_configs' AND column_name = 'time_limit_ms' AND is_nullable = 'NO'
+    ) THEN
+        ALTER TABLE judge_configs ALTER COLUMN time_limit_ms DROP NOT NULL, ALTER COLUMN time_limit_ms DROP DEFAULT;
+        UPDATE judge_configs SET time_limit_ms = NULL WHERE time_limit_ms = 5000;
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'judge_configs' AND column_name = 'memory_limit_mb' AND is_nullable = 'NO'
+    ) THEN
+        ALTER TABLE judge_configs ALTER COLUMN memory_limit_mb DROP NOT NULL, ALTER COLUMN memory_limit_mb DROP DEFAULT;
+        UPDATE judge_configs SET memory_limit_mb = NULL WHERE memory_limit_mb = 256;
+    END IF;
+END $$;
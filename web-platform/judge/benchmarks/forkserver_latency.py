@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Fork Server Latency Benchmark - 比较单个测试用例的执行耗时
+
+用法:
+    python3 web-platform/judge/benchmarks/forkserver_latency.py
+    python3 web-platform/judge/benchmarks/forkserver_latency.py --cases 500 --json /tmp/forkserver.json
+
+分别用两种方式运行同一个小程序（io_test 题目的典型规模）：
+    exec        run_command，每个用例启动一次程序（当前默认方式）
+    forkserver  程序链接桩代码后只启动一次，每个用例 fork 一次
+输出每个用例耗时的平均值 / 中位数 / p95（毫秒）
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+JUDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 与 code_grade_judge 题目规模相当的程序
+PROGRAM = (
+    '#include <stdio.h>\n'
+    'int main(void) {\n'
+    '  int n;\n'
+    '  if (scanf("%d", &n) != 1) return 1;\n'
+    '  puts(n >= 90 ? "A" : n >= 80 ? "B" : n >= 70 ? "C" : n >= 60 ? "D" : "F");\n'
+    '  return 0;\n'
+    '}\n'
+)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(1000 * sum(samples) / len(samples), 3),
+        "p50_ms": round(1000 * samples[len(samples) // 2], 3),
+        "p95_ms": round(1000 * samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较 exec 与 fork server 两种方式的单用例耗时")
+    parser.add_argument("--judge-dir", default=JUDGE_DIR, help="判题代码目录")
+    parser.add_argument("--cases", type=int, default=200, help="每种方式运行的用例数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.judge_dir))
+    import run_job
+    from forkserver import ForkServer, forkserver_object
+
+    stub = forkserver_object()
+    if stub is None:
+        print("无法编译 fork server 桩代码")
+        return 1
+
+    work_dir = tempfile.mkdtemp(prefix="forkserver_bench_")
+    try:
+        with open(os.path.join(work_dir, "grade.c"), "w") as f:
+            f.write(PROGRAM)
+        subprocess.run(["gcc", "-o", "main", "-std=gnu99", "grade.c", stub], cwd=work_dir, check=True)
+        inputs = ["{}\n".format(i % 101) for i in range(args.cases)]
+
+        exec_samples = []
+        for data in inputs:
+            started = time.perf_counter()
+            run_job.run_command(["./main"], timeout=5, cwd=work_dir, input_data=data)
+            exec_samples.append(time.perf_counter() - started)
+
+        server = ForkServer("./main", work_dir)
+        started = time.perf_counter()
+        if not server.start():
+            print("fork server 启动失败")
+            return 1
+        startup = time.perf_counter() - started
+        fork_samples = []
+        try:
+            for data in inputs:
+                started = time.perf_counter()
+                server.run(data, 5)
+                fork_samples.append(time.perf_counter() - started)
+        finally:
+            server.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "cases": args.cases,
+        "exec": summarize(exec_samples),
+        "forkserver": dict(summarize(fork_samples), startup_ms=round(1000 * startup, 3)),
+    }
+    print("{:<12} {:>10} {:>10} {:>10}".format("mode", "mean_ms", "p50_ms", "p95_ms"))
+    for mode in ("exec", "forkserver"):
+        r = results[mode]
+        print("{:<12} {:>10} {:>10} {:>10}".format(mode, r["mean_ms"], r["p50_ms"], r["p95_ms"]))
+    print("fork server 启动耗时: {} ms".format(results["forkserver"]["startup_ms"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
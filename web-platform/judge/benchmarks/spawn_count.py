@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Spawn Count Benchmark - 统计每次判题创建的进程数
+
+用法（在仓库根目录执行，题目资源即仓库根目录下的各题目录）:
+    python3 web-platform/judge/benchmarks/spawn_count.py
+    python3 web-platform/judge/benchmarks/spawn_count.py --judge-dir /tmp/old/web-platform/judge 02_code1 08_testing
+
+对比改动前后：用 git worktree 检出旧版本，分别以 --judge-dir 指向两个版本运行
+默认关闭编译缓存和判题结果缓存，保证每次都真正编译、运行
+
+输出的每一列：
+    popen   判题代码直接调用 subprocess 的次数
+    shell   其中经过 /bin/sh 的次数（每次多一个 shell 进程）
+    forks   内核 fork 计数的增量（/proc/stat，包含 gcc、make 等的子进程，受系统上其他进程影响）
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+JUDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(os.path.dirname(JUDGE_DIR))
+
+# 提交内容：列表为从题目资源目录复制的参考答案，字典为直接写入的源文件
+SUBMISSIONS = {
+    "00_hello": {"hello.txt": "hello\n"},
+    "04_compile": ["04_compile/hello.c"],
+    "02_code1": ["02_code1/code1.c"],
+    "03_code2": ["03_code2/code2.c"],
+    "05_squares": ["05_squares/squares.c"],
+    "06_rect": ["06_rect/rectangle.c"],
+    "11_read_ptr1": ["11_read_ptr1/answer.txt"],
+    "14_array_max": ["14_array_max/arrayMax.c"],
+    "08_testing": ["08_testing/input.1", "08_testing/input.2", "08_testing/input.3", "08_testing/input.4"],
+    "16_subseq": ["16_subseq/maxSeq.c"],
+    "c2prj1_cards": ["c2prj1_cards/cards.c", "c2prj1_cards/cards.h"],
+    "10_gdb": ["10_gdb/input.txt"],
+    "code_grade_judge": {
+        "grade.c": '#include <stdio.h>\n'
+                   'int main(void){int n;scanf("%d",&n);'
+                   'puts(n>=90?"A":n>=80?"B":n>=70?"C":n>=60?"D":"F");return 0;}\n'
+    },
+}
+
+
+class SpawnCounter:
+    """统计 subprocess 创建的进程"""
+
+    def __init__(self):
+        self.popen = 0
+        self.shell = 0
+        self._orig = subprocess.Popen.__init__
+
+    def install(self):
+        counter = self
+        orig = self._orig
+
+        def counting_init(popen, *args, **kwargs):
+            counter.popen += 1
+            if kwargs.get("shell"):
+                counter.shell += 1
+            return orig(popen, *args, **kwargs)
+
+        subprocess.Popen.__init__ = counting_init
+
+    def reset(self):
+        self.popen = 0
+        self.shell = 0
+
+
+def kernel_forks():
+    """系统启动以来创建的进程总数"""
+    with open("/proc/stat", "r") as f:
+        for line in f:
+            if line.startswith("processes "):
+                return int(line.split()[1])
+    return 0
+
+
+def make_submission(problem_id, files, resource_dir):
+    work_dir = tempfile.mkdtemp(prefix="spawn_{}_".format(problem_id))
+    if isinstance(files, dict):
+        for name, content in files.items():
+            with open(os.path.join(work_dir, name), "w") as f:
+                f.write(content)
+    else:
+        for path in files:
+            shutil.copy(os.path.join(resource_dir, path), work_dir)
+    return work_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计每次判题创建的进程数")
+    parser.add_argument("problems", nargs="*", help="只运行指定题目（默认全部）")
+    parser.add_argument("--judge-dir", default=JUDGE_DIR, help="判题代码目录（用于对比不同版本）")
+    parser.add_argument("--resource-dir", default=REPO_ROOT, help="题目资源目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每道题重复次数")
+    parser.add_argument("--with-cache", action="store_true", help="开启编译缓存和判题结果缓存")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if not args.with_cache:
+        os.environ["JUDGE_CACHE_ENABLED"] = "0"
+        os.environ["JUDGE_VERDICT_CACHE"] = "0"
+    sys.path.insert(0, os.path.abspath(args.judge_dir))
+    import run_job
+
+    counter = SpawnCounter()
+    counter.install()
+
+    results = {}
+    print("{:<18} {:<14} {:>6} {:>6} {:>6} {:>8}".format("problem", "status", "popen", "shell", "forks", "ms"))
+    for problem_id, files in SUBMISSIONS.items():
+        if args.problems and problem_id not in args.problems:
+            continue
+        runs = []
+        for _ in range(args.repeat):
+            work_dir = make_submission(problem_id, files, args.resource_dir)
+            try:
+                counter.reset()
+                forks_before = kernel_forks()
+                started = time.time()
+                result = run_job.judge_submission(problem_id, work_dir, args.resource_dir)
+                elapsed_ms = int((time.time() - started) * 1000)
+                runs.append({
+                    "status": result["status"],
+                    "popen": counter.popen,
+                    "shell": counter.shell,
+                    "forks": kernel_forks() - forks_before,
+                    "ms": elapsed_ms,
+                })
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        best = min(runs, key=lambda r: r["forks"])
+        results[problem_id] = best
+        print("{:<18} {:<14} {:>6} {:>6} {:>6} {:>8}".format(
+            problem_id, best["status"], best["popen"], best["shell"], best["forks"], best["ms"]))
+
+    totals = {field: sum(r[field] for r in results.values()) for field in ("popen", "shell", "forks")}
+    print("{:<18} {:<14} {:>6} {:>6} {:>6}".format("TOTAL", "", totals["popen"], totals["shell"], totals["forks"]))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"judge_dir": os.path.abspath(args.judge_dir), "problems": results, "totals": totals}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+Judge Throughput Benchmark - 判题吞吐量与延迟
+
+用法（在仓库根目录执行，题目资源即仓库根目录下的各题目录）:
+    python3 web-platform/judge/benchmarks/throughput.py --concurrency 4 --json /tmp/throughput.json
+    python3 web-platform/judge/benchmarks/throughput.py --problems 02_code1 c2prj1_cards --variants correct timeout
+    python3 web-platform/judge/benchmarks/throughput.py --url http://localhost:9090 --workspace-base /workspace
+    python3 web-platform/judge/benchmarks/throughput.py --compare /tmp/before.json --json /tmp/after.json
+
+对判题配置中的每道题（内置配置及 JUDGE_CONFIG_SNAPSHOT）生成几种提交，按 --concurrency 并发判题：
+    correct        参考答案（题目资源目录中的文件；io_test 题生成按输入查表输出的程序）
+    wrong          输出错误（文本答案改为错误内容，C 程序在 main 之前把标准输出重定向到 /dev/null）
+    compile_error  C 源文件末尾追加语法错误
+    timeout        C 程序在 main 之前进入死循环
+    fork_bomb      C 程序在 main 之前不停 fork（以 root 运行且未配置 JUDGE_CGROUP_ROOT 时进程数没有限制，
+                   需要加 --allow-fork-bomb 才会运行）
+没有 C 源文件的题目（文本答案、阅读题等）跳过后三种
+
+两种方式：
+    默认      进程池中直接调用 run_job.judge_submission
+    --url     向 server.py 的 /judge 接口提交（提交文件写入 --workspace-base，需与判题服务共享），
+              结果中服务端返回的 metrics 按字段取平均
+两种方式都按判题结果 metrics.phases_ms 统计各阶段耗时：prep（准备工作空间、覆盖提交）、
+compile（gcc / make）、run（运行程序）、compare（比较输出，含运行时的流式比较）；
+阶段耗时为各线程之和，并发运行测试点时可能大于判题耗时
+默认给每个 C 源文件加上不同的注释，避免编译缓存 / 判题结果缓存命中（--repeat-identical 关闭）
+结果以 JSON 输出（--json），--compare 与之前的结果对比延迟和吞吐量
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+JUDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(os.path.dirname(JUDGE_DIR))
+
+VARIANTS = ("correct", "wrong", "compile_error", "timeout", "fork_bomb")
+DEFAULT_VARIANTS = ("correct", "wrong", "compile_error", "timeout")
+PHASES = ("prep", "compile", "run", "compare")
+
+C_SUFFIXES = (".c", ".h")
+
+# 追加到 C 源文件末尾的代码（构造函数在 main 之前运行，评测程序 #include 学生代码时同样生效）
+WRONG_SUFFIX = '''
+#include <stdio.h>
+__attribute__((constructor)) static void judge_bench_wrong(void) {
+  if (freopen("/dev/null", "w", stdout) == NULL) {
+    return;
+  }
+}
+'''
+COMPILE_ERROR_SUFFIX = "\nint judge_bench_compile_error = ;\n"
+TIMEOUT_SUFFIX = '''
+__attribute__((constructor)) static void judge_bench_spin(void) {
+  volatile unsigned long n = 0;
+  for (;;) {
+    n++;
+  }
+}
+'''
+FORK_BOMB_SUFFIX = '''
+#include <unistd.h>
+__attribute__((constructor)) static void judge_bench_fork_bomb(void) {
+  for (;;) {
+    fork();
+  }
+}
+'''
+C_SUFFIX = {
+    "wrong": WRONG_SUFFIX,
+    "compile_error": COMPILE_ERROR_SUFFIX,
+    "timeout": TIMEOUT_SUFFIX,
+    "fork_bomb": FORK_BOMB_SUFFIX,
+}
+
+
+# ============================================================
+# 生成提交 (Synthetic Submissions)
+# ============================================================
+
+def c_string(text):
+    """Python 字符串转为 C 字符串字面量"""
+    out = []
+    for byte in text.encode():
+        ch = chr(byte)
+        if ch in '\\"':
+            out.append("\\" + ch)
+        elif ch == "\n":
+            out.append("\\n")
+        elif 32 <= byte < 127:
+            out.append(ch)
+        else:
+            out.append("\\{:03o}".format(byte))
+    return '"' + "".join(out) + '"'
+
+
+def lookup_program(test_cases, wrong=False):
+    """io_test 题的参考答案：读入全部标准输入，按测试用例查表输出"""
+    inputs = ",\n  ".join(c_string(tc.get("input", "")) for tc in test_cases)
+    outputs = ",\n  ".join(c_string("wrong\n" if wrong else tc.get("expected", "")) for tc in test_cases)
+    return (
+        "#include <stdio.h>\n"
+        "#include <string.h>\n"
+        "static const char * const inputs[] = {\n  " + inputs + "\n};\n"
+        "static const char * const outputs[] = {\n  " + outputs + "\n};\n"
+        "int main(void) {\n"
+        "  static char buf[65536];\n"
+        "  size_t n = fread(buf, 1, sizeof(buf) - 1, stdin);\n"
+        "  buf[n] = '\\0';\n"
+        "  for (size_t i = 0; i < sizeof(inputs) / sizeof(inputs[0]); i++) {\n"
+        "    if (strcmp(buf, inputs[i]) == 0) {\n"
+        "      fputs(outputs[i], stdout);\n"
+        "      return 0;\n"
+        "    }\n"
+        "  }\n"
+        "  return 1;\n"
+        "}\n"
+    )
+
+
+def submission_names(config):
+    """提交的文件名（与前端提交的文件一致）"""
+    names = config.get("filenames") or config.get("files")
+    if names:
+        return list(names)
+    name = config.get("filename") or config.get("answer_file")
+    return [name] if name else []
+
+
+def correct_submission(problem_id, config, resource_dir):
+    """参考答案 {文件名: 内容}；无法生成时返回 None"""
+    if config.get("type") == "io_test":
+        return {config["filename"]: lookup_program(config.get("test_cases", []))}
+    if config.get("type") == "text_exact":
+        return {config["filename"]: config["expected"] + "\n"}
+    files = {}
+    for name in submission_names(config):
+        path = os.path.join(resource_dir, problem_id, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r", errors="replace") as f:
+            files[name] = f.read()
+    return files or None
+
+
+def make_submission(problem_id, config, resource_dir, variant):
+    """生成一种提交 {文件名: 内容}；该题不适用时返回 None"""
+    files = correct_submission(problem_id, config, resource_dir)
+    if files is None or variant == "correct":
+        return files
+    if variant == "wrong" and config.get("type") == "io_test":
+        return {config["filename"]: lookup_program(config.get("test_cases", []), wrong=True)}
+    sources = [name for name in files if name.endswith(".c")]
+    if variant == "wrong":
+        if sources:
+            files[sources[0]] += C_SUFFIX["wrong"]
+        else:
+            files = {name: "wrong\n" for name in files}
+        return files
+    if not sources:
+        return None
+    files[sources[0]] += C_SUFFIX[variant]
+    return files
+
+
+def unique_submission(files, nonce):
+    """给 C 源文件加上不同的注释，使每次提交的内容都不相同"""
+    return {name: content + "\n/* bench {} */\n".format(nonce) if name.endswith(C_SUFFIXES) else content
+            for name, content in files.items()}
+
+
+def fork_bomb_contained():
+    """fork_bomb 提交的进程数是否有限制（非 root 时 RLIMIT_NPROC 生效，或配置了 cgroup）"""
+    return os.geteuid() != 0 or bool(os.environ.get("JUDGE_CGROUP_ROOT"))
+
+
+# ============================================================
+# 直接调用 (Direct Mode)
+# ============================================================
+
+_run_job = None
+
+
+def _init_worker(judge_dir):
+    """工作进程初始化：导入判题代码"""
+    global _run_job
+    sys.path.insert(0, os.path.abspath(judge_dir))
+    import run_job
+    _run_job = run_job
+
+
+def result_phases(result):
+    """判题结果 metrics 中的各阶段耗时（毫秒），没有时返回 None"""
+    phases = (result.get("metrics") or {}).get("phases_ms")
+    if not phases:
+        return None
+    return {phase: phases.get(phase, 0) for phase in PHASES}
+
+
+def _judge_direct(task):
+    """在工作进程中判一次题，返回单次结果"""
+    problem_id, variant, files, resource_dir, work_root = task
+    work_dir = tempfile.mkdtemp(prefix="bench_", dir=work_root)
+    try:
+        for name, content in files.items():
+            with open(os.path.join(work_dir, name), "w") as f:
+                f.write(content)
+        started = time.perf_counter()
+        try:
+            result = _run_job.judge_submission(problem_id, work_dir, resource_dir)
+            status = result.get("status", "unknown")
+        except Exception as e:
+            result = {}
+            status = "error: {}".format(e)
+        latency = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    sample = {"problem_id": problem_id, "variant": variant, "status": status, "latency_ms": round(1000 * latency, 3)}
+    phases = result_phases(result)
+    if phases is not None:
+        sample["phases_ms"] = phases
+    return sample
+
+
+def _warm_worker(_):
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def run_direct(tasks, args):
+    """进程池中直接调用 judge_submission"""
+    work_root = tempfile.mkdtemp(prefix="judge_bench_")
+    try:
+        with ProcessPoolExecutor(max_workers=args.concurrency, initializer=_init_worker,
+                                 initargs=(args.judge_dir,)) as pool:
+            # 先让每个工作进程完成初始化（导入判题代码、准备题目模板），不计入结果
+            list(pool.map(_warm_worker, range(args.concurrency)))
+            started = time.perf_counter()
+            samples = list(pool.map(_judge_direct, [t + (args.resource_dir, work_root) for t in tasks]))
+            wall = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+    return samples, wall
+
+
+# ============================================================
+# HTTP 接口 (HTTP Mode)
+# ============================================================
+
+def _judge_http(url, workspace_base, problem_id, variant, files, timeout):
+    submission_id = "bench-{}".format(uuid.uuid4().hex)
+    work_dir = os.path.join(workspace_base, submission_id)
+    os.makedirs(work_dir)
+    try:
+        for name, content in files.items():
+            with open(os.path.join(work_dir, name), "w") as f:
+                f.write(content)
+        body = json.dumps({"problem_id": problem_id, "submission_id": submission_id}).encode()
+        request = urllib.request.Request(url.rstrip("/") + "/judge", data=body,
+                                         headers={"Content-Type": "application/json"})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                result = json.loads(response.read().decode())
+            status = result.get("status", "unknown")
+        except urllib.error.HTTPError as e:
+            result = {}
+            status = "rejected" if e.code == 503 else "http_{}".format(e.code)
+        except (urllib.error.URLError, OSError) as e:
+            result = {}
+            status = "error: {}".format(e)
+        latency = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    metrics = {k: v for k, v in (result.get("metrics") or {}).items() if isinstance(v, (int, float))}
+    sample = {"problem_id": problem_id, "variant": variant, "status": status,
+              "latency_ms": round(1000 * latency, 3), "server_metrics": metrics}
+    phases = result_phases(result)
+    if phases is not None:
+        sample["phases_ms"] = phases
+    return sample
+
+
+def run_http(tasks, args):
+    """并发向 /judge 接口提交"""
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        started = time.perf_counter()
+        futures = [pool.submit(_judge_http, args.url, args.workspace_base, problem_id, variant, files, args.timeout)
+                   for problem_id, variant, files in tasks]
+        samples = [f.result() for f in futures]
+        wall = time.perf_counter() - started
+    return samples, wall
+
+
+# ============================================================
+# 统计 (Statistics)
+# ============================================================
+
+def percentile(sorted_values, p):
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-p * len(sorted_values) // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def latency_summary(samples):
+    values = sorted(s["latency_ms"] for s in samples)
+    if not values:
+        return {}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+def status_counts(samples):
+    counts = defaultdict(int)
+    for s in samples:
+        counts[s["status"]] += 1
+    return dict(sorted(counts.items()))
+
+
+def mean_fields(dicts):
+    """各字段的平均值（只统计出现该字段的样本）"""
+    sums = defaultdict(float)
+    counts = defaultdict(int)
+    for d in dicts:
+        for key, value in d.items():
+            sums[key] += value
+            counts[key] += 1
+    return {key: round(sums[key] / counts[key], 3) for key in sorted(sums)}
+
+
+def summarize(samples, wall):
+    report = {
+        "submissions": len(samples),
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(samples) / wall, 3) if wall > 0 else None,
+        "latency_ms": latency_summary(samples),
+        "statuses": status_counts(samples),
+    }
+    phased = [s["phases_ms"] for s in samples if "phases_ms" in s]
+    if phased:
+        totals = {phase: round(sum(p[phase] for p in phased), 3) for phase in PHASES}
+        report["phases_ms"] = {"mean": mean_fields(phased), "total": totals}
+    served = [s["server_metrics"] for s in samples if s.get("server_metrics")]
+    if served:
+        report["server_metrics_mean"] = mean_fields(served)
+
+    for key in ("problem_id", "variant"):
+        groups = defaultdict(list)
+        for s in samples:
+            groups[s[key]].append(s)
+        report["by_" + key.replace("_id", "")] = {
+            name: dict({"latency_ms": latency_summary(group), "statuses": status_counts(group)},
+                       **({"phases_ms": mean_fields([s["phases_ms"] for s in group])} if phased else {}))
+            for name, group in sorted(groups.items())
+        }
+    return report
+
+
+def git_revision(path):
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True, timeout=10)
+        return res.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report):
+    lat = report["latency_ms"]
+    print("提交 {} 次, 耗时 {} s, 吞吐量 {} 次/秒".format(report["submissions"], report["wall_s"], report["throughput_per_s"]))
+    print("延迟 (ms): p50 {} / p95 {} / p99 {} / max {}".format(lat.get("p50"), lat.get("p95"), lat.get("p99"), lat.get("max")))
+    if "phases_ms" in report:
+        print("各阶段平均 (ms): " + ", ".join("{} {}".format(k, v) for k, v in report["phases_ms"]["mean"].items()))
+    print("结果: " + ", ".join("{} {}".format(k, v) for k, v in report["statuses"].items()))
+    print()
+    print("{:<20} {:>6} {:>10} {:>10} {:>10}  {}".format("problem", "count", "p50_ms", "p95_ms", "p99_ms", "statuses"))
+    for name, group in report["by_problem"].items():
+        g = group["latency_ms"]
+        print("{:<20} {:>6} {:>10} {:>10} {:>10}  {}".format(
+            name, g["count"], g["p50"], g["p95"], g["p99"],
+            ", ".join("{} {}".format(k, v) for k, v in group["statuses"].items())))
+
+
+def print_comparison(old, new):
+    """与之前的结果对比"""
+    print()
+    print("与 {} ({}) 对比:".format(old.get("git_revision"), old.get("started_at")))
+    rows = [("throughput_per_s", old.get("throughput_per_s"), new.get("throughput_per_s"))]
+    for p in ("p50", "p95", "p99"):
+        rows.append(("latency_" + p + "_ms", old.get("latency_ms", {}).get(p), new.get("latency_ms", {}).get(p)))
+    for phase in PHASES:
+        rows.append(("phase_" + phase + "_ms", old.get("phases_ms", {}).get("mean", {}).get(phase),
+                     new.get("phases_ms", {}).get("mean", {}).get(phase)))
+    for name, before, after in rows:
+        if before is None or after is None:
+            continue
+        change = "{:+.1f}%".format(100.0 * (after - before) / before) if before else "-"
+        print("  {:<20} {:>10} -> {:<10} {}".format(name, before, after, change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="判题吞吐量与延迟基准")
+    parser.add_argument("--judge-dir", default=JUDGE_DIR, help="判题代码目录")
+    parser.add_argument("--resource-dir", default=REPO_ROOT, help="题目资源目录")
+    parser.add_argument("--problems", nargs="*", help="只测试这些题目（默认全部已配置的题目）")
+    parser.add_argument("--variants", nargs="*", choices=VARIANTS, default=list(DEFAULT_VARIANTS), help="提交种类")
+    parser.add_argument("--allow-fork-bomb", action="store_true", help="进程数没有限制时也运行 fork_bomb 提交")
+    parser.add_argument("--rounds", type=int, default=1, help="每种提交重复的次数")
+    parser.add_argument("--concurrency", type=int, default=2, help="并发判题数")
+    parser.add_argument("--repeat-identical", action="store_true", help="不加注释，重复提交相同内容（测试缓存命中）")
+    parser.add_argument("--url", help="判题服务地址（如 http://localhost:9090），不指定时直接调用 judge_submission")
+    parser.add_argument("--workspace-base", default="/workspace", help="--url 时写入提交文件的目录（判题服务的 /workspace）")
+    parser.add_argument("--timeout", type=float, default=120, help="--url 时单次请求的超时（秒）")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", help="与之前 --json 写出的结果对比")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.judge_dir))
+    from run_job import get_config_store
+    configs = get_config_store().current().configs
+
+    problems = args.problems or list(configs)
+    variants = list(args.variants)
+    skipped = []
+    if "fork_bomb" in variants and not args.allow_fork_bomb and not fork_bomb_contained():
+        variants.remove("fork_bomb")
+        skipped.append({"variant": "fork_bomb", "reason": "以 root 运行且未配置 JUDGE_CGROUP_ROOT，进程数没有限制"})
+
+    tasks = []
+    nonce = 0
+    for _ in range(args.rounds):
+        for problem_id in problems:
+            config = configs.get(problem_id)
+            if config is None:
+                skipped.append({"problem_id": problem_id, "reason": "未配置的题目"})
+                continue
+            for variant in variants:
+                files = make_submission(problem_id, config, args.resource_dir, variant)
+                if files is None:
+                    if _ == 0:
+                        skipped.append({"problem_id": problem_id, "variant": variant, "reason": "该题不适用"})
+                    continue
+                if not args.repeat_identical:
+                    nonce += 1
+                    files = unique_submission(files, "{}-{}".format(os.getpid(), nonce))
+                tasks.append((problem_id, variant, files))
+    if not tasks:
+        print("没有可运行的提交")
+        return 1
+
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    samples, wall = run_http(tasks, args) if args.url else run_direct(tasks, args)
+
+    report = {
+        "started_at": started_at,
+        "git_revision": git_revision(args.judge_dir),
+        "mode": "http" if args.url else "direct",
+        "concurrency": args.concurrency,
+        "rounds": args.rounds,
+        "variants": variants,
+        "unique_submissions": not args.repeat_identical,
+        "cpus": os.cpu_count(),
+    }
+    report.update(summarize(samples, wall))
+    report["skipped"] = skipped
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            print_comparison(json.load(f), report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
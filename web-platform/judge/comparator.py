@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Judge Comparator - 流式输出比较
+程序的标准输出边读取边与期望输出比较，期望输出按需从文件（或配置中的字符串）读取，
+发现第一处不同时立即返回，调用方可以马上终止程序，不必等它运行结束、也不必保存完整输出
+比较方式（题目配置中的 "compare"）：
+    exact       完全相同（\\r\\n 和单独的 \\r 视为 \\n）
+    whitespace  忽略整个输出末尾的空白（与两边 rstrip() 后比较相同）
+    token       按空白切分后逐个单词比较（空白的数量和种类不影响结果）
+    float       同 token，两边都是数字时允许 "float_tolerance" 以内的绝对误差或相对误差
+"""
+
+import io
+import math
+import time
+
+# ============================================================
+# 比较配置 (Comparator Configuration)
+# ============================================================
+
+COMPARE_MODES = ("exact", "whitespace", "token", "float")
+DEFAULT_FLOAT_TOLERANCE = 1e-6
+
+# 每次从期望输出文件读取的字节数
+READ_SIZE = 65536
+
+WHITESPACE = b" \t\n\r\v\f"
+
+# 差异说明中期望 / 实际片段的最大长度
+SNIPPET_BYTES = 40
+
+
+def _snippet(data):
+    return data[:SNIPPET_BYTES].decode(errors="replace")
+
+
+class _Newlines:
+    """把 \\r\\n 和单独的 \\r 转换为 \\n（数据块末尾的 \\r 留到下一块再处理）"""
+
+    def __init__(self):
+        self.cr = False
+
+    def feed(self, data):
+        if self.cr:
+            data = b"\r" + data
+            self.cr = False
+        if data.endswith(b"\r"):
+            data = data[:-1]
+            self.cr = True
+        return data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+    def finish(self):
+        data = b"\n" if self.cr else b""
+        self.cr = False
+        return data
+
+
+class ExpectedStream:
+    """按需读取期望输出（文件路径或字符串），换行符已统一"""
+
+    def __init__(self, path=None, text=None):
+        self.file = open(path, "rb") if path is not None else io.BytesIO((text or "").encode())
+        self.newlines = _Newlines()
+        self.buffer = b""
+        self.eof = False
+
+    def read(self, n):
+        """读取至多 n 字节（只有到达末尾时少于 n 字节）"""
+        while len(self.buffer) < n and not self.eof:
+            chunk = self.file.read(READ_SIZE)
+            if chunk:
+                self.buffer += self.newlines.feed(chunk)
+            else:
+                self.buffer += self.newlines.finish()
+                self.eof = True
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+# ============================================================
+# 比较器 (Comparators)
+# ============================================================
+
+class StreamComparator:
+    """
+    流式比较器基类：feed() 依次传入程序输出的数据块，已发现不同时返回 False（之后的数据不再比较）；
+    输出结束后调用 finish() 得到最终结果，describe() 返回第一处不同的说明
+    elapsed 为 feed() / finish() 中比较所用的时间合计（秒）
+    """
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.newlines = _Newlines()
+        self.ok = True
+        self.mismatch = None
+        self.finished = False
+        self.elapsed = 0.0
+
+    def feed(self, data):
+        if self.ok:
+            started = time.time()
+            self._compare(self.newlines.feed(data), final=False)
+            self.elapsed += time.time() - started
+        return self.ok
+
+    def finish(self):
+        if not self.finished:
+            started = time.time()
+            self.finished = True
+            if self.ok:
+                self._compare(self.newlines.finish(), final=True)
+            self.expected.close()
+            self.elapsed += time.time() - started
+        return self.ok
+
+    def _compare(self, data, final):
+        raise NotImplementedError
+
+    def _fail(self, where, expected, actual):
+        self.ok = False
+        self.mismatch = (where, expected, actual)
+
+    def describe(self):
+        """第一处不同的说明（用于判题日志），相同时返回 None"""
+        if self.mismatch is None:
+            return None
+        where, expected, actual = self.mismatch
+        if not actual:
+            return "{}: 输出提前结束, 期望 {!r}".format(where, expected)
+        if not expected:
+            return "{}: 输出比期望多 {!r}".format(where, actual)
+        return "{}: 期望 {!r}, 实际 {!r}".format(where, expected, actual)
+
+
+class ExactComparator(StreamComparator):
+    """逐字节比较"""
+
+    def __init__(self, expected):
+        super().__init__(expected)
+        self.line = 1
+
+    def _compare_bytes(self, data):
+        expected = self.expected.read(len(data))
+        if expected == data:
+            self.line += data.count(b"\n")
+            return
+        i = 0
+        while i < len(expected) and expected[i] == data[i]:
+            i += 1
+        self._fail("第 {} 行".format(self.line + data.count(b"\n", 0, i)), _snippet(expected[i:]), _snippet(data[i:]))
+
+    def _compare(self, data, final):
+        self._compare_bytes(data)
+        if final and self.ok:
+            rest = self.expected.read(SNIPPET_BYTES)
+            if rest:
+                self._fail("第 {} 行".format(self.line), _snippet(rest), "")
+
+
+class WhitespaceComparator(ExactComparator):
+    """忽略输出末尾空白的逐字节比较：空白先暂存，后面出现非空白字符时再参与比较"""
+
+    def __init__(self, expected):
+        super().__init__(expected)
+        self.held = b""
+
+    def _compare(self, data, final):
+        data = self.held + data
+        stripped = data.rstrip(WHITESPACE)
+        self.held = b"" if final else data[len(stripped):]
+        self._compare_bytes(stripped)
+        if final and self.ok:
+            # 期望输出剩余部分只能是空白
+            while True:
+                rest = self.expected.read(READ_SIZE)
+                if not rest:
+                    break
+                if rest.strip(WHITESPACE):
+                    self._fail("第 {} 行".format(self.line), _snippet(rest.lstrip(WHITESPACE)), "")
+                    break
+
+
+class TokenComparator(StreamComparator):
+    """按空白切分后逐个单词比较"""
+
+    def __init__(self, expected):
+        super().__init__(expected)
+        self.partial = b""
+        self.expected_tokens = []
+        self.expected_partial = b""
+        self.count = 0
+
+    def _next_expected(self):
+        """期望输出的下一个单词，没有时返回 None"""
+        while not self.expected_tokens:
+            chunk = self.expected.read(READ_SIZE)
+            if not chunk:
+                if not self.expected_partial:
+                    return None
+                self.expected_tokens.append(self.expected_partial)
+                self.expected_partial = b""
+                break
+            data = self.expected_partial + chunk
+            tokens = data.split()
+            self.expected_partial = b""
+            if tokens and not data[-1:].isspace():
+                self.expected_partial = tokens.pop()
+            self.expected_tokens.extend(reversed(tokens))
+        return self.expected_tokens.pop()
+
+    def _match(self, expected, actual):
+        return expected == actual
+
+    def _compare(self, data, final):
+        data = self.partial + data
+        tokens = data.split()
+        self.partial = b""
+        if not final and tokens and not data[-1:].isspace():
+            # 最后一个单词可能还没有输出完整
+            self.partial = tokens.pop()
+        for token in tokens:
+            self.count += 1
+            expected = self._next_expected()
+            if expected is None or not self._match(expected, token):
+                self._fail("第 {} 个单词".format(self.count), _snippet(expected or b""), _snippet(token))
+                return
+        if final:
+            expected = self._next_expected()
+            if expected is not None:
+                self._fail("第 {} 个单词".format(self.count + 1), _snippet(expected), "")
+
+
+class FloatComparator(TokenComparator):
+    """逐个单词比较，两边都能解析为数字时按误差比较"""
+
+    def __init__(self, expected, tolerance=DEFAULT_FLOAT_TOLERANCE):
+        super().__init__(expected)
+        self.tolerance = tolerance
+
+    def _match(self, expected, actual):
+        if expected == actual:
+            return True
+        try:
+            e, a = float(expected), float(actual)
+        except ValueError:
+            return False
+        if math.isnan(e) or math.isnan(a):
+            return math.isnan(e) and math.isnan(a)
+        if math.isinf(e) or math.isinf(a):
+            return e == a
+        return abs(a - e) <= self.tolerance or abs(a - e) <= self.tolerance * abs(e)
+
+
+def make_comparator(mode, expected_file=None, expected=None, tolerance=DEFAULT_FLOAT_TOLERANCE):
+    """
+    创建比较器：期望输出为文件 expected_file 或字符串 expected
+    mode 不在 COMPARE_MODES 中时抛出 ValueError；文件无法打开时抛出 OSError
+    """
+    if mode not in COMPARE_MODES:
+        raise ValueError("Unknown compare mode: {}".format(mode))
+    stream = ExpectedStream(path=expected_file, text=expected if expected_file is None else None)
+    if mode == "exact":
+        return ExactComparator(stream)
+    if mode == "whitespace":
+        return WhitespaceComparator(stream)
+    if mode == "token":
+        return TokenComparator(stream)
+    return FloatComparator(stream, tolerance)
+
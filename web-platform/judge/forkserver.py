@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Judge Fork Server - 测试用例的 fork 执行模式
+学生程序额外链接一个很小的桩代码（构造函数，在 main 之前运行）：
+设置了 JUDGE_FORKSERVER_SPEC 时程序启动后不进入 main，而是等待请求，每个测试用例 fork 一个子进程，
+子进程把收到的管道作为标准输入输出后继续执行 main；动态链接、libc 初始化只在启动时做一次
+没有设置环境变量时桩代码直接返回，程序行为与普通编译完全一致（可随时退回普通执行）
+"""
+
+import os
+import time
+import uuid
+import select
+import socket
+import shutil
+import struct
+import hashlib
+import threading
+import subprocess
+
+from judge_cache import gcc_version
+from workspace import TEMPLATE_ROOT
+from sandbox import SANDBOX_LIMITS, communicate, comparison_fields, decode_output, limit_preexec, kill_group, usage_fields
+
+# ============================================================
+# Fork Server 配置 (Fork Server Configuration)
+# ============================================================
+
+# 执行模式：exec 每个测试用例启动一次程序；forkserver 启动一次后按用例 fork
+# 题目配置中的 exec_mode 优先于环境变量
+EXEC_MODE = os.environ.get("JUDGE_EXEC_MODE", "exec")
+EXEC_FORKSERVER = "forkserver"
+
+# 等待桩代码就绪的时间（秒）；超时说明程序没有链接桩代码或启动失败，退回普通执行
+FORKSERVER_START_TIMEOUT = 2
+
+# 桩代码：通过 UNIX socket 接收请求（1 字节 + SCM_RIGHTS 传递的标准输入 / 输出 / 错误管道），
+# 回复依次为子进程 pid，以及子进程结束后的 waitpid 状态、用户态 / 内核态 CPU 毫秒数、峰值内存 KB（各 4 字节，本机字节序）
+FORKSERVER_STUB = r'''#include <errno.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/resource.h>
+#include <sys/socket.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static int judge_fs_write(int fd, const void * buf, size_t n) {
+  const char * p = buf;
+  while (n > 0) {
+    ssize_t w = write(fd, p, n);
+    if (w < 0 && errno == EINTR) {
+      continue;
+    }
+    if (w <= 0) {
+      return -1;
+    }
+    p += w;
+    n -= w;
+  }
+  return 0;
+}
+
+static int judge_fs_recv(int sock, int fds[3]) {
+  char cmd;
+  struct iovec iov = {&cmd, 1};
+  union {
+    struct cmsghdr header;
+    char buf[CMSG_SPACE(3 * sizeof(int))];
+  } control;
+  struct msghdr msg;
+  memset(&msg, 0, sizeof(msg));
+  msg.msg_iov = &iov;
+  msg.msg_iovlen = 1;
+  msg.msg_control = control.buf;
+  msg.msg_controllen = sizeof(control.buf);
+  ssize_t r;
+  while ((r = recvmsg(sock, &msg, 0)) < 0 && errno == EINTR) {
+  }
+  if (r != 1) {
+    return -1;
+  }
+  struct cmsghdr * c = CMSG_FIRSTHDR(&msg);
+  if (c == NULL || c->cmsg_type != SCM_RIGHTS || c->cmsg_len != CMSG_LEN(3 * sizeof(int))) {
+    return -1;
+  }
+  memcpy(fds, CMSG_DATA(c), 3 * sizeof(int));
+  return 0;
+}
+
+__attribute__((constructor)) static void judge_forkserver(void) {
+  const char * spec = getenv("JUDGE_FORKSERVER_SPEC");
+  int sock;
+  if (spec == NULL || sscanf(spec, "%d", &sock) != 1) {
+    return;
+  }
+  int32_t msg = getpid();
+  if (judge_fs_write(sock, &msg, sizeof(msg)) != 0) {
+    _exit(111);
+  }
+  for (;;) {
+    int fds[3];
+    if (judge_fs_recv(sock, fds) != 0) {
+      _exit(0);
+    }
+    pid_t pid = fork();
+    if (pid == 0) {
+      setpgid(0, 0);
+      for (int i = 0; i < 3; i++) {
+        if (dup2(fds[i], i) < 0) {
+          _exit(127);
+        }
+      }
+      for (int i = 0; i < 3; i++) {
+        if (fds[i] > 2) {
+          close(fds[i]);
+        }
+      }
+      close(sock);
+      unsetenv("JUDGE_FORKSERVER_SPEC");
+      return;
+    }
+    if (pid > 0) {
+      setpgid(pid, pid);
+    }
+    for (int i = 0; i < 3; i++) {
+      close(fds[i]);
+    }
+    msg = pid;
+    if (judge_fs_write(sock, &msg, sizeof(msg)) != 0) {
+      _exit(111);
+    }
+    if (pid < 0) {
+      continue;
+    }
+    int status = 0;
+    struct rusage usage;
+    while (wait4(pid, &status, 0, &usage) < 0 && errno == EINTR) {
+    }
+    int32_t done[4] = {
+      status,
+      (int32_t) (usage.ru_utime.tv_sec * 1000 + usage.ru_utime.tv_usec / 1000),
+      (int32_t) (usage.ru_stime.tv_sec * 1000 + usage.ru_stime.tv_usec / 1000),
+      (int32_t) usage.ru_maxrss
+    };
+    if (judge_fs_write(sock, done, sizeof(done)) != 0) {
+      _exit(111);
+    }
+  }
+}
+'''
+
+_stub_object = None
+_stub_lock = threading.Lock()
+
+
+def forkserver_object():
+    """
+    返回编译好的桩代码目标文件路径（按源码和 gcc 版本只编译一次，保存在模板目录下）
+    编译失败时返回 None
+    """
+    global _stub_object
+    with _stub_lock:
+        if _stub_object is not None and os.path.isfile(_stub_object):
+            return _stub_object
+        stamp = hashlib.sha256((gcc_version() + "\0" + FORKSERVER_STUB).encode()).hexdigest()[:16]
+        obj_dir = os.path.join(TEMPLATE_ROOT, "forkserver-{}".format(stamp))
+        obj_path = os.path.join(obj_dir, "forkserver.o")
+        if not os.path.isfile(obj_path):
+            tmp_dir = "{}.tmp-{}".format(obj_dir, uuid.uuid4().hex)
+            try:
+                os.makedirs(tmp_dir)
+                with open(os.path.join(tmp_dir, "forkserver.c"), "w") as f:
+                    f.write(FORKSERVER_STUB)
+                res = subprocess.run(["gcc", "-c", "-O2", "-o", "forkserver.o", "forkserver.c"],
+                                     cwd=tmp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+                if res.returncode != 0:
+                    return None
+                if not os.path.isdir(obj_dir):
+                    os.rename(tmp_dir, obj_dir)
+            except (OSError, subprocess.SubprocessError):
+                if not os.path.isfile(obj_path):
+                    return None
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        _stub_object = obj_path
+        return obj_path
+
+
+class ForkServer:
+    """
+    链接了桩代码的程序的 fork server 客户端（limits 为程序及其 fork 出的测试进程的资源限制）
+    start() 失败或 run() 返回 None 时调用方应退回普通执行（run_command）
+    同一时间只运行一个测试用例（多个线程调用 run() 时依次执行）
+    """
+
+    def __init__(self, program, cwd, limits=SANDBOX_LIMITS):
+        self.program = program
+        self.cwd = cwd
+        self.limits = limits
+        self.proc = None
+        self.sock = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """启动程序并等待桩代码就绪，成功返回 True"""
+        self.sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        env = dict(os.environ)
+        env["JUDGE_FORKSERVER_SPEC"] = str(child_sock.fileno())
+        try:
+            self.proc = subprocess.Popen(
+                [self.program], cwd=self.cwd, env=env, pass_fds=(child_sock.fileno(),),
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                start_new_session=True, preexec_fn=limit_preexec(self.limits)
+            )
+        except OSError:
+            self.close()
+            return False
+        finally:
+            child_sock.close()
+        if self._read_ints(1, FORKSERVER_START_TIMEOUT) is None:
+            self.close()
+            return False
+        return True
+
+    def _read_ints(self, count, timeout):
+        """从 socket 读取 count 个 4 字节整数；超时或连接关闭时返回 None"""
+        data = b""
+        deadline = time.time() + timeout
+        while len(data) < 4 * count:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            ready, _, _ = select.select([self.sock], [], [], remaining)
+            if not ready:
+                return None
+            chunk = self.sock.recv(4 * count - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return struct.unpack("{}i".format(count), data)
+
+    def run(self, input_data, timeout, comparator=None):
+        """
+        运行一个测试用例，返回与 run_command 相同格式的结果（comparator 与 run_command 相同）
+        fork server 已不可用时返回 None
+        """
+        with self.lock:
+            if self.proc is None:
+                return None
+            in_r, in_w = os.pipe()
+            out_r, out_w = os.pipe()
+            err_r, err_w = os.pipe()
+            try:
+                socket.send_fds(self.sock, [b"r"], [in_r, out_w, err_w])
+                reply = self._read_ints(1, FORKSERVER_START_TIMEOUT)
+            except OSError:
+                reply = None
+            finally:
+                for fd in (in_r, out_w, err_w):
+                    os.close(fd)
+            pid = reply[0] if reply is not None else 0
+            if pid <= 0:
+                for fd in (in_w, out_r, err_r):
+                    os.close(fd)
+                self.close()
+                return None
+
+            deadline = time.time() + timeout
+            stdout, stderr, stopped = communicate(in_w, out_r, err_r, (input_data or "").encode(), deadline,
+                                                  stdout_sink=comparator.feed if comparator is not None else None)
+            done = None if stopped is not None else self._read_ints(4, max(0, deadline - time.time()))
+            if done is None:
+                if stopped is None:
+                    stopped = "timeout"
+                kill_group(pid)
+                # 等待桩代码回收子进程；仍没有回复说明 fork server 已不可用
+                done = self._read_ints(4, FORKSERVER_START_TIMEOUT)
+                if done is None:
+                    self.close()
+
+            if stopped == "timeout":
+                result = {
+                    "stdout": decode_output(stdout),
+                    "stderr": "Execution timed out after {} seconds".format(timeout),
+                    "exit_code": -1,
+                    "timeout": True,
+                    "output_limit_exceeded": False
+                }
+            else:
+                result = {"stdout": decode_output(stdout), "stderr": decode_output(stderr), "timeout": False,
+                          "output_limit_exceeded": stopped == "output_limit"}
+                result.update(usage_fields(*done) if done is not None else {"exit_code": -1})
+                if stopped == "output_limit":
+                    result["limit_exceeded"] = "output"
+            if comparator is not None:
+                result.update(comparison_fields(comparator, stopped))
+            return result
+
+    def close(self):
+        """关闭 fork server（socket 关闭后桩代码自行退出）"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self.proc is not None:
+            try:
+                self.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+            self.proc = None
+
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Judge Jobs - 异步判题任务
+提交后立即返回 job_id，结果和进度事件保存在内存中供轮询 / 长轮询 / SSE 查询，超过保留时间后清理
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# ============================================================
+# 任务配置 (Job Configuration)
+# ============================================================
+
+# 已完成任务的保留时间（秒）及内存中最多保留的任务数
+JOB_RETENTION_SECONDS = int(os.environ.get("JUDGE_JOB_RETENTION", "600"))
+JOB_MAX_ENTRIES = int(os.environ.get("JUDGE_JOB_MAX_ENTRIES", "5000"))
+
+# 长轮询单次最长等待时间（秒）
+JOB_MAX_WAIT = 30
+
+# 单个任务最多保留的进度事件数
+JOB_MAX_EVENTS = 500
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_FINISHED = "finished"
+JOB_FAILED = "failed"
+
+JOB_ACTIVE_STATES = (JOB_PENDING, JOB_RUNNING)
+
+
+class JobStore:
+    """
+    内存任务表
+    - 按创建顺序保存，超过保留时间或数量上限时淘汰最早的已结束任务
+    - 通过 Condition 支持长轮询等待任务结束 / 等待新的进度事件
+    """
+
+    def __init__(self, retention=JOB_RETENTION_SECONDS, max_entries=JOB_MAX_ENTRIES):
+        self.retention = retention
+        self.max_entries = max_entries
+        self.cond = threading.Condition()
+        self.jobs = OrderedDict()  # job_id -> job dict
+
+    def _prune(self):
+        """清理过期任务（调用方持有锁）；未结束的任务不会被清理"""
+        now = time.time()
+        for job_id in list(self.jobs):
+            job = self.jobs[job_id]
+            if job["state"] in JOB_ACTIVE_STATES:
+                continue
+            expired = now - job["finished_at"] > self.retention
+            if expired or len(self.jobs) > self.max_entries:
+                del self.jobs[job_id]
+
+    def create(self, problem_id, submission_id):
+        """创建任务记录，返回 job_id"""
+        job_id = uuid.uuid4().hex
+        with self.cond:
+            self._prune()
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "problem_id": problem_id,
+                "submission_id": submission_id,
+                "state": JOB_PENDING,
+                "created_at": time.time(),
+                "finished_at": None,
+                "result": None,
+                "events": [],
+                "seqs": set(),  # 已收到的进度事件的 seq
+            }
+        return job_id
+
+    def add_event(self, job_id, event):
+        """追加进度事件（工作进程上报），started 事件同时把任务标记为运行中"""
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None or job["state"] not in JOB_ACTIVE_STATES:
+                return
+            if event.get("type") == "started":
+                job["state"] = JOB_RUNNING
+            self._append_event(job, event)
+            self.cond.notify_all()
+
+    @staticmethod
+    def _append_event(job, event):
+        """追加一个事件（调用方持有锁），同一 seq 的事件只保留一次"""
+        seq = event.get("seq")
+        if seq is not None:
+            if seq in job["seqs"]:
+                return
+            job["seqs"].add(seq)
+        if len(job["events"]) < JOB_MAX_EVENTS:
+            job["events"].append(event)
+
+    def finish(self, job_id, result, state=JOB_FINISHED, events=()):
+        """
+        记录任务结果并唤醒等待者
+        events 为任务的全部进度事件（随判题结果返回），事件队列中尚未送达的事件在结束前补齐
+        """
+        with self.cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            for event in events:
+                self._append_event(job, event)
+            job["state"] = state
+            job["result"] = result
+            job["finished_at"] = time.time()
+            self.cond.notify_all()
+
+    def get(self, job_id, wait=0):
+        """
+        查询任务（返回不含进度事件的副本）
+        wait > 0 时长轮询：任务未结束则最多等待 wait 秒
+        """
+        deadline = time.time() + min(max(wait, 0), JOB_MAX_WAIT)
+        with self.cond:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return None
+                remaining = deadline - time.time()
+                if job["state"] not in JOB_ACTIVE_STATES or remaining <= 0:
+                    snapshot = dict(job)
+                    snapshot.pop("events")
+                    snapshot.pop("seqs")
+                    return snapshot
+                self.cond.wait(remaining)
+
+    def wait_events(self, job_id, cursor, wait):
+        """
+        等待 cursor 之后的新事件（供 SSE 推送）
+        返回 (新事件列表, 新 cursor, 任务快照)；任务不存在时返回 None
+        """
+        deadline = time.time() + wait
+        with self.cond:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return None
+                events = job["events"][cursor:]
+                remaining = deadline - time.time()
+                if events or job["state"] not in JOB_ACTIVE_STATES or remaining <= 0:
+                    snapshot = dict(job)
+                    snapshot.pop("events")
+                    snapshot.pop("seqs")
+                    return events, cursor + len(events), snapshot
+                self.cond.wait(remaining)
+
+    def stats(self):
+        """任务统计信息"""
+        with self.cond:
+            pending = sum(1 for job in self.jobs.values() if job["state"] == JOB_PENDING)
+            running = sum(1 for job in self.jobs.values() if job["state"] == JOB_RUNNING)
+            return {"retained": len(self.jobs), "pending": pending, "running": running, "retention_seconds": self.retention}
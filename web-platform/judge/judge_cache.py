@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+Judge Cache - 判题缓存
+按内容哈希缓存编译产物、判题结果和参考程序输出，重复提交相同代码时跳过 gcc / 整个判题流程
+"""
+
+import os
+import json
+import glob
+import fcntl
+import shlex
+import shutil
+import hashlib
+import threading
+import subprocess
+from contextlib import contextmanager
+
+# ============================================================
+# 缓存配置 (Cache Configuration)
+# ============================================================
+
+CACHE_ROOT = os.environ.get("JUDGE_CACHE_DIR", "/tmp/judge_cache")
+CACHE_ENABLED = os.environ.get("JUDGE_CACHE_ENABLED", "1") != "0"
+
+COMPILE_CACHE_MAX_BYTES = int(os.environ.get("JUDGE_COMPILE_CACHE_MB", "256")) * 1024 * 1024
+COMPILE_CACHE_MAX_ENTRIES = int(os.environ.get("JUDGE_COMPILE_CACHE_ENTRIES", "2000"))
+
+VERDICT_CACHE_ENABLED = os.environ.get("JUDGE_VERDICT_CACHE", "1") != "0"
+VERDICT_CACHE_MAX_BYTES = int(os.environ.get("JUDGE_VERDICT_CACHE_MB", "64")) * 1024 * 1024
+VERDICT_CACHE_MAX_ENTRIES = int(os.environ.get("JUDGE_VERDICT_CACHE_ENTRIES", "10000"))
+
+ORACLE_CACHE_MAX_BYTES = int(os.environ.get("JUDGE_ORACLE_CACHE_MB", "64")) * 1024 * 1024
+ORACLE_CACHE_MAX_ENTRIES = int(os.environ.get("JUDGE_ORACLE_CACHE_ENTRIES", "20000"))
+
+# 缓存超出容量限制时淘汰到限制的这一比例以下
+EVICT_LOW_WATER = 0.9
+
+# 编译命令中会影响产物的源文件后缀（命令中未显式出现的头文件/被 #include 的 .c 也算）
+SOURCE_SUFFIXES = (".c", ".h")
+
+
+# ============================================================
+# 工具函数 (Utility Functions)
+# ============================================================
+
+_gcc_version = None
+_gcc_version_lock = threading.Lock()
+
+
+def gcc_version():
+    """获取 gcc 版本字符串（进程内只查询一次）"""
+    global _gcc_version
+    with _gcc_version_lock:
+        if _gcc_version is None:
+            try:
+                res = subprocess.run(["gcc", "--version"], capture_output=True, text=True, timeout=10)
+                _gcc_version = res.stdout.splitlines()[0] if res.stdout else "unknown"
+            except Exception:
+                _gcc_version = "unknown"
+        return _gcc_version
+
+
+def file_digest(path):
+    """计算文件内容的 sha256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def parse_output_name(cmd):
+    """从编译命令中解析 -o 指定的输出文件名"""
+    tokens = shlex.split(cmd)
+    for i, tok in enumerate(tokens):
+        if tok == "-o" and i + 1 < len(tokens):
+            return tokens[i + 1]
+        if tok.startswith("-o") and len(tok) > 2:
+            return tok[2:]
+    return "a.out"
+
+
+def compile_inputs(cmd, cwd):
+    """
+    收集影响编译结果的输入文件：
+    命令中出现的文件（源文件、.o 文件）以及工作目录下所有 .c/.h 文件
+    """
+    output = parse_output_name(cmd)
+    names = set()
+    for tok in shlex.split(cmd):
+        if tok == output or tok.startswith("-"):
+            continue
+        if os.path.isfile(os.path.join(cwd, tok)):
+            names.add(tok)
+    for path in glob.glob(os.path.join(cwd, "*")):
+        name = os.path.basename(path)
+        if name.endswith(SOURCE_SUFFIXES) and os.path.isfile(path):
+            names.add(name)
+    return sorted(names)
+
+
+def tree_fingerprint(root, skip=()):
+    """
+    目录树指纹：相对路径 + 大小 + 修改时间（只 stat 不读内容）
+    资源目录内任何文件增删改都会改变指纹
+    """
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in skip)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            h.update("{}\0{}\0{}\n".format(os.path.relpath(path, root), st.st_size, st.st_mtime_ns).encode())
+    return h.hexdigest()
+
+
+def tree_digest(root, skip=()):
+    """目录树内容哈希：相对路径 + 文件内容"""
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in skip)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if not os.path.isfile(path):
+                continue
+            h.update(os.path.relpath(path, root).encode())
+            h.update(b"\0")
+            h.update(file_digest(path).encode())
+            h.update(b"\n")
+    return h.hexdigest()
+
+
+# ============================================================
+# 磁盘 LRU 缓存 (Disk LRU Cache)
+# ============================================================
+
+class DiskLRUCache:
+    """
+    基于目录的 LRU 缓存：每个条目为 <key>.json（元数据）+ 可选的 <key>.bin（产物）
+    按条目数和总字节数淘汰最久未使用的条目（以元数据文件的 mtime 为访问时间）
+    缓存目录由所有判题进程共享：写入和淘汰持有目录中 .lock 文件的排他锁，
+    目录的总字节数和条目数记录在 .usage 文件中，超出限制时重新扫描目录按访问时间淘汰，容量限制对所有进程整体生效
+    """
+
+    def __init__(self, name, max_bytes, max_entries):
+        self.name = name
+        self.root = os.path.join(CACHE_ROOT, name)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+        os.makedirs(self.root, exist_ok=True)
+        self.lock_path = os.path.join(self.root, ".lock")
+        self.usage_path = os.path.join(self.root, ".usage")
+        self._load_index()
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key)
+        return base + ".json", base + ".bin"
+
+    def _entry_size(self, key):
+        size = 0
+        for path in self._paths(key):
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return size
+
+    @contextmanager
+    def _shared_lock(self):
+        """缓存目录的跨进程排他锁（调用方同时持有 self.lock）"""
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_usage(self):
+        """读取 .usage 中记录的 (总字节数, 条目数)，文件不存在或损坏时返回 None"""
+        try:
+            with open(self.usage_path, "r") as f:
+                usage = json.load(f)
+            return int(usage["bytes"]), int(usage["entries"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_usage(self, total_bytes, entries):
+        """写入 .usage（调用方持有跨进程锁）"""
+        tmp_path = "{}.{}.tmp".format(self.usage_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump({"bytes": total_bytes, "entries": entries}, f)
+        os.replace(tmp_path, self.usage_path)
+
+    def _scan(self):
+        """扫描缓存目录，返回按访问时间排序的 [(key, 字节数)]"""
+        entries = []
+        for meta_path in glob.glob(os.path.join(self.root, "*.json")):
+            key = os.path.basename(meta_path)[:-len(".json")]
+            try:
+                entries.append((os.path.getmtime(meta_path), key))
+            except OSError:
+                continue
+        return [(key, self._entry_size(key)) for _, key in sorted(entries)]
+
+    def _load_index(self):
+        """启动时重新扫描目录并淘汰超出限制的条目（容器重启后缓存仍可用）"""
+        with self.lock, self._shared_lock():
+            self._evict()
+
+    def _evict(self):
+        """
+        重新扫描目录，超出容量限制时淘汰最久未使用的条目，并更新 .usage（调用方持有锁）
+        其他进程写入的条目也在扫描范围内；淘汰到限制的 EVICT_LOW_WATER 以下，
+        缓存写满后不必每次写入都重新扫描目录
+        """
+        entries = self._scan()
+        total_bytes = sum(size for _, size in entries)
+        count = len(entries)
+        max_entries, max_bytes = self.max_entries, self.max_bytes
+        if count > max_entries or total_bytes > max_bytes:
+            max_entries, max_bytes = int(max_entries * EVICT_LOW_WATER), int(max_bytes * EVICT_LOW_WATER)
+        for key, size in entries:
+            if count <= max_entries and total_bytes <= max_bytes:
+                break
+            total_bytes -= size
+            count -= 1
+            self.counters["evictions"] += 1
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._write_usage(total_bytes, count)
+
+    def _touch(self, key):
+        """标记为最近使用（更新元数据文件的 mtime，淘汰时按 mtime 恢复 LRU 顺序）"""
+        meta_path, _ = self._paths(key)
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+
+    def get(self, key, dst_path=None):
+        """
+        查询缓存，命中时返回元数据 dict
+        若提供 dst_path 则同时把产物复制到该路径
+        """
+        meta_path, bin_path = self._paths(key)
+        with self.lock:
+            try:
+                with open(meta_path, "r") as f:
+                    meta = json.load(f)
+                if dst_path is not None:
+                    tmp_path = dst_path + ".cache-tmp"
+                    shutil.copyfile(bin_path, tmp_path)
+                    os.chmod(tmp_path, 0o755)
+                    os.replace(tmp_path, dst_path)
+            except FileNotFoundError:
+                self.counters["misses"] += 1
+                return None
+            except Exception:
+                self.counters["errors"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._touch(key)
+            self.counters["hits"] += 1
+            return meta
+
+    def put(self, key, meta, src_path=None):
+        """写入缓存条目（先写临时文件再原子替换），写入后目录超出容量限制时淘汰最久未使用的条目"""
+        meta_path, bin_path = self._paths(key)
+        with self.lock, self._shared_lock():
+            existed = os.path.exists(meta_path)
+            old_size = self._entry_size(key)
+            try:
+                if src_path is not None:
+                    tmp_bin = "{}.{}.tmp".format(bin_path, os.getpid())
+                    shutil.copyfile(src_path, tmp_bin)
+                    os.replace(tmp_bin, bin_path)
+                tmp_meta = "{}.{}.tmp".format(meta_path, os.getpid())
+                with open(tmp_meta, "w") as f:
+                    json.dump(meta, f)
+                os.replace(tmp_meta, meta_path)
+            except Exception:
+                self.counters["errors"] += 1
+                return False
+            self.counters["stores"] += 1
+            try:
+                usage = self._read_usage()
+                if usage is None:
+                    self._evict()
+                    return True
+                total_bytes = usage[0] + self._entry_size(key) - old_size
+                entries = usage[1] + (0 if existed else 1)
+                if entries > self.max_entries or total_bytes > self.max_bytes:
+                    self._evict()
+                else:
+                    self._write_usage(total_bytes, entries)
+            except OSError:
+                self.counters["errors"] += 1
+            return True
+
+    def stats(self):
+        """缓存统计信息"""
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            stats = dict(self.counters)
+        # 整个缓存目录（所有进程）的用量
+        total_bytes, entries = self._read_usage() or (0, 0)
+        stats["entries"] = entries
+        stats["bytes"] = total_bytes
+        stats["max_bytes"] = self.max_bytes
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# ============================================================
+# 编译缓存 (Compile Cache)
+# ============================================================
+
+class CompileCache(DiskLRUCache):
+    """
+    编译产物缓存
+    key = sha256(gcc 版本, 编译命令, 各输入文件名及内容哈希)
+    """
+
+    def make_key(self, cmd, cwd, inputs=None):
+        """inputs 为影响编译结果的文件（默认见 compile_inputs）"""
+        h = hashlib.sha256()
+        h.update(gcc_version().encode())
+        h.update(b"\0")
+        h.update(cmd.encode())
+        for name in sorted(inputs) if inputs is not None else compile_inputs(cmd, cwd):
+            h.update(b"\0")
+            h.update(name.encode())
+            h.update(b"=")
+            h.update(file_digest(os.path.join(cwd, name)).encode())
+        return h.hexdigest()
+
+
+# ============================================================
+# 判题结果缓存 (Verdict Cache)
+# ============================================================
+
+class VerdictCache(DiskLRUCache):
+    """
+    整体判题结果缓存
+    key = sha256(判题器版本, 题目 ID, 题目配置, 提交文件内容, 资源目录指纹)
+    资源目录变化后指纹改变，旧条目自然失效并被 LRU 淘汰
+    """
+
+    def make_key(self, problem_id, config, work_dir, resource_dir, judger_version=""):
+        src_dir = os.path.join(resource_dir, problem_id)
+        h = hashlib.sha256()
+        for part in (
+            judger_version,
+            problem_id,
+            json.dumps(config, sort_keys=True),
+            tree_digest(work_dir, skip=("problem",)),
+            tree_fingerprint(src_dir) if os.path.isdir(src_dir) else "",
+        ):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+
+# ============================================================
+# 参考程序输出缓存 (Oracle Cache)
+# ============================================================
+
+class OracleCache(DiskLRUCache):
+    """
+    参考（正确）程序的输出缓存
+    key = sha256(程序内容哈希, 参数列表, 标准输入内容哈希)
+    参考程序的输出只取决于程序和输入，同一输入在所有提交之间只需运行一次
+    """
+
+    def make_key(self, program_path, args, stdin_data=b"", program_digest=None):
+        """program_digest 为已算好的程序内容哈希（同一程序查询多次时避免重复读取）"""
+        if isinstance(stdin_data, str):
+            stdin_data = stdin_data.encode()
+        h = hashlib.sha256()
+        for part in (
+            program_digest or file_digest(program_path),
+            json.dumps(list(args)),
+            hashlib.sha256(stdin_data).hexdigest(),
+        ):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+
+_compile_cache = None
+_compile_cache_lock = threading.Lock()
+_verdict_cache = None
+_verdict_cache_lock = threading.Lock()
+_oracle_cache = None
+_oracle_cache_lock = threading.Lock()
+
+
+def get_compile_cache():
+    """获取进程内共享的编译缓存（未启用时返回 None）"""
+    global _compile_cache
+    if not CACHE_ENABLED:
+        return None
+    with _compile_cache_lock:
+        if _compile_cache is None:
+            try:
+                _compile_cache = CompileCache("compile", COMPILE_CACHE_MAX_BYTES, COMPILE_CACHE_MAX_ENTRIES)
+            except OSError:
+                return None
+        return _compile_cache
+
+
+def get_verdict_cache():
+    """获取进程内共享的判题结果缓存（未启用时返回 None）"""
+    global _verdict_cache
+    if not (CACHE_ENABLED and VERDICT_CACHE_ENABLED):
+        return None
+    with _verdict_cache_lock:
+        if _verdict_cache is None:
+            try:
+                _verdict_cache = VerdictCache("verdict", VERDICT_CACHE_MAX_BYTES, VERDICT_CACHE_MAX_ENTRIES)
+            except OSError:
+                return None
+        return _verdict_cache
+
+
+def get_oracle_cache():
+    """获取进程内共享的参考程序输出缓存（未启用时返回 None）"""
+    global _oracle_cache
+    if not CACHE_ENABLED:
+        return None
+    with _oracle_cache_lock:
+        if _oracle_cache is None:
+            try:
+                _oracle_cache = OracleCache("oracle", ORACLE_CACHE_MAX_BYTES, ORACLE_CACHE_MAX_ENTRIES)
+            except OSError:
+                return None
+        return _oracle_cache
+
+
+def cache_stats():
+    """所有缓存的统计信息（供 /stats 接口使用）"""
+    stats = {"enabled": CACHE_ENABLED}
+    cache = get_compile_cache()
+    if cache is not None:
+        stats["compile"] = cache.stats()
+    cache = get_verdict_cache()
+    if cache is not None:
+        stats["verdict"] = cache.stats()
+    cache = get_oracle_cache()
+    if cache is not None:
+        stats["oracle"] = cache.stats()
+    return stats
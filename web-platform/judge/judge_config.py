@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Judge Config - 题目判题配置
+在内置配置（run_job.PROBLEM_CONFIG）之上叠加数据库 judge_configs 表的本地快照（JSON 文件或 SQLite 数据库），
+加载时逐条校验并预先计算每道题的运行限制（time_limit_ms / memory_limit_mb），得到只读的配置索引
+快照文件变化后在下一次取配置时重新加载，整体替换索引；正在判题的任务继续使用开始时取得的配置
+"""
+
+import os
+import re
+import sys
+import copy
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+
+from sandbox import SANDBOX_LIMITS
+from comparator import COMPARE_MODES
+
+# ============================================================
+# 配置来源 (Config Source)
+# ============================================================
+
+# judge_configs 表的快照：JSON 文件（行的数组，或 {"judge_configs": [...]}）或 SQLite 数据库（含 judge_configs 表）
+# 未设置时只使用内置配置
+CONFIG_SNAPSHOT = os.environ.get("JUDGE_CONFIG_SNAPSHOT", "")
+
+# 检查快照是否变化的最短间隔（秒）
+CONFIG_RELOAD_INTERVAL = float(os.environ.get("JUDGE_CONFIG_RELOAD_INTERVAL", "2"))
+
+# time_limit_ms / memory_limit_mb 的允许范围
+TIME_LIMIT_RANGE_MS = (100, 60000)
+MEMORY_LIMIT_RANGE_MB = (16, 4096)
+
+# 各题型必须具备的字段（括号内任选其一）
+TYPE_REQUIRED_FIELDS = {
+    "text_exact": (("filename",), ("expected",)),
+    "compile_run": (("filename",), ("expected_output",)),
+    "code_with_grader": (("grader",), ("filename", "filenames")),
+    "link_object": (("compile_cmd",), ("test_cases",)),
+    "makefile_project": (("expected_file",),),
+    "reading": (),
+    "project_with_test": (),
+    "testgen": (),
+    "testgen_multi": (("files",), ("broken_programs",)),
+    "testgen_advanced": (("correct_program",),),
+    "gdb_challenge": (),
+    "unittest_subseq": (),
+    "unittest": (),
+    "io_test": (("filename",), ("test_cases",)),
+}
+
+SQLITE_HEADER = b"SQLite format 3\0"
+
+
+class ConfigError(Exception):
+    """快照无法读取或格式错误"""
+
+
+# ============================================================
+# 快照读取 (Snapshot Loading)
+# ============================================================
+
+def _json_column(value, default):
+    """JSON 列：数据库导出的可能是字符串，也可能已解析"""
+    if value is None:
+        return default
+    if isinstance(value, (str, bytes)):
+        return json.loads(value) if value.strip() else default
+    return value
+
+
+def _column(row, name, camel):
+    """按列名（snake_case）或 Prisma 字段名（camelCase）取值"""
+    return row[name] if name in row else row.get(camel)
+
+
+def read_snapshot(path):
+    """读取快照，返回 (行列表, 版本号)；文件无法读取或格式错误时抛出 ConfigError"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        raise ConfigError("无法读取配置快照 {}: {}".format(path, e))
+    version = hashlib.sha256(data).hexdigest()[:12]
+
+    if data.startswith(SQLITE_HEADER):
+        try:
+            conn = sqlite3.connect("file:{}?mode=ro".format(path), uri=True)
+            try:
+                conn.row_factory = sqlite3.Row
+                rows = [dict(r) for r in conn.execute("SELECT * FROM judge_configs")]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            raise ConfigError("无法读取 SQLite 快照 {}: {}".format(path, e))
+        return rows, version
+
+    try:
+        rows = json.loads(data.decode())
+    except ValueError as e:
+        raise ConfigError("配置快照不是有效的 JSON: {}".format(e))
+    if isinstance(rows, dict):
+        rows = rows.get("judge_configs")
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        raise ConfigError("配置快照应为 judge_configs 行的数组")
+    return rows, version
+
+
+_TEXT_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "\\": "\\"}
+
+
+def decode_escapes(text):
+    """
+    文本列中的 \\n、\\t、\\r、\\\\ 按与 config 列 JSON 字符串相同的方式解码，其余反斜杠原样保留
+    （Postgres 的 'Hello World\\n' 存的是反斜杠和 n，解码后与内置配置及 config 列中的换行含义一致）
+    """
+    return re.sub(r"\\([ntr\\])", lambda m: _TEXT_ESCAPES[m.group(1)], text)
+
+
+def row_to_config(row, base):
+    """
+    judge_configs 的一行转换为题目配置：在 base（内置配置）之上依次叠加 config 列和各专用列
+    main_file -> filename（阅读题为 answer_file），expected_output（解码转义）-> expected / expected_output，
+    test_cases（非空时）、compile_cmd、time_limit_ms、memory_limit_mb 同名保存；
+    为空（NULL）的列不覆盖内置配置；grader_code 列不使用（评测程序由 config 列的 grader 选择）
+    """
+    config = copy.deepcopy(base) if base else {}
+    config.update(_json_column(_column(row, "config", "config"), {}))
+
+    main_file = _column(row, "main_file", "mainFile")
+    if main_file:
+        if config.get("type") == "reading":
+            config["answer_file"] = main_file
+        elif "filenames" not in config and "files" not in config:
+            config["filename"] = main_file
+    expected_output = _column(row, "expected_output", "expectedOutput")
+    if expected_output is not None:
+        config["expected" if config.get("type") == "text_exact" else "expected_output"] = decode_escapes(expected_output)
+    test_cases = _json_column(_column(row, "test_cases", "testCases"), [])
+    if test_cases:
+        config["test_cases"] = test_cases
+    for name, camel in (("compile_cmd", "compileCmd"), ("time_limit_ms", "timeLimitMs"), ("memory_limit_mb", "memoryLimitMb")):
+        value = _column(row, name, camel)
+        if value is not None:
+            config[name] = value
+    return config
+
+
+# ============================================================
+# 校验 (Validation)
+# ============================================================
+
+def _check_range(config, name, bounds, errors):
+    value = config.get(name)
+    if value is None:
+        return
+    if isinstance(value, bool) or not isinstance(value, int) or not bounds[0] <= value <= bounds[1]:
+        errors.append("{} 应为 {} 到 {} 之间的整数: {!r}".format(name, bounds[0], bounds[1], value))
+
+
+def validate_config(config, graders=None):
+    """校验题目配置，返回错误说明列表（为空表示有效）；graders 为已知的评测程序名称"""
+    errors = []
+    problem_type = config.get("type")
+    if problem_type not in TYPE_REQUIRED_FIELDS:
+        return ["未知题型: {!r}".format(problem_type)]
+    for alternatives in TYPE_REQUIRED_FIELDS[problem_type]:
+        if not any(config.get(name) for name in alternatives):
+            errors.append("缺少字段: {}".format(" / ".join(alternatives)))
+
+    if graders is not None and problem_type == "code_with_grader" and config.get("grader") not in graders:
+        errors.append("未知评测程序: {!r}".format(config.get("grader")))
+    if config.get("compare", "exact") not in COMPARE_MODES:
+        errors.append("未知比较方式: {!r}".format(config.get("compare")))
+    if not isinstance(config.get("policy", {}), dict):
+        errors.append("policy 应为对象")
+    _check_range(config, "time_limit_ms", TIME_LIMIT_RANGE_MS, errors)
+    _check_range(config, "memory_limit_mb", MEMORY_LIMIT_RANGE_MB, errors)
+
+    test_cases = config.get("test_cases", [])
+    if not isinstance(test_cases, list):
+        errors.append("test_cases 应为数组")
+    else:
+        for i, tc in enumerate(test_cases):
+            if not isinstance(tc, dict):
+                errors.append("测试 {} 应为对象".format(i + 1))
+            elif problem_type == "io_test" and not isinstance(tc.get("expected"), str):
+                errors.append("测试 {} 缺少 expected".format(i + 1))
+            elif problem_type == "link_object" and not isinstance(tc.get("expected_file"), str):
+                errors.append("测试 {} 缺少 expected_file".format(i + 1))
+    return errors
+
+
+def normalize_grader(config, graders):
+    """数据库中的评测程序名称可以省略 _grader 后缀（如 "code1"）"""
+    grader = config.get("grader")
+    if graders is not None and grader and grader not in graders and grader + "_grader" in graders:
+        config["grader"] = grader + "_grader"
+
+
+# ============================================================
+# 配置索引 (Config Index)
+# ============================================================
+
+class ConfigIndex:
+    """
+    一个版本的全部题目配置（加载后只读）
+    configs: problem_id -> 题目配置
+    time_limits: problem_id -> 学生程序单次运行的超时（秒），未配置 time_limit_ms 的题目没有
+    limits: problem_id -> 学生程序的资源限制（按 memory_limit_mb 调整的 SANDBOX_LIMITS）
+    """
+
+    def __init__(self, configs, version, source=None, errors=None, signature=None):
+        self.configs = configs
+        self.version = version
+        self.source = source
+        self.errors = errors or []
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.time_limits = {}
+        self.limits = {}
+        for problem_id, config in configs.items():
+            time_limit = config["time_limit_ms"] / 1000.0 if "time_limit_ms" in config else None
+            limits = dict(SANDBOX_LIMITS)
+            if "memory_limit_mb" in config:
+                limits["memory_mb"] = config["memory_limit_mb"]
+            if time_limit is not None:
+                # CPU 时间限制不能先于运行超时触发
+                limits["cpu_seconds"] = max(limits["cpu_seconds"], int(math.ceil(time_limit)) + 1)
+                self.time_limits[problem_id] = time_limit
+            self.limits[problem_id] = limits
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "source": self.source,
+            "problems": len(self.configs),
+            "loaded_at": int(self.loaded_at),
+            "errors": list(self.errors),
+        }
+
+
+def build_index(builtin, rows=None, version="builtin", source=None, previous=None, graders=None, signature=None):
+    """
+    由内置配置和快照的行生成配置索引
+    校验失败的行不生效：该题继续使用 previous 索引中的配置（没有时使用内置配置），错误记录在索引的 errors 中
+    """
+    configs = copy.deepcopy(builtin)
+    errors = []
+    for row in rows or []:
+        problem_id = _column(row, "problem_id", "problemId")
+        if not problem_id:
+            errors.append("缺少 problem_id 的行")
+            continue
+        try:
+            config = row_to_config(row, builtin.get(problem_id))
+            normalize_grader(config, graders)
+            problems = validate_config(config, graders)
+        except (ValueError, TypeError, AttributeError) as e:
+            problems = ["无法解析: {}".format(e)]
+        if problems:
+            errors.append("{}: {}".format(problem_id, "; ".join(problems)))
+            if previous is not None and problem_id in previous.configs:
+                configs[problem_id] = previous.configs[problem_id]
+            continue
+        configs[problem_id] = config
+    return ConfigIndex(configs, version, source=source, errors=errors, signature=signature)
+
+
+def snapshot_signature(path):
+    """快照文件的修改时间和大小（SQLite 同时检查 -wal 文件），文件不存在时返回 None"""
+    signature = []
+    for name in (path, path + "-wal"):
+        try:
+            st = os.stat(name)
+        except OSError:
+            continue
+        signature.append((name, st.st_mtime_ns, st.st_size))
+    return tuple(signature) or None
+
+
+class ConfigStore:
+    """
+    配置索引的持有者：current() 返回当前索引，快照变化时先完整加载、校验新索引，再替换引用
+    新快照无法读取时保留当前索引
+    """
+
+    def __init__(self, builtin, snapshot=CONFIG_SNAPSHOT, interval=CONFIG_RELOAD_INTERVAL, graders=None):
+        self.builtin = builtin
+        self.snapshot = snapshot
+        self.interval = interval
+        self.graders = graders
+        self.lock = threading.Lock()
+        self.index = build_index(builtin, graders=graders)
+        self.checked_at = 0.0
+        self.failed_signature = None
+        self.reloads = 0
+        self.load_error = None
+        if snapshot:
+            self.reload()
+
+    def current(self):
+        """当前配置索引（距上次检查超过 interval 秒时先检查快照是否变化）"""
+        if self.snapshot and time.time() - self.checked_at >= self.interval:
+            self.reload()
+        return self.index
+
+    def reload(self, force=False):
+        """快照变化（或 force）时重新加载，返回是否替换了索引"""
+        with self.lock:
+            self.checked_at = time.time()
+            signature = snapshot_signature(self.snapshot)
+            if signature is None:
+                self.load_error = "配置快照不存在: {}".format(self.snapshot)
+                return False
+            if not force and signature in (self.index.signature, self.failed_signature):
+                return False
+            try:
+                rows, version = read_snapshot(self.snapshot)
+            except ConfigError as e:
+                # 同一个有问题的快照只报告一次，文件再次变化时重试
+                self.failed_signature = signature
+                self.load_error = str(e)
+                print("[Judge Config] {}".format(e), file=sys.stderr)
+                return False
+            index = build_index(self.builtin, rows, version=version, source=self.snapshot,
+                                previous=self.index, graders=self.graders, signature=signature)
+            for error in index.errors:
+                print("[Judge Config] 配置无效，已忽略: {}".format(error), file=sys.stderr)
+            self.index = index
+            self.load_error = None
+            self.reloads += 1
+            return True
+
+    def stats(self):
+        stats = self.index.stats()
+        stats.update(reloads=self.reloads, load_error=self.load_error)
+        return stats
+
+
+# ============================================================
+# 快照检查 (Snapshot Check)
+# ============================================================
+
+# 导出的行中各列在数据库中未设置时的值（见 scripts/export-judge-configs.ts）
+SEED_ROW_DEFAULTS = {
+    "config": {},
+    "main_file": None,
+    "compile_cmd": None,
+    "expected_output": None,
+    "test_cases": [],
+    "time_limit_ms": None,
+    "memory_limit_mb": None,
+}
+
+
+def _sql_value(token):
+    """SQL 字面量：'...'（Postgres 标准字符串，'' 为单引号，反斜杠不转义）、NULL 或整数"""
+    if token.startswith("'"):
+        return token[1:-1].replace("''", "'")
+    if token.upper() == "NULL":
+        return None
+    return int(token)
+
+
+def read_seed_rows(sql_path):
+    """读取初始化脚本（database/init.sql）中插入 judge_configs 的行，按导出快照的格式返回"""
+    with open(sql_path, "r") as f:
+        sql = f.read()
+    rows = []
+    statements = re.finditer(r"INSERT INTO judge_configs \(([^)]*)\) VALUES(.*?);\s*$", sql, re.S | re.M)
+    for statement in statements:
+        columns = [name.strip() for name in statement.group(1).split(",")]
+        for values in re.findall(r"\(((?:'(?:[^']|'')*'|[^()'])*)\)", statement.group(2)):
+            row = copy.deepcopy(SEED_ROW_DEFAULTS)
+            row.update(zip(columns, [_sql_value(t) for t in re.findall(r"'(?:[^']|'')*'|[^,\s]+", values)]))
+            rows.append(row)
+    return rows
+
+
+def snapshot_changes(builtin, rows, graders=None):
+    """快照使内置配置发生的变化：返回说明列表（快照中无效的行、内置题目中取值不同的字段）"""
+    index = build_index(builtin, rows, graders=graders)
+    changes = ["配置无效: {}".format(error) for error in index.errors]
+    for problem_id in sorted(builtin):
+        before, after = builtin[problem_id], index.configs[problem_id]
+        for name in sorted(set(before) | set(after)):
+            if before.get(name) != after.get(name):
+                changes.append("{}.{}: {!r} -> {!r}".format(problem_id, name, before.get(name), after.get(name)))
+    return changes
+
+
+def main():
+    """
+    命令行：检查快照（或 --seed 指定的初始化脚本导出后的快照）是否改变了内置题目的配置，有变化时返回 1
+    用法: python3 judge_config.py /config/judge_configs.json
+          python3 judge_config.py --seed ../database/init.sql
+    """
+    import argparse
+    from run_job import PROBLEM_CONFIG, GRADERS
+
+    parser = argparse.ArgumentParser(description="检查 judge_configs 快照相对内置配置的变化")
+    parser.add_argument("snapshot", nargs="?", help="快照文件（JSON 或 SQLite）")
+    parser.add_argument("--seed", help="数据库初始化脚本，检查导出其中 judge_configs 数据得到的快照")
+    args = parser.parse_args()
+    if bool(args.snapshot) == bool(args.seed):
+        parser.error("需要指定快照文件或 --seed 之一")
+
+    try:
+        rows = read_seed_rows(args.seed) if args.seed else read_snapshot(args.snapshot)[0]
+    except (OSError, ValueError, ConfigError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    changes = snapshot_changes(PROBLEM_CONFIG, rows, graders=GRADERS)
+    for change in changes:
+        print(change)
+    print("{} 行，{} 处变化".format(len(rows), len(changes)))
+    return 1 if changes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Judge CPU - 判题服务的 CPU 配额
+容器可用的 CPU 数、判题进程数及其在流水线各阶段之间的分配，由调度器（scheduler.py）和判题核心（run_job.py）共用，
+判题核心不需要为此导入调度器
+"""
+
+import os
+import math
+
+# ============================================================
+# CPU 配额 (CPU Budget)
+# ============================================================
+
+
+def available_cpus():
+    """容器可用的 CPU 数（优先读取 cgroup v2 的 cpu.max 配额）"""
+    count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            count = min(count, max(1, int(math.ceil(int(quota) / int(period)))))
+    except (OSError, ValueError):
+        pass
+    return max(1, count)
+
+
+JUDGE_WORKERS = int(os.environ.get("JUDGE_WORKERS", "0")) or available_cpus()
+
+
+def default_stage_workers(workers=JUDGE_WORKERS):
+    """
+    各流水线阶段的进程数（可分别用 JUDGE_PREP_WORKERS / JUDGE_COMPILE_WORKERS / JUDGE_EXEC_WORKERS 覆盖）
+    编译和运行都是 CPU 密集的，两者合计 workers 个进程：编译占一半，运行占其余；
+    准备工作空间主要是文件操作，另占 workers 的四分之一
+    """
+    compile_workers = int(os.environ.get("JUDGE_COMPILE_WORKERS", "0")) or max(1, workers // 2)
+    return {
+        "prep": int(os.environ.get("JUDGE_PREP_WORKERS", "0")) or max(1, workers // 4),
+        "compile": compile_workers,
+        "exec": int(os.environ.get("JUDGE_EXEC_WORKERS", "0")) or max(1, workers - compile_workers),
+    }
+
+
+def default_test_parallelism(stage_workers=None):
+    """
+    exec 阶段每次判题并发运行的测试数：编译进程之外的 CPU 平均分给各 exec 进程
+    默认的进程分配中编译和 exec 进程合计已占满全部 CPU，因此结果为 1（测试串行运行），与机器大小无关；
+    只有 JUDGE_WORKERS（或 JUDGE_COMPILE_WORKERS / JUDGE_EXEC_WORKERS）设得小于 CPU 数留出空闲 CPU，
+    或显式设置 JUDGE_TEST_PARALLELISM 时才会并发运行测试
+    """
+    stage_workers = stage_workers or default_stage_workers()
+    return max(1, (available_cpus() - stage_workers["compile"]) // stage_workers["exec"])
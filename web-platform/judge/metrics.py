@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Judge Metrics - 判题服务的 Prometheus 指标
+调度器在每个判题任务结束时汇总结果中的 metrics（排队 / 判题耗时、各阶段耗时、资源用量、快速通道判题数、
+各题目复用预编译目标文件省去的编译耗时），
+/metrics 接口按 Prometheus 文本格式输出这些累计值以及当前的队列状态（含各流水线阶段的队列深度）和缓存统计
+"""
+
+import threading
+
+# ============================================================
+# 指标配置 (Metrics Configuration)
+# ============================================================
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 耗时直方图的分桶上界（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 峰值内存直方图的分桶上界（字节）
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (1, 4, 16, 64, 128, 256, 512, 1024))
+
+# 各阶段（与 run_job.PHASES 一致）
+PHASES = ("prep", "compile", "run", "compare")
+
+# 流水线阶段（与 scheduler.PIPELINE_STAGES 一致）
+PIPELINE_STAGES = ("prep", "compile", "exec")
+
+# 缓存统计中的累计计数（其余数值字段按当前值输出）
+CACHE_COUNTERS = ("hits", "misses", "stores", "errors", "evictions")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """累计直方图（按标签分组）"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}  # labels -> [各分桶计数, 总和, 次数]
+
+    def observe(self, value, labels=()):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self, name, lines):
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            for bound, n in zip(self.buckets, counts):
+                lines.append("{}_bucket{} {}".format(name, _labels(labels + (("le", _number(bound)),)), n))
+            lines.append("{}_bucket{} {}".format(name, _labels(labels + (("le", "+Inf"),)), count))
+            lines.append("{}_sum{} {}".format(name, _labels(labels), _number(round(total, 6))))
+            lines.append("{}_count{} {}".format(name, _labels(labels), count))
+
+
+class JudgeMetrics:
+    """判题指标累计值（由调度器在任务结束回调中更新，多线程安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.verdicts = {}  # (problem_id, status) -> 次数
+        self.queue_wait = Histogram(DURATION_BUCKETS)
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.phases = Histogram(DURATION_BUCKETS)
+        self.stage_queue_wait = Histogram(DURATION_BUCKETS)
+        self.stage_duration = Histogram(DURATION_BUCKETS)
+        self.max_rss = Histogram(MEMORY_BUCKETS)
+        self.cpu_seconds = {"user": 0.0, "system": 0.0}
+        self.processes = 0
+        self.verdict_cache_hits = 0
+        self.fast_path = 0
+        self.compile_saved = {}  # problem_id -> 复用预编译目标文件 / 编译缓存省去的编译耗时（秒）
+
+    def observe(self, payload):
+        """记录一个已完成的判题任务（payload 为调度器工作进程的返回值）"""
+        result = payload["result"]
+        metrics = result.get("metrics") or {}
+        with self.lock:
+            key = (payload["problem_id"], result.get("status", "unknown"))
+            self.verdicts[key] = self.verdicts.get(key, 0) + 1
+            if payload.get("fast_path"):
+                self.fast_path += 1
+            self.queue_wait.observe(payload["queue_wait_ms"] / 1000.0)
+            self.duration.observe(payload["run_ms"] / 1000.0)
+            for stage, timing in sorted(payload.get("stages", {}).items()):
+                self.stage_queue_wait.observe(timing["queue_wait_ms"] / 1000.0, (("stage", stage),))
+                self.stage_duration.observe(timing["run_ms"] / 1000.0, (("stage", stage),))
+            if result.get("cached"):
+                self.verdict_cache_hits += 1
+                return
+            phases = metrics.get("phases_ms") or {}
+            for phase in PHASES:
+                self.phases.observe(phases.get(phase, 0) / 1000.0, (("phase", phase),))
+            self.cpu_seconds["user"] += metrics.get("cpu_user_ms", 0) / 1000.0
+            self.cpu_seconds["system"] += metrics.get("cpu_sys_ms", 0) / 1000.0
+            self.processes += metrics.get("processes", 0)
+            if metrics.get("compile_saved_ms"):
+                problem_id = payload["problem_id"]
+                self.compile_saved[problem_id] = self.compile_saved.get(problem_id, 0.0) + metrics["compile_saved_ms"] / 1000.0
+            if metrics.get("processes"):
+                self.max_rss.observe(metrics.get("max_rss_kb", 0) * 1024)
+
+    def render(self, scheduler_stats, cache_stats):
+        """按 Prometheus 文本格式输出全部指标"""
+        lines = []
+
+        def header(name, kind, text):
+            lines.append("# HELP {} {}".format(name, text))
+            lines.append("# TYPE {} {}".format(name, kind))
+
+        def sample(name, value, labels=()):
+            lines.append("{}{} {}".format(name, _labels(labels), _number(value)))
+
+        header("judge_workers", "gauge", "Number of judge worker processes.")
+        sample("judge_workers", scheduler_stats["workers"])
+        header("judge_queue_capacity", "gauge", "Maximum number of queued submissions.")
+        sample("judge_queue_capacity", scheduler_stats["queue_size"])
+        header("judge_in_flight", "gauge", "Submissions queued or being judged.")
+        sample("judge_in_flight", scheduler_stats["in_flight"])
+        header("judge_queued", "gauge", "Submissions waiting for a worker.")
+        sample("judge_queued", scheduler_stats["queued"])
+        for counter in ("submitted", "completed", "rejected", "failed"):
+            name = "judge_{}_total".format(counter)
+            header(name, "counter", "Submissions {} by the scheduler.".format(counter))
+            sample(name, scheduler_stats.get(counter, 0))
+
+        stages = scheduler_stats.get("stages", {})
+        for field, kind, text in (
+            ("workers", "gauge", "Worker processes of each pipeline stage."),
+            ("queued", "gauge", "Submissions waiting for a worker of each pipeline stage."),
+            ("running", "gauge", "Submissions being processed by each pipeline stage."),
+            ("completed", "counter", "Submissions that finished each pipeline stage."),
+        ):
+            name = "judge_stage_{}{}".format(field, "_total" if kind == "counter" else "")
+            header(name, kind, text)
+            for stage in PIPELINE_STAGES:
+                if stage in stages:
+                    sample(name, stages[stage][field], (("stage", stage),))
+
+        with self.lock:
+            header("judge_verdicts_total", "counter", "Completed submissions by problem and verdict.")
+            for (problem_id, status), count in sorted(self.verdicts.items()):
+                sample("judge_verdicts_total", count, (("problem", problem_id), ("status", status)))
+            header("judge_verdict_cache_hits_total", "counter", "Submissions answered from the verdict cache.")
+            sample("judge_verdict_cache_hits_total", self.verdict_cache_hits)
+            header("judge_fast_path_total", "counter", "Submissions answered by the fast lane without a worker.")
+            sample("judge_fast_path_total", self.fast_path)
+            header("judge_queue_wait_seconds", "histogram", "Time from submission to a worker picking it up.")
+            self.queue_wait.render("judge_queue_wait_seconds", lines)
+            header("judge_duration_seconds", "histogram", "Time a worker spent judging a submission.")
+            self.duration.render("judge_duration_seconds", lines)
+            header("judge_stage_queue_wait_seconds", "histogram", "Time a submission waited for each pipeline stage.")
+            self.stage_queue_wait.render("judge_stage_queue_wait_seconds", lines)
+            header("judge_stage_duration_seconds", "histogram", "Time a worker spent on each pipeline stage.")
+            self.stage_duration.render("judge_stage_duration_seconds", lines)
+            header("judge_phase_seconds", "histogram", "Per-submission time spent in each judge phase.")
+            self.phases.render("judge_phase_seconds", lines)
+            header("judge_program_cpu_seconds_total", "counter", "CPU time used by programs run while judging.")
+            for mode, seconds in sorted(self.cpu_seconds.items()):
+                sample("judge_program_cpu_seconds_total", round(seconds, 6), (("mode", mode),))
+            header("judge_program_processes_total", "counter", "Programs run while judging.")
+            sample("judge_program_processes_total", self.processes)
+            header("judge_program_max_rss_bytes", "histogram", "Per-submission peak memory of programs run while judging.")
+            self.max_rss.render("judge_program_max_rss_bytes", lines)
+            header("judge_compile_saved_seconds_total", "counter",
+                   "Compile time avoided by reusing precompiled objects and cached builds, by problem.")
+            for problem_id, seconds in sorted(self.compile_saved.items()):
+                sample("judge_compile_saved_seconds_total", round(seconds, 6), (("problem", problem_id),))
+
+        caches = sorted((name, stats) for name, stats in cache_stats.items() if isinstance(stats, dict))
+        for field in sorted({f for _, stats in caches for f, v in stats.items()
+                             if isinstance(v, (int, float)) and not isinstance(v, bool)}):
+            if field == "hit_rate":
+                continue
+            kind = "counter" if field in CACHE_COUNTERS else "gauge"
+            name = "judge_cache_{}{}".format(field, "_total" if kind == "counter" else "")
+            header(name, kind, "Judge cache {} by cache.".format(field.replace("_", " ")))
+            for cache, stats in caches:
+                if isinstance(stats.get(field), (int, float)):
+                    sample(name, stats[field], (("cache", cache),))
+        return "\n".join(lines) + "\n"
@@ -8,12 +8,32 @@ import os
 import subprocess
 import json
 import glob
+import hashlib
+import time
+import shlex
 import shutil
+import re
+import uuid
+import signal
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from judge_cache import get_compile_cache, get_verdict_cache, get_oracle_cache, parse_output_name, file_digest, gcc_version
+from judge_cpu import default_test_parallelism
+from workspace import (materialize_tree, unlink_existing, replace_file, get_template, find_template, lease_template,
+                       release_template, TEMPLATES_ENABLED)
+from forkserver import ForkServer, forkserver_object, EXEC_MODE, EXEC_FORKSERVER
+from sandbox import run_limited, SANDBOX_LIMITS, OUTPUT_LIMIT_BYTES
+from comparator import make_comparator, DEFAULT_FLOAT_TOLERANCE
+from judge_config import ConfigStore
 
 # ============================================================
 # 题目配置 (Problem Configuration)
 # ============================================================
 
+# 内置配置；设置了 JUDGE_CONFIG_SNAPSHOT 时 judge_configs 表中的配置覆盖同名题目（见 judge_config.py），
+# 判题时通过 get_problem_config() / get_config_store() 取得当前配置
 PROBLEM_CONFIG = {
     # 入门文本题
     "00_hello": {
@@ -53,6 +73,8 @@ PROBLEM_CONFIG = {
         "filename": "squares.c",
         "objects": ["squares_test.o"],
         "compile_cmd": "gcc -o squares -Wall -Werror -std=gnu99 -pedantic -no-pie squares.c squares_test.o",
+        # 测试用例在一个进程内依次调用 squares(args)，不再每个用例启动一次 ./squares
+        "batch_harness": {"function": "squares", "returns": "void", "params": ["int", "int", "int", "int"]},
         "test_cases": [
             {"args": "3 5 8 2", "expected_file": "ans_3_5_8_2.txt"},
             {"args": "5 2 4 6", "expected_file": "ans_5_2_4_6.txt"},
@@ -115,7 +137,10 @@ PROBLEM_CONFIG = {
     "15_tests_subseq": {
         "type": "unittest_subseq",
         "filename": "test-subseq.c",
-        "test_runner": "run_all.sh"
+        "test_runner": "run_all.sh",
+        # 测试文件编译一次，分别与各实现的目标文件链接运行（代替 run_all.sh 逐个重新编译）
+        "implementations": "/usr/local/l2p/subseq/subseq*.o",
+        "implementation_prefix": "subseq"
     },
     
     # 子序列算法 - 需要自动生成测试驱动
@@ -133,7 +158,11 @@ PROBLEM_CONFIG = {
     },
     "c2prj2_testing": {
         "type": "testgen_advanced",
-        "filename": "tests.txt"
+        "filename": "tests.txt",
+        # 逐行评估：每行测试分别与正确实现、各错误实现的输出比较（代替 run_all.sh）
+        "correct_program": "/usr/local/l2p/poker/correct-test-eval",
+        "broken_programs": "/usr/local/l2p/poker/test-eval-*",
+        "output_separator": "============================"
     },
     
     # GDB 调试题
@@ -163,6 +192,7 @@ PROBLEM_CONFIG = {
     "code_grade_judge": {
         "type": "io_test",
         "filename": "grade.c",
+        "policy": {"max_timeouts": 1},
         "test_cases": [
             {"input": "95\n", "expected": "A\n"},
             {"input": "85\n", "expected": "B\n"},
@@ -261,43 +291,492 @@ PROBLEM_CONFIG = {
 }
 
 
+# 只缓存确定性的结果；超时、系统错误可能由负载引起，需要重新判题
+# （多测试点题目中有测试超时或提前停止时，即使结果为 wrong_answer 也不缓存，见 TestRunPolicy.finish）
+VERDICT_CACHE_STATUSES = {"accepted", "wrong_answer", "compile_error", "runtime_error"}
+
+# 判题服务的模块目录和评测程序源码目录（见 register_grader）
+JUDGE_DIR = os.path.dirname(os.path.abspath(__file__))
+HARNESS_DIR = os.path.join(JUDGE_DIR, "harness")
+
+# 判题逻辑版本：判题服务的任一模块（比较方式、沙箱、fork server、配置加载、工作空间等都影响判题结果）
+# 或评测程序源码变化后，旧的判题结果缓存全部失效
+JUDGER_VERSION = hashlib.sha256("".join(
+    file_digest(path) for path in sorted(glob.glob(os.path.join(JUDGE_DIR, "*.py")))
+    + sorted(glob.glob(os.path.join(HARNESS_DIR, "*")))
+).encode()).hexdigest()
+
+# 题目配置索引：内置配置叠加 judge_configs 表的快照（见 judge_config.py），首次判题时创建
+_config_store = None
+_config_store_lock = threading.Lock()
+
+
+def get_config_store():
+    """题目配置索引的持有者（每个进程一个）"""
+    global _config_store
+    with _config_store_lock:
+        if _config_store is None:
+            _config_store = ConfigStore(PROBLEM_CONFIG, graders=GRADERS)
+        return _config_store
+
+
+def get_problem_config(problem_id):
+    """当前配置索引中的题目配置，未配置的题目返回 None"""
+    return get_config_store().current().configs.get(problem_id)
+
+# 多测试点执行策略（io_test / link_object / testgen_multi），可在题目配置中用 "policy" 覆盖部分字段：
+#   mode          "run_all" 运行全部测试；"fail_fast" 第一个测试失败后停止
+#   max_timeouts  超时次数达到该值后停止（0 表示不限制）
+#   wall_budget   全部测试的总运行时间上限，单位秒（0 表示不限制）
+#   parallel      同时运行的测试数（1 表示串行；测试会读写工作目录中同一文件的题目应设为 1）
+# 提前停止时剩余测试记为未通过；默认运行全部测试、不限制超时次数和总时间（会改变得分，需由题目配置显式开启）
+POLICY_RUN_ALL = "run_all"
+POLICY_FAIL_FAST = "fail_fast"
+
+DEFAULT_TEST_POLICY = {
+    "mode": POLICY_RUN_ALL,
+    "max_timeouts": int(os.environ.get("JUDGE_MAX_TIMEOUTS", "0")),
+    "wall_budget": int(os.environ.get("JUDGE_TEST_WALL_BUDGET", "0")),
+    # 默认把编译进程之外的 CPU 平均分给各 exec 进程，编译和运行测试的进程总数不超过 CPU 数（见 judge_cpu）；
+    # 默认进程分配下没有空闲 CPU，默认值为 1（串行），需要并发运行测试时用 JUDGE_TEST_PARALLELISM 显式设置
+    "parallel": int(os.environ.get("JUDGE_TEST_PARALLELISM", "0")) or default_test_parallelism(),
+}
+
+
 # ============================================================
 # 工具函数 (Utility Functions)
 # ============================================================
 
-def run_command(cmd, timeout=10, cwd=None, input_data=None):
-    """执行命令并返回结果"""
+def is_verdict_cacheable(config):
+    """题目是否允许缓存判题结果（可在配置中用 cache_verdict 显式开关，默认由题型的判题器声明）"""
+    if "cache_verdict" in config:
+        return bool(config["cache_verdict"])
+    judger = JUDGERS.get(config.get("type"))
+    return judger is not None and judger.cacheable
+
+
+# 当前流水线阶段运行的程序的资源用量合计和各步骤耗时（每个阶段开始时清零，结束时合并到 ctx 的 metrics 中，见 judge_stage）
+# compile_saved_ms 为复用预编译目标文件 / 编译缓存而省去的编译耗时（按当初实际编译的耗时计）
+_usage = {"processes": 0, "cpu_user_ms": 0, "cpu_sys_ms": 0, "max_rss_kb": 0, "compile_saved_ms": 0}
+_usage_lock = threading.Lock()
+
+# 判题阶段：prep 准备工作空间 / compile 编译（gcc、make 等判题工具）/ run 运行程序 / compare 比较输出
+PHASES = ("prep", "compile", "run", "compare")
+
+# 结果中最多保留的步骤明细数（超出的步骤仍计入各阶段合计）
+METRICS_MAX_STEPS = int(os.environ.get("JUDGE_METRICS_MAX_STEPS", "100"))
+
+_timings = {"started": 0.0, "phases": {}, "steps": [], "dropped": 0}
+_step_local = threading.local()
+
+# 当前判题的题目的运行限制（每个流水线阶段开始时按 ctx 中记录的配置设置）：
+# 学生程序单次运行的超时（秒，未配置 time_limit_ms 时为 None）和资源限制
+_problem_limits = {"time_limit": None, "limits": SANDBOX_LIMITS}
+
+
+class JudgeCancelled(Exception):
+    """判题任务已被客户端取消"""
+
+
+_progress_hook = None
+_cancel_check = None
+
+
+def set_progress_hook(hook, cancel_check=None):
+    """
+    设置进度事件回调（由调度器在工作进程中按任务设置，传 None 清除）
+    cancel_check 返回 True 表示任务已被取消
+    """
+    global _progress_hook, _cancel_check
+    _progress_hook = hook
+    _cancel_check = cancel_check
+
+
+def emit_progress(event_type, **data):
+    """上报判题进度事件（编译完成、单个测试结果等）；任务已被取消时抛出 JudgeCancelled"""
+    if _progress_hook is not None:
+        event = {"type": event_type}
+        event.update(data)
+        try:
+            _progress_hook(event)
+        except Exception:
+            pass
+    if _cancel_check is not None and _cancel_check():
+        raise JudgeCancelled()
+
+
+class TestRunPolicy:
+    """
+    多测试点执行策略：记录每个测试的结果，判断是否需要提前停止
+    用法：通过 run_test_cases() 遍历测试（或循环开始前检查 should_stop()），
+    运行时使用 timeout() 作为单个测试的超时，处理结果时调用 record()
+    """
+
+    def __init__(self, config, total):
+        policy = dict(DEFAULT_TEST_POLICY)
+        policy.update(config.get("policy", {}))
+        self.mode = policy["mode"]
+        self.max_timeouts = policy["max_timeouts"]
+        self.parallel = max(1, int(policy["parallel"]))
+        self.deadline = time.time() + policy["wall_budget"] if policy["wall_budget"] else None
+        self.total = total
+        self.ran = 0
+        self.timeouts = 0
+        self.stop_reason = None
+
+    def timeout(self, default):
+        """单个测试的超时时间：不超过总时间预算的剩余部分"""
+        if self.deadline is None:
+            return default
+        return max(0.1, min(default, self.deadline - time.time()))
+
+    def record(self, passed, timed_out=False):
+        """记录一个测试的结果"""
+        self.ran += 1
+        if timed_out:
+            self.timeouts += 1
+        if self.ran >= self.total:
+            return
+        if not passed and self.mode == POLICY_FAIL_FAST:
+            self.stop_reason = "测试失败"
+        elif self.max_timeouts and self.timeouts >= self.max_timeouts:
+            self.stop_reason = "已超时 {} 次".format(self.timeouts)
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.stop_reason = "超出总运行时间预算"
+
+    def should_stop(self):
+        return self.stop_reason is not None
+
+    def out_of_time(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def unstable(self):
+        """结果是否可能受负载影响：有测试超时，或提前停止"""
+        return self.timeouts > 0 or self.stop_reason is not None
+
+    def finish(self, ctx):
+        """全部测试结束：结果可能受负载影响时标记 ctx（判题结果不写入缓存），返回提前停止的说明日志"""
+        if self.unstable():
+            ctx["verdict_unstable"] = True
+        return self.stop_logs()
+
+    def stop_logs(self):
+        """提前停止时的说明日志，并上报进度事件"""
+        if self.stop_reason is None:
+            return []
+        message = "已停止判题（{}），跳过剩余 {} 个测试".format(self.stop_reason, self.total - self.ran)
+        emit_progress("stopped", reason=self.stop_reason, skipped=self.total - self.ran, message=message)
+        return [message]
+
+
+def run_test_cases(policy, cases, run_case):
+    """
+    按执行策略运行测试，逐个生成 (序号, 测试, run_case(序号, 测试) 的返回值)
+    policy.parallel > 1 时在线程池中并发运行，但结果仍按测试顺序返回，日志顺序与串行运行一致；
+    策略要求停止后不再返回后续结果，也不再启动新的测试；
+    并发运行时已经提前开始的测试（最多 parallel - 1 个）不会被终止，返回前等待它们运行结束（受各自的时间限制），结果丢弃
+    """
+    if policy.parallel <= 1 or len(cases) <= 1:
+        for i, case in enumerate(cases):
+            if policy.should_stop():
+                return
+            yield i, case, run_case(i, case)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(policy.parallel, len(cases)))
+    futures = {}
+    submitted = 0
     try:
-        result = subprocess.run(
-            cmd,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            cwd=cwd,
-            input=input_data
-        )
-        return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "exit_code": result.returncode,
-            "timeout": False
-        }
-    except subprocess.TimeoutExpired as e:
+        for i, case in enumerate(cases):
+            if policy.should_stop():
+                return
+            # 最多提前提交 parallel 个测试，策略要求停止时已开始的测试在 shutdown 中等待结束，尚未开始的取消
+            while submitted < len(cases) and submitted < i + policy.parallel:
+                futures[submitted] = executor.submit(run_case, submitted, cases[submitted])
+                submitted += 1
+            yield i, case, futures.pop(i).result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_command(cmd, timeout=10, cwd=None, input_data=None, stdin_file=None, merge_stderr=False, limits=SANDBOX_LIMITS,
+                comparator=None, phase=None):
+    """
+    执行命令并返回结果（在沙箱中运行：独立进程组、资源限制，见 sandbox.run_limited）
+    cmd 为参数列表时直接执行程序，不经过 /bin/sh；为字符串时按 shell 命令执行
+    stdin_file: 作为标准输入的文件（相对 cwd），代替 shell 的 "< file"
+    merge_stderr: 标准错误合并到标准输出，代替 shell 的 "2>&1"
+    limits: 资源限制；编译器、make 等判题工具传 None
+    comparator: 流式比较器，标准输出与期望输出不同时立即终止程序（结果中的 output_match / output_mismatch）
+    phase: 耗时计入的阶段，默认 limits 为 None 时为 compile，否则为 run
+    """
+    with StepTimer(phase or ("compile" if limits is None else "run"), command_name(cmd)) as step:
+        result = execute_command(cmd, timeout=timeout, cwd=cwd, input_data=input_data, stdin_file=stdin_file,
+                                 merge_stderr=merge_stderr, limits=limits, comparator=comparator)
+        step.finish(result)
+    return result
+
+
+def execute_command(cmd, timeout=10, cwd=None, input_data=None, stdin_file=None, merge_stderr=False, limits=SANDBOX_LIMITS,
+                    comparator=None):
+    """
+    执行命令并累计资源用量，不单独记录步骤耗时（由调用方计时，如 compile_command）
+    使用默认限制（SANDBOX_LIMITS）时按题目配置的 memory_limit_mb / time_limit_ms 调整
+    """
+    if limits is SANDBOX_LIMITS:
+        limits = _problem_limits["limits"]
+    result = run_limited(cmd, timeout=timeout, cwd=cwd, input_data=input_data, stdin_file=stdin_file,
+                         merge_stderr=merge_stderr, limits=limits, comparator=comparator)
+    record_usage(result)
+    return result
+
+
+def record_usage(result):
+    """累计本次判题中运行的程序的资源用量（多个测试并发运行时由多个线程调用）"""
+    if "cpu_user_ms" not in result:
+        return
+    with _usage_lock:
+        _usage["processes"] += 1
+        _usage["cpu_user_ms"] += result["cpu_user_ms"]
+        _usage["cpu_sys_ms"] += result["cpu_sys_ms"]
+        _usage["max_rss_kb"] = max(_usage["max_rss_kb"], result["max_rss_kb"])
+
+
+def reset_usage(started=None):
+    """清零资源用量合计和各步骤耗时（started 为步骤开始时间的基准，默认为当前时间）"""
+    with _usage_lock:
+        _usage.update(processes=0, cpu_user_ms=0, cpu_sys_ms=0, max_rss_kb=0, compile_saved_ms=0)
+        _timings.update(started=started or time.time(), phases={}, steps=[], dropped=0)
+
+
+def record_compile_saved(ms):
+    """累计省去的编译耗时（毫秒）"""
+    with _usage_lock:
+        _usage["compile_saved_ms"] = round(_usage["compile_saved_ms"] + ms, 3)
+
+
+def record_step(phase, name, seconds, started=None, **fields):
+    """记录一个判题步骤的耗时（多个测试并发运行时由多个线程调用）"""
+    ms = round(seconds * 1000, 3)
+    with _usage_lock:
+        _timings["phases"][phase] = _timings["phases"].get(phase, 0) + ms
+        if len(_timings["steps"]) >= METRICS_MAX_STEPS:
+            _timings["dropped"] += 1
+            return
+        step = {"phase": phase, "name": name, "ms": ms}
+        if started is not None:
+            step["start_ms"] = round(max(0.0, started - _timings["started"]) * 1000, 3)
+        step.update(fields)
+        _timings["steps"].append(step)
+
+
+def command_name(cmd):
+    """步骤名称：命令行（过长时截断）"""
+    text = cmd if isinstance(cmd, str) else " ".join(cmd)
+    return text if len(text) <= 80 else text[:77] + "..."
+
+
+class StepTimer:
+    """
+    记录一个判题步骤的耗时（with 语句）
+    步骤中嵌套的其他步骤（如准备工作空间时构建题目模板）单独记录，不重复计入外层步骤
+    """
+
+    def __init__(self, phase, name, **fields):
+        self.phase = phase
+        self.name = name
+        self.fields = fields
+        self.excluded = 0.0
+        self.compare_seconds = None
+
+    def __enter__(self):
+        stack = getattr(_step_local, "stack", None)
+        if stack is None:
+            stack = _step_local.stack = []
+        stack.append(self)
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.time() - self.started
+        stack = _step_local.stack
+        stack.pop()
+        if stack:
+            stack[-1].excluded += elapsed
+        record_step(self.phase, self.name, max(0.0, elapsed - self.excluded), started=self.started, **self.fields)
+        if self.compare_seconds is not None:
+            record_step("compare", self.name, self.compare_seconds, started=self.started, streaming=True)
+        return False
+
+    def finish(self, result):
+        """根据命令结果补充退出码等字段；运行时流式比较的耗时计入 compare 阶段"""
+        self.fields["exit_code"] = result.get("exit_code")
+        if result.get("timeout"):
+            self.fields["timeout"] = True
+        if result.get("cached"):
+            self.fields["cached"] = True
+        if result.get("compare_ms"):
+            self.compare_seconds = result["compare_ms"] / 1000.0
+            self.excluded += self.compare_seconds
+
+
+def timed_step(phase):
+    """装饰器：函数的耗时记为一个判题步骤（步骤名称为函数名）"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with StepTimer(phase, func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def set_problem_limits(time_limit=None, limits=None):
+    """设置当前题目的运行限制（time_limit 为秒，None 表示使用各判题器的默认超时）"""
+    _problem_limits.update(time_limit=time_limit, limits=limits or SANDBOX_LIMITS)
+
+
+def time_limit(default):
+    """学生程序单次运行的超时（秒）：题目配置了 time_limit_ms 时使用配置，否则为判题器的默认值 default"""
+    return _problem_limits["time_limit"] or default
+
+
+def judge_metrics():
+    """本次判题的 metrics：资源用量、各阶段耗时合计（毫秒）和步骤明细"""
+    with _usage_lock:
+        metrics = dict(_usage)
+        metrics["judge_ms"] = int((time.time() - _timings["started"]) * 1000)
+        metrics["phases_ms"] = {phase: round(_timings["phases"].get(phase, 0), 3) for phase in PHASES}
+        metrics["steps"] = list(_timings["steps"])
+        if _timings["dropped"]:
+            metrics["steps_dropped"] = _timings["dropped"]
+    return metrics
+
+
+def output_limit_result(run_res, logs):
+    """程序输出超过上限被终止时的判题结果（run_res 中只有输出的开头和结尾片段）"""
+    return {
+        "status": "output_limit_exceeded",
+        "score": 0,
+        "logs": logs + ["输出超限 (超过 {} KB)，程序已被终止".format(OUTPUT_LIMIT_BYTES // 1024),
+                        "--- 输出片段 ---", run_res["stdout"]]
+    }
+
+
+def output_comparator(config, expected_file=None, expected=None, default_mode="exact"):
+    """
+    按题目配置的 "compare"（exact / whitespace / token / float）和 "float_tolerance" 创建流式比较器
+    期望输出为文件 expected_file 或字符串 expected；文件不存在时返回 None
+    """
+    if expected_file is not None and not os.path.isfile(expected_file):
+        return None
+    return make_comparator(config.get("compare", default_mode), expected_file=expected_file, expected=expected,
+                           tolerance=config.get("float_tolerance", DEFAULT_FLOAT_TOLERANCE))
+
+
+def check_output(config, run_res, expected_file=None, expected=None, default_mode="exact"):
+    """
+    返回 (输出是否正确, 第一处不同的说明)
+    运行时已经用比较器比较过的直接取结果；否则（如批量测试驱动的结果）比较已读取的输出
+    """
+    if "output_match" in run_res:
+        return run_res["output_match"], run_res["output_diff"]
+    with StepTimer("compare", os.path.basename(expected_file) if expected_file else "expected"):
+        comparator = output_comparator(config, expected_file, expected, default_mode)
+        if comparator is None:
+            return False, "无法读取期望输出"
+        comparator.feed(run_res["stdout"].encode())
+        return comparator.finish(), comparator.describe()
+
+
+def make_executable(path):
+    """添加可执行权限（代替 chmod +x）；已可执行时不修改，避免改动链接到的资源文件"""
+    try:
+        mode = os.stat(path).st_mode
+        if mode & 0o111 != 0o111:
+            os.chmod(path, mode | 0o111)
+    except OSError:
+        pass
+
+
+def compile_command(cmd, timeout=10, cwd=None, inputs=None):
+    """
+    执行编译命令（按参数列表直接调用 gcc），相同输入（源文件、.o 文件、命令、gcc 版本）直接复用缓存的编译产物
+    inputs 为影响编译结果的文件，默认为命令中的文件和工作目录下所有 .c/.h 文件（见 judge_cache.compile_inputs）；
+    编译课程提供的源文件时只列出它实际依赖的文件，不同提交之间即可共用同一编译产物
+    """
+    with StepTimer("compile", command_name(cmd)) as step:
+        result = _compile_cached(cmd, timeout, cwd, inputs)
+        step.finish(result)
+    return result
+
+
+def _compile_cached(cmd, timeout, cwd, inputs=None):
+    """compile_command 的实现（耗时包括查找 / 写入编译缓存）"""
+    cache = get_compile_cache()
+    if cache is None or cwd is None:
+        return execute_command(shlex.split(cmd), timeout=timeout, cwd=cwd, limits=None)
+
+    output_path = os.path.join(cwd, parse_output_name(cmd))
+    try:
+        key = cache.make_key(cmd, cwd, inputs)
+    except Exception:
+        return execute_command(shlex.split(cmd), timeout=timeout, cwd=cwd, limits=None)
+
+    meta = cache.get(key, output_path)
+    if meta is not None:
+        record_compile_saved(meta.get("compile_ms", 0))
         return {
-            "stdout": e.stdout if e.stdout else "",
-            "stderr": "Execution timed out after {} seconds".format(timeout),
-            "exit_code": -1,
-            "timeout": True
+            "stdout": meta.get("stdout", ""),
+            "stderr": meta.get("stderr", ""),
+            "exit_code": 0,
+            "timeout": False,
+            "cached": True
         }
-    except Exception as e:
+
+    started = time.time()
+    result = execute_command(shlex.split(cmd), timeout=timeout, cwd=cwd, limits=None)
+    if result["exit_code"] == 0 and os.path.isfile(output_path):
+        cache.put(key, {"cmd": cmd, "stdout": result["stdout"], "stderr": result["stderr"],
+                        "compile_ms": round((time.time() - started) * 1000, 3)}, output_path)
+    return result
+
+
+def run_reference(program, args=(), timeout=5, cwd=None, input_data=None, stdin_file=None):
+    """
+    运行参考（正确）程序 ./program args...
+    输出只取决于程序和输入，按 (程序内容, 参数, 标准输入) 缓存；超时、被信号终止等不确定的结果不缓存
+    """
+    cmd = ["./" + program] + list(args)
+    cache = get_oracle_cache()
+    if cache is None or cwd is None:
+        return run_command(cmd, timeout=timeout, cwd=cwd, input_data=input_data, stdin_file=stdin_file)
+
+    try:
+        stdin_data = input_data or ""
+        if stdin_file is not None:
+            with open(os.path.join(cwd, stdin_file), "rb") as f:
+                stdin_data = f.read()
+        key = cache.make_key(os.path.join(cwd, program), args, stdin_data)
+    except OSError:
+        return run_command(cmd, timeout=timeout, cwd=cwd, input_data=input_data, stdin_file=stdin_file)
+
+    meta = cache.get(key)
+    if meta is not None:
+        record_step("run", command_name(cmd), 0, cached=True)
         return {
-            "stdout": "",
-            "stderr": str(e),
-            "exit_code": -1,
-            "timeout": False
+            "stdout": meta.get("stdout", ""),
+            "stderr": meta.get("stderr", ""),
+            "exit_code": meta.get("exit_code", 0),
+            "timeout": False,
+            "cached": True
         }
 
+    result = run_command(cmd, timeout=timeout, cwd=cwd, input_data=input_data, stdin_file=stdin_file)
+    if not result["timeout"] and result["exit_code"] >= 0:
+        cache.put(key, {"args": list(args), "stdout": result["stdout"], "stderr": result["stderr"], "exit_code": result["exit_code"]})
+    return result
+
 
 def read_text_file(file_path):
     """读取文本文件"""
@@ -309,16 +788,23 @@ def read_text_file(file_path):
 
 
 def write_text_file(file_path, content):
-    """写入文本文件"""
+    """写入文本文件（目标是资源链接时先删除链接，不会修改资源文件）"""
+    unlink_existing(file_path)
     with open(file_path, "w") as f:
         f.write(content)
 
 
+@timed_step("prep")
 def prepare_problem_workspace(problem_id, work_dir, resource_dir):
-    """准备题目工作空间：复制资源文件到工作目录"""
+    """
+    准备题目工作空间：把资源文件链接到工作目录（见 workspace.materialize_tree）
+    有题目模板时从模板生成，评测程序源码和预编译的目标文件随之就位；
+    使用模板时持有模板租约直到判题结束（见 judge_stage），期间模板即使被新版本取代也不会被删除
+    返回 (工作空间目录, 模板清单, 模板租约, 日志)，未使用模板时清单为空、租约为 None，失败时目录为 None
+    """
     src_dir = os.path.join(resource_dir, problem_id)
     if not os.path.isdir(src_dir):
-        return None, ["Problem resources not found: {}".format(src_dir)]
+        return None, {}, None, ["Problem resources not found: {}".format(src_dir)]
 
     dst_dir = os.path.join(work_dir, "problem")
     
@@ -326,27 +812,40 @@ def prepare_problem_workspace(problem_id, work_dir, resource_dir):
     if os.path.exists(dst_dir):
         shutil.rmtree(dst_dir)
     
-    # 复制资源
+    template_dir, manifest = get_problem_template(problem_id, resource_dir)
+    lease = None
+    if template_dir is not None:
+        try:
+            lease = lease_template(template_dir)
+        except OSError:
+            template_dir = None
+        # 登记租约之前模板已被删除时改用资源目录
+        if template_dir is not None and not os.path.isdir(template_dir):
+            release_template(lease)
+            lease = None
+            template_dir = None
+    if template_dir is None:
+        manifest = {}
+    
+    # 链接资源
     try:
-        result = subprocess.run(
-            ["cp", "-r", src_dir, dst_dir],
-            timeout=30,
-            capture_output=True
-        )
-        if result.returncode != 0:
-            return None, ["Failed to copy resources: {}".format(result.stderr.decode())]
-    except subprocess.TimeoutExpired:
-        return None, ["Copy resources timed out"]
+        materialize_tree(template_dir or src_dir, dst_dir)
     except Exception as e:
-        # Fallback to shutil
+        # Fallback to full copy
+        manifest = {}
         try:
+            if os.path.exists(dst_dir):
+                shutil.rmtree(dst_dir)
             shutil.copytree(src_dir, dst_dir)
         except Exception as e2:
-            return None, ["Failed to copy resources: {}".format(str(e2))]
+            if lease is not None:
+                release_template(lease)
+            return None, {}, None, ["Failed to copy resources: {}".format(str(e2))]
     
-    return dst_dir, []
+    return dst_dir, manifest, lease, []
 
 
+@timed_step("prep")
 def overlay_submission(work_dir, problem_workspace_dir):
     """将学生提交的文件覆盖到题目工作空间"""
     try:
@@ -357,28 +856,397 @@ def overlay_submission(work_dir, problem_workspace_dir):
             src = os.path.join(work_dir, name)
             dst = os.path.join(problem_workspace_dir, name)
 
+            # 只有被提交文件覆盖的位置才真正复制，其余资源仍是链接
             if os.path.isdir(src):
-                if os.path.exists(dst):
+                if os.path.isdir(dst) and not os.path.islink(dst):
                     shutil.rmtree(dst)
+                else:
+                    unlink_existing(dst)
                 shutil.copytree(src, dst)
             else:
-                shutil.copy2(src, dst)
+                replace_file(src, dst)
 
         return []
     except Exception as e:
         return ["Failed to overlay submission:", str(e)]
 
 
+# ============================================================
+# 评测程序 (Grader Harnesses)
+# ============================================================
+
+# 评测程序源码放在 harness/ 目录中，由各评测器注册时声明（见 register_grader）
+# 各评测器生成的文件：source 为源码，compile 为预编译命令，depends 为编译时用到的题目文件
+# 题目模板中会提前生成这些文件；提交覆盖了 depends 中的文件时回退到现场编译
+GRADER_HARNESSES = {}
+
+
+def load_harness(name):
+    """读取 harness/ 目录中的评测程序源码"""
+    with open(os.path.join(HARNESS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+# 批量测试驱动：在一个进程内依次调用被测函数，学生代码和题目的 .o 文件按题目的 compile_cmd 编译链接
+# （.o 文件中的 main 改名后链接，见 run_batch_harness）
+# 每个用例前后输出带随机标记的分隔行（标记由命令行传入，学生代码无法预知），
+# 分隔行之间即该用例的输出；argv[1] 为起始用例序号，用于崩溃或超时后从下一个用例继续
+BATCH_HARNESS = """
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+{returns} {function}({params});
+int main(int argc, char ** argv) {{
+  int start = argc > 1 ? atoi(argv[1]) : 0;
+  const char * tag = argc > 2 ? argv[2] : "@@";
+  for (int i = start; i < {count}; i++) {{
+    long long result = 0;
+    printf("\\n%s begin %d\\n", tag, i);
+    fflush(stdout);
+    alarm({timeout});
+    switch (i) {{
+{cases}
+    }}
+    alarm(0);
+    fflush(stdout);
+    printf("\\n%s end %d %lld\\n", tag, i, result);
+    fflush(stdout);
+  }}
+  return 0;
+}}
+"""
+
+BATCH_HARNESS_NAME = "batch_driver"
+
+# 批量测试驱动支持的参数类型及其字面量格式（测试用例的 args 只能是这些字面量，不会作为任意 C 表达式写入驱动）
+BATCH_PARAM_PATTERNS = {
+    "int": re.compile(r"^[+-]?[0-9]{1,9}$"),
+    "long": re.compile(r"^[+-]?[0-9]{1,18}$"),
+    "double": re.compile(r"^[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]{1,3})?$"),
+}
+
+
+def batch_call_args(spec, args):
+    """按 spec["params"] 声明的参数类型解析测试用例的 args，返回 C 字面量列表；参数个数或格式不符时抛出 ValueError"""
+    params = spec.get("params", [])
+    values = shlex.split(args)
+    if len(values) != len(params):
+        raise ValueError("参数个数应为 {}: {!r}".format(len(params), args))
+    for param, value in zip(params, values):
+        pattern = BATCH_PARAM_PATTERNS.get(param)
+        if pattern is None:
+            raise ValueError("不支持的参数类型: {!r}".format(param))
+        if not pattern.match(value):
+            raise ValueError("参数不是 {} 字面量: {!r}".format(param, value))
+    return [value + "L" if param == "long" else value for param, value in zip(params, values)]
+
+
+def build_batch_harness(config, test_cases, timeout):
+    """
+    根据题目配置生成批量测试驱动源码
+    config["batch_harness"]: function 为被测函数名，returns 为返回类型（void 时不记录返回值），
+    params 为参数类型列表（int / long / double）；每个测试用例的 args 按空格拆分后按参数类型解析为字面量，
+    格式不符时抛出 ValueError
+    """
+    spec = config["batch_harness"]
+    if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", spec.get("function", "")):
+        raise ValueError("函数名无效: {!r}".format(spec.get("function")))
+    returns = spec.get("returns", "void")
+    if returns != "void" and returns not in BATCH_PARAM_PATTERNS:
+        raise ValueError("不支持的返回类型: {!r}".format(returns))
+    cases = []
+    for i, tc in enumerate(test_cases):
+        call = "{}({})".format(spec["function"], ", ".join(batch_call_args(spec, tc.get("args", ""))))
+        if returns == "void":
+            cases.append("    case {}: {}; break;".format(i, call))
+        else:
+            cases.append("    case {}: result = (long long) {}; break;".format(i, call))
+    return BATCH_HARNESS.format(returns=returns, function=spec["function"], params=", ".join(spec.get("params", [])) or "void",
+                                count=len(test_cases), timeout=max(1, int(timeout)), cases="\n".join(cases))
+
+
+def parse_batch_output(output, tag):
+    """
+    解析批量测试驱动的输出
+    返回 ({序号: (输出, 返回值)}, 已开始但未结束的用例序号或 None, 该用例已有的输出)
+    """
+    done = {}
+    current = None
+    pos = 0
+    for m in re.finditer(r"\n{} (begin|end) (\d+)(?: (-?\d+))?\n".format(re.escape(tag)), output):
+        index = int(m.group(2))
+        if m.group(1) == "begin":
+            current, pos = index, m.end()
+        elif index == current:
+            done[index] = (output[pos:m.start()], int(m.group(3)))
+            current = None
+    return done, current, output[pos:] if current is not None else ""
+
+
+# ============================================================
+# 题目模板 (Problem Templates)
+# ============================================================
+
+def get_problem_template(problem_id, resource_dir):
+    """
+    获取题目模板目录（资源变化、判题逻辑或 gcc 版本变化时自动重建）
+    返回 (模板目录, 清单)，模板不可用时返回 (None, {})；
+    模板在本次调用中现场生成时，返回的清单不带 compile_ms（这次判题已承担预编译耗时，使用目标文件不算省去编译）
+    """
+    config = get_problem_config(problem_id)
+    src_dir = os.path.join(resource_dir, problem_id)
+    if not TEMPLATES_ENABLED or config is None or not os.path.isdir(src_dir):
+        return None, {}
+    harness = GRADER_HARNESSES.get(config.get("grader"), {})
+    judger = JUDGERS.get(config.get("type"))
+
+    built = []
+
+    def build(template_dir):
+        built.append(template_dir)
+        manifest = {}
+        for name, spec in harness.items():
+            path = os.path.join(template_dir, name)
+            if "source" in spec:
+                write_text_file(path, spec["source"])
+            else:
+                started = time.time()
+                res = run_command(shlex.split(spec["compile"]), timeout=60, cwd=template_dir, limits=None)
+                if res["exit_code"] != 0 or not os.path.isfile(path):
+                    # 预编译失败时不写入清单，判题时回退到现场编译
+                    continue
+            manifest[name] = {
+                "digest": file_digest(path),
+                "depends": {dep: file_digest(os.path.join(template_dir, dep)) for dep in spec.get("depends", [])},
+            }
+            if "compile" in spec:
+                # 判题时直接使用该目标文件即省去这次编译
+                manifest[name]["compile_ms"] = round((time.time() - started) * 1000, 3)
+        if judger is not None and judger.template is not None:
+            judger.template(config, template_dir, manifest)
+        return manifest
+
+    try:
+        template_dir, manifest = get_template(problem_id, src_dir, template_version(config), build)
+    except Exception:
+        return None, {}
+    if built:
+        manifest = {name: {k: v for k, v in entry.items() if k != "compile_ms"} for name, entry in manifest.items()}
+    return template_dir, manifest
+
+
+def template_version(config):
+    """模板版本：判题逻辑、gcc 版本和评测程序（配置中换了 grader 时重建模板）"""
+    return JUDGER_VERSION + gcc_version() + (config.get("grader") or "")
+
+
+def find_problem_template(problem_id, resource_dir, config):
+    """只查找已生成的题目模板（不现场生成），返回 (模板目录, 清单)，没有时返回 (None, {})"""
+    src_dir = os.path.join(resource_dir, problem_id)
+    if not TEMPLATES_ENABLED or config is None or not os.path.isdir(src_dir):
+        return None, {}
+    try:
+        return find_template(problem_id, src_dir, template_version(config))
+    except Exception:
+        return None, {}
+
+
+def prepare_templates(resource_dir):
+    """为所有题目生成模板（判题服务启动时调用），返回生成的模板数"""
+    count = 0
+    for problem_id in get_config_store().current().configs:
+        template_dir, _ = get_problem_template(problem_id, resource_dir)
+        if template_dir is not None:
+            count += 1
+    return count
+
+
+def harness_ready(problem_ws, manifest, name):
+    """
+    工作空间中的 name 是否为模板预先生成、且未被提交覆盖的文件（依赖的题目文件也必须未改动）
+    manifest 为工作空间的模板清单 {文件名: {"digest", "depends", "compile_ms"}}（见 ctx["harness"]）
+    """
+    entry = manifest.get(name)
+    if entry is None:
+        return False
+    try:
+        if file_digest(os.path.join(problem_ws, name)) != entry["digest"]:
+            return False
+        for dep, digest in entry["depends"].items():
+            if file_digest(os.path.join(problem_ws, dep)) != digest:
+                return False
+    except OSError:
+        return False
+    return True
+
+
+def write_harness(problem_ws, manifest, grader, name):
+    """确保评测器 grader 的源码 name 在工作空间中：模板已提供时跳过写入"""
+    if not harness_ready(problem_ws, manifest, name):
+        write_text_file(os.path.join(problem_ws, name), GRADER_HARNESSES[grader][name]["source"])
+
+
+def build_harness_object(problem_ws, manifest, grader, name, timeout=30):
+    """
+    确保评测器 grader 预编译的目标文件 name 在工作空间中，学生代码只需单独编译后与之链接
+    模板已提供（依赖的题目文件未被提交修改）时直接使用；否则写入源码单独编译，
+    编译缓存只按源码和声明的依赖文件建键，依赖文件内容相同的提交之间共用同一目标文件
+    返回编译失败时的结果，成功时返回 None
+    """
+    if harness_ready(problem_ws, manifest, name):
+        record_compile_saved(manifest[name].get("compile_ms", 0))
+        return None
+    harness = GRADER_HARNESSES[grader]
+    spec = harness[name]
+    sources = [tok for tok in shlex.split(spec["compile"]) if "source" in harness.get(tok, {})]
+    for source in sources:
+        write_harness(problem_ws, manifest, grader, source)
+    # 工作空间中的旧目标文件可能是模板的链接，先删除链接再编译
+    unlink_existing(os.path.join(problem_ws, name))
+    res = compile_command(spec["compile"], timeout=timeout, cwd=problem_ws, inputs=sources + spec.get("depends", []))
+    return res if res["exit_code"] != 0 else None
+
+
+# ============================================================
+# 判题器注册表 (Judger Registry)
+# ============================================================
+
+# 判题器的阶段（按顺序执行）：
+#   prepare  准备工作空间（复制题目资源、覆盖提交文件、检查必需文件）
+#   build    编译（gcc / make 等判题工具）
+#   run      运行学生程序或测试
+#   score    比较输出并给出判题结果
+# 每个阶段是 phase(ctx) 函数：返回 None 继续下一阶段，返回结果字典则判题结束（最后一个阶段必须返回结果）
+# ctx 为普通字典（problem_id / config / work_dir / resource_dir / logs，以及前面阶段写入的中间结果），
+# 只保存可序列化的数据，调度器可以在不同进程中执行同一提交的不同阶段
+JUDGER_PHASES = ("prepare", "build", "run", "score")
+
+# 判题器声明的资源需求（调度器据此安排各阶段；未声明的项为 False）：
+#   workspace       prepare 阶段生成题目工作空间
+#   compiler        build 阶段运行编译器 / make
+#   sandbox         run 阶段在沙箱中运行学生程序
+#   parallel_tests  run 阶段按测试点策略并行运行多个程序（占用多个 CPU）
+#   external        依赖题目资源以外的程序（/usr/local/l2p 下的实现等）
+JUDGER_RESOURCES = ("workspace", "compiler", "sandbox", "parallel_tests", "external")
+
+# 判题器的可选钩子：
+#   fast      快速通道 fast(ctx)：调度器在 HTTP 服务进程中直接调用（见 judge_fast），不经过进程池；
+#             只能读取提交文件和已生成的题目模板，不编译、不运行程序，不适用时返回 None 按流水线判题
+#   template  生成题目模板时调用 template(config, template_dir, manifest)，可在模板中预先生成文件
+#             并把预先计算的结果写入清单（每个资源版本只执行一次）
+
+# 题型 -> Judger
+JUDGERS = {}
+
+# 评测程序（code_with_grader 题目配置中的 grader）：名称 -> grader(work_dir, problem_ws, harness, logs)
+# harness 为工作空间的模板清单（见 harness_ready）
+GRADERS = {}
+
+
+class Judger:
+    """一个题型的判题器：各阶段函数、资源需求，以及判题结果是否可以缓存"""
+
+    def __init__(self, problem_type, phases, resources=(), cacheable=False, fast=None, template=None):
+        unknown = set(phases) - set(JUDGER_PHASES)
+        if unknown:
+            raise ValueError("unknown judger phases: {}".format(", ".join(sorted(unknown))))
+        unknown = set(resources) - set(JUDGER_RESOURCES)
+        if unknown:
+            raise ValueError("unknown judger resources: {}".format(", ".join(sorted(unknown))))
+        self.problem_type = problem_type
+        self.phases = {name: phases[name] for name in JUDGER_PHASES if phases.get(name)}
+        self.resources = {name: name in resources for name in JUDGER_RESOURCES}
+        # 判题结果完全由提交文件和题目资源决定时可以缓存整体判题结果
+        self.cacheable = cacheable
+        self.fast = fast
+        self.template = template
+
+    def describe(self):
+        return {"phases": list(self.phases), "resources": self.resources, "cacheable": self.cacheable,
+                "fast": self.fast is not None}
+
+
+def register_judger(problem_type, resources=(), cacheable=False, fast=None, template=None, **phases):
+    """
+    注册题型 problem_type 的判题器，phases 为 JUDGER_PHASES 中各阶段的函数（可省略不需要的阶段），
+    fast / template 为可选钩子
+    """
+    if problem_type in JUDGERS:
+        raise ValueError("judger already registered: {}".format(problem_type))
+    JUDGERS[problem_type] = Judger(problem_type, phases, resources, cacheable, fast, template)
+    return JUDGERS[problem_type]
+
+
+def register_grader(name, harness=None):
+    """注册评测程序的装饰器；harness 为评测程序生成的文件（格式同 GRADER_HARNESSES）"""
+    def decorator(func):
+        GRADERS[name] = func
+        if harness:
+            GRADER_HARNESSES[name] = harness
+        return func
+    return decorator
+
+
+def judger_stats():
+    """已注册的判题器（题型 -> 阶段、资源需求）"""
+    return {problem_type: judger.describe() for problem_type, judger in sorted(JUDGERS.items())}
+
+
+def run_judger_phase(judger, phase, ctx):
+    """执行判题器的一个阶段，返回结果字典（判题结束）或 None"""
+    func = judger.phases.get(phase)
+    if func is None:
+        return None
+    return func(ctx)
+
+
+def prepare_workspace(ctx):
+    """prepare 阶段：准备题目工作空间并覆盖学生提交的文件（ctx["problem_ws"] 为工作空间目录）"""
+    problem_ws, manifest, lease, prep_logs = prepare_problem_workspace(
+        ctx["problem_id"], ctx["work_dir"], ctx["resource_dir"])
+    # 模板租约在判题结束时释放（见 judge_stage）
+    if lease is not None:
+        ctx["template_lease"] = lease
+    if problem_ws is None:
+        return {"status": "system_error", "score": 0, "logs": prep_logs}
+
+    overlay_logs = overlay_submission(ctx["work_dir"], problem_ws)
+    if overlay_logs and overlay_logs[0].startswith("Failed"):
+        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    ctx["problem_ws"] = problem_ws
+    # 模板预先生成的评测程序清单，随 ctx 传给后续阶段（可能在其他进程中执行）
+    ctx["harness"] = manifest
+    return None
+
+
+def run_failure(run_res, logs, runtime_logs=None):
+    """
+    运行结果为输出超限 / 超时 / 运行错误时返回对应的判题结果，否则返回 None
+    runtime_logs 为运行错误时追加的日志（默认为退出码和 stderr）；
+    流式比较发现输出不同而提前终止的程序不算运行错误
+    """
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
+    if run_res["timeout"]:
+        return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
+    if run_res["exit_code"] != 0 and not run_res.get("output_mismatch"):
+        if runtime_logs is None:
+            runtime_logs = ["运行错误 (退出码 {}):".format(run_res["exit_code"]), run_res["stderr"]]
+        return {"status": "runtime_error", "score": 0, "logs": logs + runtime_logs}
+    return None
+
+
 # ============================================================
 # 判题器 (Judgers)
 # ============================================================
 
-def judge_text_exact(config, work_dir, resource_dir):
+def text_exact_score(ctx):
     """精确文本匹配"""
+    config = ctx["config"]
     filename = config["filename"]
     expected = config["expected"]
     
-    content = read_text_file(os.path.join(work_dir, filename))
+    content = read_text_file(os.path.join(ctx["work_dir"], filename))
     if content is None:
         return {
             "status": "runtime_error",
@@ -404,26 +1272,19 @@ def judge_text_exact(config, work_dir, resource_dir):
         }
 
 
-def judge_compile_run(config, work_dir, resource_dir, problem_id):
-    """编译运行并检查输出"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
-    
+# 只读取提交的文本文件，快速通道直接判题
+register_judger("text_exact", cacheable=True, fast=text_exact_score, score=text_exact_score)
+
+
+def compile_run_build(ctx):
+    """编译运行并检查输出：编译"""
+    config = ctx["config"]
+    logs = ctx["logs"]
     filename = config["filename"]
     compile_cmd = config.get("compile_cmd", "gcc -o main -pedantic -std=gnu99 -Wall -Werror {}").format(filename=filename)
-    expected_output = config["expected_output"]
     
-    # 编译
     logs.append("正在编译...")
-    build_res = run_command(compile_cmd, timeout=30, cwd=problem_ws)
+    build_res = compile_command(compile_cmd, timeout=30, cwd=ctx["problem_ws"])
     if build_res["exit_code"] != 0:
         return {
             "status": "compile_error",
@@ -431,20 +1292,23 @@ def judge_compile_run(config, work_dir, resource_dir, problem_id):
             "logs": logs + ["编译失败:", build_res["stderr"]]
         }
     logs.append("✓ 编译成功")
-    
-    # 运行
+    return None
+
+
+def compile_run_run(ctx):
+    """编译运行并检查输出：运行"""
+    logs = ctx["logs"]
     logs.append("正在运行...")
-    run_res = run_command("./main", timeout=5, cwd=problem_ws)
-    if run_res["timeout"]:
-        return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
-    if run_res["exit_code"] != 0:
-        return {
-            "status": "runtime_error", 
-            "score": 0, 
-            "logs": logs + ["运行错误 (退出码 {}):".format(run_res["exit_code"]), run_res["stderr"]]
-        }
-    
-    # 检查输出
+    run_res = run_command(["./main"], timeout=time_limit(5), cwd=ctx["problem_ws"])
+    ctx["run_res"] = run_res
+    return run_failure(run_res, logs)
+
+
+def compile_run_score(ctx):
+    """编译运行并检查输出：比较输出"""
+    logs = ctx["logs"]
+    run_res = ctx["run_res"]
+    expected_output = ctx["config"]["expected_output"]
     if run_res["stdout"] == expected_output:
         return {
             "status": "accepted",
@@ -463,98 +1327,202 @@ def judge_compile_run(config, work_dir, resource_dir, problem_id):
         }
 
 
-def judge_link_object(config, work_dir, resource_dir, problem_id):
+register_judger("compile_run", resources=("workspace", "compiler", "sandbox"), cacheable=True,
+                prepare=prepare_workspace, build=compile_run_build, run=compile_run_run, score=compile_run_score)
+
+
+def batch_harness_command(config, problem_ws):
+    """
+    批量测试驱动的编译命令：沿用题目 compile_cmd 的编译选项和源文件、.o 文件，只把输出换成驱动、加上驱动源码；
+    .o 文件中的 main 改名后再链接（objcopy 失败时返回 None）
+    """
+    tokens = shlex.split(config["compile_cmd"])
+    command = [tokens[0], "-o", BATCH_HARNESS_NAME]
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "-o":
+            i += 2
+            continue
+        if token.endswith(".o"):
+            renamed = "{}_{}".format(BATCH_HARNESS_NAME, os.path.basename(token))
+            unlink_existing(os.path.join(problem_ws, renamed))
+            res = run_command(["objcopy", "--redefine-sym", "main={}_object_main".format(BATCH_HARNESS_NAME), token, renamed],
+                              timeout=30, cwd=problem_ws, limits=None)
+            if res["exit_code"] != 0:
+                return None
+            token = renamed
+        command.append(token)
+        i += 1
+    return " ".join(shlex.quote(token) for token in command + [BATCH_HARNESS_NAME + ".c"])
+
+
+def run_batch_harness(config, test_cases, problem_ws, executable, policy, timeout=5):
+    """
+    用批量测试驱动在一个进程内运行全部测试用例，返回 {序号: 与 run_command 相同格式的结果}
+    驱动与学生程序使用相同的编译选项和 .o 文件（见 batch_harness_command）；
+    某个用例崩溃或超时（驱动内 alarm）时记录该用例的结果，再从下一个用例启动驱动。
+    同一进程内的用例之间可能通过静态 / 全局变量互相影响：取驱动中最后运行完的用例用 ./executable 单独运行一次，
+    输出或退出码不同时放弃批量结果。
+    args 不是声明的参数类型的字面量、驱动编译失败等情况返回的结果不完整，缺少的用例由调用方逐个运行
+    """
+    results = {}
+    try:
+        source = build_batch_harness(config, test_cases, timeout)
+    except ValueError:
+        return results
+    write_text_file(os.path.join(problem_ws, BATCH_HARNESS_NAME + ".c"), source)
+    build_cmd = batch_harness_command(config, problem_ws)
+    if build_cmd is None:
+        return results
+    build_res = compile_command(build_cmd, timeout=30, cwd=problem_ws)
+    if build_res["exit_code"] != 0:
+        return results
+
+    tag = "@@judge-" + uuid.uuid4().hex[:12]
+    start = 0
+    while start < len(test_cases) and not policy.out_of_time():
+        res = run_command(["./" + BATCH_HARNESS_NAME, str(start), tag],
+                          timeout=policy.timeout(timeout * (len(test_cases) - start) + 1), cwd=problem_ws)
+        if res.get("output_limit_exceeded"):
+            # 截断后的输出无法可靠切分，剩余用例由调用方逐个运行
+            break
+        done, current, partial = parse_batch_output(res["stdout"] or "", tag)
+        for index, (output, value) in done.items():
+            results[index] = {"stdout": output, "stderr": "", "exit_code": 0, "timeout": False, "return": value}
+        if current is None:
+            break
+        # 驱动在用例 current 中退出、崩溃或超时
+        timed_out = res["timeout"] or res["exit_code"] == -signal.SIGALRM
+        results[current] = {
+            "stdout": partial,
+            "stderr": res["stderr"],
+            "exit_code": -1 if timed_out else res["exit_code"],
+            "timeout": timed_out
+        }
+        start = current + 1
+
+    completed = [index for index, result in results.items() if result["exit_code"] == 0]
+    if completed:
+        index = max(completed)
+        check = run_command(["./" + executable] + shlex.split(test_cases[index].get("args", "")),
+                            timeout=policy.timeout(timeout), cwd=problem_ws)
+        if check["timeout"] or check["exit_code"] != 0 or check["stdout"] != results[index]["stdout"]:
+            return {}
+    return results
+
+
+def link_object_build(ctx):
     """链接 .o 文件编译"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    compile_cmd = ctx["config"]["compile_cmd"]
+    logs = ctx["logs"]
     
-    compile_cmd = config["compile_cmd"]
-    test_cases = config.get("test_cases", [])
-    
-    # 编译
     logs.append("正在编译 (链接 .o 文件)...")
-    build_res = run_command(compile_cmd, timeout=30, cwd=problem_ws)
+    build_res = compile_command(compile_cmd, timeout=30, cwd=ctx["problem_ws"])
     if build_res["exit_code"] != 0:
+        emit_progress("compiled", ok=False)
         return {
             "status": "compile_error",
             "score": 0,
             "logs": logs + ["编译失败:", build_res["stderr"]]
         }
     logs.append("✓ 编译成功")
+    emit_progress("compiled", ok=True)
     
     # 获取可执行文件名
-    exe_name = compile_cmd.split("-o")[1].strip().split()[0] if "-o" in compile_cmd else "a.out"
+    ctx["executable"] = compile_cmd.split("-o")[1].strip().split()[0] if "-o" in compile_cmd else "a.out"
+    return None
+
+
+def link_object_run(ctx):
+    """逐个运行测试用例并比较输出（ctx["passed"] 为通过的用例数）"""
+    config = ctx["config"]
+    logs = ctx["logs"]
+    problem_ws = ctx["problem_ws"]
+    exe_name = ctx["executable"]
+    test_cases = config.get("test_cases", [])
+    if not test_cases:
+        return None
     
-    # 运行测试用例
-    if test_cases:
-        passed = 0
-        total = len(test_cases)
+    passed = 0
+    total = len(test_cases)
+    policy = TestRunPolicy(config, total)
+    output_limited = False
+    
+    # 配置了批量测试驱动时在一个进程内运行全部用例，未得到结果的用例再单独运行
+    batch = run_batch_harness(config, test_cases, problem_ws, exe_name, policy, timeout=time_limit(5)) if config.get("batch_harness") else {}
+    
+    def run_case(i, tc):
+        if i in batch:
+            return batch[i]
+        expected_file = tc.get("expected_file")
+        comparator = output_comparator(config, os.path.join(problem_ws, expected_file)) if expected_file else None
+        return run_command(["./" + exe_name] + shlex.split(tc.get("args", "")), timeout=policy.timeout(time_limit(5)), cwd=problem_ws,
+                           comparator=comparator)
+    
+    for i, tc, run_res in run_test_cases(policy, test_cases, run_case):
+        args = tc.get("args", "")
+        expected_file = tc.get("expected_file")
         
-        for i, tc in enumerate(test_cases):
-            args = tc.get("args", "")
-            expected_file = tc.get("expected_file")
-            
-            run_res = run_command("./{} {}".format(exe_name, args), timeout=5, cwd=problem_ws)
-            
-            if run_res["timeout"]:
-                logs.append("测试 {} ({}) - 超时".format(i+1, args))
-                continue
-            
-            if run_res["exit_code"] != 0:
-                logs.append("测试 {} ({}) - 运行错误".format(i+1, args))
-                continue
-            
-            # 检查输出
-            if expected_file:
-                expected = read_text_file(os.path.join(problem_ws, expected_file))
-                if expected and run_res["stdout"] == expected:
-                    logs.append("✓ 测试 {} ({}) - 通过".format(i+1, args))
-                    passed += 1
-                else:
-                    logs.append("✗ 测试 {} ({}) - 输出不匹配".format(i+1, args))
+        ok = False
+        if run_res["timeout"]:
+            logs.append("测试 {} ({}) - 超时".format(i+1, args))
+        elif run_res.get("output_limit_exceeded"):
+            logs.append("测试 {} ({}) - 输出超限".format(i+1, args))
+            output_limited = True
+        elif run_res["exit_code"] != 0 and not run_res.get("output_mismatch"):
+            logs.append("测试 {} ({}) - 运行错误".format(i+1, args))
+        elif "expected_return" in tc and run_res.get("return") != tc["expected_return"]:
+            logs.append("✗ 测试 {} ({}) - 返回值错误 (期望 {}, 实际 {})".format(
+                i+1, args, tc["expected_return"], run_res.get("return")))
+        # 检查输出
+        elif expected_file:
+            ok, diff = check_output(config, run_res, expected_file=os.path.join(problem_ws, expected_file))
+            if ok:
+                logs.append("✓ 测试 {} ({}) - 通过".format(i+1, args))
             else:
-                logs.append("? 测试 {} ({}) - 已运行".format(i+1, args))
-                passed += 1
-        
-        score = int(100 * passed / total) if total > 0 else 0
-        status = "accepted" if passed == total else "wrong_answer"
-        logs.append("通过 {}/{} 个测试".format(passed, total))
+                logs.append("✗ 测试 {} ({}) - 输出不匹配 ({})".format(i+1, args, diff))
+        else:
+            logs.append("? 测试 {} ({}) - 已运行".format(i+1, args))
+            ok = True
         
-        return {"status": status, "score": score, "logs": logs}
-    else:
-        # 无测试用例，只验证编译
+        if ok:
+            passed += 1
+        policy.record(ok, run_res["timeout"])
+        emit_progress("test", index=i + 1, total=total, passed=ok, message=logs[-1])
+    
+    logs.extend(policy.finish(ctx))
+    ctx["passed"] = passed
+    ctx["output_limited"] = output_limited
+    return None
+
+
+def link_object_score(ctx):
+    """按通过的测试用例数给分；没有测试用例时只验证编译"""
+    logs = ctx["logs"]
+    total = len(ctx["config"].get("test_cases", []))
+    if not total:
         return {"status": "accepted", "score": 100, "logs": logs + ["✓ 编译验证通过"]}
+    
+    passed = ctx["passed"]
+    score = int(100 * passed / total)
+    status = "accepted" if passed == total else "output_limit_exceeded" if ctx["output_limited"] else "wrong_answer"
+    logs.append("通过 {}/{} 个测试".format(passed, total))
+    return {"status": status, "score": score, "logs": logs}
+
+
+register_judger("link_object", resources=("workspace", "compiler", "sandbox", "parallel_tests"), cacheable=True,
+                prepare=prepare_workspace, build=link_object_build, run=link_object_run, score=link_object_score)
 
 
-def judge_makefile_project(config, work_dir, resource_dir, problem_id):
+def makefile_project_build(ctx):
     """使用 Makefile 编译的项目"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    make_target = ctx["config"].get("make_target", "")
+    logs = ctx["logs"]
     
-    make_target = config.get("make_target", "")
-    executable = config.get("executable", make_target)
-    expected_file = config.get("expected_file")
-    
-    # Make 编译
     logs.append("正在使用 Makefile 编译...")
-    make_cmd = "make {}".format(make_target) if make_target else "make"
-    build_res = run_command(make_cmd, timeout=60, cwd=problem_ws)
+    make_cmd = ["make", make_target] if make_target else ["make"]
+    build_res = run_command(make_cmd, timeout=60, cwd=ctx["problem_ws"], limits=None)
     if build_res["exit_code"] != 0:
         return {
             "status": "compile_error",
@@ -562,24 +1530,33 @@ def judge_makefile_project(config, work_dir, resource_dir, problem_id):
             "logs": logs + ["Make 失败:", build_res["stderr"], build_res["stdout"]]
         }
     logs.append("✓ 编译成功")
+    return None
+
+
+def makefile_project_run(ctx):
+    """运行（有期望输出时边运行边比较，出现不同立即终止）"""
+    config = ctx["config"]
+    executable = config.get("executable", config.get("make_target", ""))
+    expected_file = config.get("expected_file")
     
-    # 运行
-    logs.append("正在运行 {}...".format(executable))
-    run_res = run_command("./{}".format(executable), timeout=10, cwd=problem_ws)
-    
-    if run_res["timeout"]:
-        return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
-    if run_res["exit_code"] != 0:
-        return {
-            "status": "runtime_error",
-            "score": 0,
-            "logs": logs + ["运行错误 (退出码 {}):".format(run_res["exit_code"]), run_res["stderr"]]
-        }
-    
-    # 检查输出
+    ctx["logs"].append("正在运行 {}...".format(executable))
+    expected_path = os.path.join(ctx["problem_ws"], expected_file) if expected_file else None
+    comparator = output_comparator(config, expected_path) if expected_file else None
+    run_res = run_command(["./" + executable], timeout=time_limit(10), cwd=ctx["problem_ws"], comparator=comparator)
+    ctx["run_res"] = run_res
+    return run_failure(run_res, ctx["logs"])
+
+
+def makefile_project_score(ctx):
+    """检查输出"""
+    config = ctx["config"]
+    logs = ctx["logs"]
+    run_res = ctx["run_res"]
+    expected_file = config.get("expected_file")
     if expected_file:
-        expected = read_text_file(os.path.join(problem_ws, expected_file))
-        if expected and run_res["stdout"] == expected:
+        expected_path = os.path.join(ctx["problem_ws"], expected_file)
+        ok, diff = check_output(config, run_res, expected_file=expected_path)
+        if ok:
             return {
                 "status": "accepted",
                 "score": 100,
@@ -590,8 +1567,8 @@ def judge_makefile_project(config, work_dir, resource_dir, problem_id):
                 "status": "wrong_answer",
                 "score": 0,
                 "logs": logs + [
-                    "✗ 输出不匹配",
-                    "--- 期望 ---", expected or "(无法读取)",
+                    "✗ 输出不匹配 ({})".format(diff),
+                    "--- 期望 ---", read_text_file(expected_path) or "(无法读取)",
                     "--- 实际 ---", run_res["stdout"]
                 ]
             }
@@ -603,7 +1580,15 @@ def judge_makefile_project(config, work_dir, resource_dir, problem_id):
         }
 
 
-def judge_code1_grader(work_dir, problem_ws, logs):
+register_judger("makefile_project", resources=("workspace", "compiler", "sandbox"), cacheable=True,
+                prepare=prepare_workspace, build=makefile_project_build, run=makefile_project_run,
+                score=makefile_project_score)
+
+
+@register_grader("code1_grader", harness={
+    "autograde.c": {"source": load_harness("code1_autograde.c")},
+})
+def judge_code1_grader(work_dir, problem_ws, harness, logs):
     """code1 (Max函数) 专用评测器"""
     code_path = os.path.join(problem_ws, "code1.c")
     code = read_text_file(code_path)
@@ -616,12 +1601,14 @@ def judge_code1_grader(work_dir, problem_ws, logs):
     # 添加头文件并编译
     tmp_c = os.path.join(problem_ws, "temp.c")
     write_text_file(tmp_c, "#include <stdio.h>\n#include <stdlib.h>\n" + code)
-    build_res = run_command('gcc -Wall -Werror -pedantic -std=gnu99 temp.c -o code1', timeout=30, cwd=problem_ws)
+    build_res = compile_command('gcc -Wall -Werror -pedantic -std=gnu99 temp.c -o code1', timeout=30, cwd=problem_ws)
     if build_res["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["编译失败:", build_res["stderr"]]}
 
     # 运行学生程序
-    run_res = run_command("./code1", timeout=5, cwd=problem_ws)
+    run_res = run_command(["./code1"], timeout=time_limit(5), cwd=problem_ws)
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
     if run_res["exit_code"] != 0:
@@ -646,44 +1633,23 @@ def judge_code1_grader(work_dir, problem_ws, logs):
     
     logs.append("✓ 基础测试通过")
     
-    # 隐藏测试
-    grade_c = """
-#include <stdio.h>
-#include <limits.h>
-#define main student_main
-#include "code1.c"
-#undef main
-static int expect_max(int a, int b) { return a > b ? a : b; }
-int main(void) {
-  int xs[] = {-999, -87, 0, 1, 240, 345, 999999, INT_MAX};
-  int ys[] = {INT_MIN, 123, 567, 891, 0, 1, -999, 123123123};
-  size_t i, j;
-  int ok = 1;
-  for (i = 0; i < sizeof(xs)/sizeof(xs[0]); i++) {
-    for (j = 0; j < sizeof(ys)/sizeof(ys[0]); j++) {
-      int a = xs[i], b = ys[j];
-      int got = max(a, b);
-      int exp = expect_max(a, b);
-      if (got == exp) printf("Testing max(%d, %d) ... Correct\\n", a, b);
-      else { printf("Testing max(%d, %d) ... Incorrect (got %d, expected %d)\\n", a, b, got, exp); ok = 0; }
-    }
-  }
-  return ok ? 0 : 1;
-}
-"""
-    write_text_file(os.path.join(problem_ws, "autograde.c"), grade_c)
-    grade_build = run_command('gcc -Wall -Werror -pedantic -std=gnu99 autograde.c -o autograde', timeout=30, cwd=problem_ws)
+    # 隐藏测试（评测程序直接 #include 学生代码，只能现场编译）
+    write_harness(problem_ws, harness, "code1_grader", "autograde.c")
+    grade_build = compile_command('gcc -Wall -Werror -pedantic -std=gnu99 autograde.c -o autograde', timeout=30, cwd=problem_ws)
     if grade_build["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["评测器编译失败:", grade_build["stderr"]]}
 
-    grade_run = run_command("./autograde", timeout=5, cwd=problem_ws)
+    grade_run = run_command(["./autograde"], timeout=time_limit(5), cwd=problem_ws)
     if grade_run["exit_code"] != 0:
         return {"status": "wrong_answer", "score": 0, "logs": logs + ["隐藏测试未通过:", grade_run["stdout"]]}
 
     return {"status": "accepted", "score": 100, "logs": logs + ["✓ 所有测试通过!", "--- 隐藏测试结果 ---", grade_run["stdout"]]}
 
 
-def judge_code2_grader(work_dir, problem_ws, logs):
+@register_grader("code2_grader", harness={
+    "autograde.c": {"source": load_harness("code2_autograde.c")},
+})
+def judge_code2_grader(work_dir, problem_ws, harness, logs):
     """code2 (PrintTriangle) 专用评测器"""
     code_path = os.path.join(problem_ws, "code2.c")
     code = read_text_file(code_path)
@@ -696,12 +1662,14 @@ def judge_code2_grader(work_dir, problem_ws, logs):
     # 编译
     tmp_c = os.path.join(problem_ws, "temp.c")
     write_text_file(tmp_c, "#include <stdio.h>\n#include <stdlib.h>\n" + code)
-    build_res = run_command('gcc -Wall -Werror -pedantic -std=gnu99 temp.c -o code2', timeout=30, cwd=problem_ws)
+    build_res = compile_command('gcc -Wall -Werror -pedantic -std=gnu99 temp.c -o code2', timeout=30, cwd=problem_ws)
     if build_res["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["编译失败:", build_res["stderr"]]}
 
     # 运行
-    run_res = run_command("./code2", timeout=5, cwd=problem_ws)
+    run_res = run_command(["./code2"], timeout=time_limit(5), cwd=problem_ws)
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
     if run_res["exit_code"] != 0:
@@ -719,50 +1687,31 @@ def judge_code2_grader(work_dir, problem_ws, logs):
     
     logs.append("✓ 基础测试通过")
     
-    # 隐藏测试
-    grade_c = """
-#include <stdio.h>
-#include <stdlib.h>
-#define main student_main
-#include "code2.c"
-#undef main
-static int triangular(int n) { return n <= 0 ? 0 : (n * (n + 1)) / 2; }
-int main(void) {
-  freopen("/dev/null", "w", stdout);
-  int tests[] = {0, 1, 2, 3, 4, 7, 9, 12, 95, 159, 343, 2438};
-  size_t i;
-  int ok = 1;
-  for (i = 0; i < sizeof(tests)/sizeof(tests[0]); i++) {
-    int n = tests[i];
-    int got = printTriangle(n);
-    int pass = (got == triangular(n));
-    if (pass) fprintf(stderr, "Testing printTriangle(%d) ... Correct\\n", n);
-    else { fprintf(stderr, "Testing printTriangle(%d) ... Incorrect\\n", n); ok = 0; }
-  }
-  return ok ? 0 : 1;
-}
-"""
-    write_text_file(os.path.join(problem_ws, "autograde.c"), grade_c)
-    grade_build = run_command('gcc -Wall -Werror -pedantic -std=gnu99 autograde.c -o autograde', timeout=30, cwd=problem_ws)
+    # 隐藏测试（评测程序直接 #include 学生代码，只能现场编译）
+    write_harness(problem_ws, harness, "code2_grader", "autograde.c")
+    grade_build = compile_command('gcc -Wall -Werror -pedantic -std=gnu99 autograde.c -o autograde', timeout=30, cwd=problem_ws)
     if grade_build["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["评测器编译失败:", grade_build["stderr"]]}
 
-    grade_run = run_command("./autograde", timeout=10, cwd=problem_ws)
+    grade_run = run_command(["./autograde"], timeout=time_limit(10), cwd=problem_ws)
     if grade_run["exit_code"] != 0:
         return {"status": "wrong_answer", "score": 0, "logs": logs + ["隐藏测试未通过:", grade_run["stderr"]]}
     
     return {"status": "accepted", "score": 100, "logs": logs + ["✓ 所有测试通过!", "--- 隐藏测试结果 ---", grade_run["stderr"]]}
 
 
-def judge_array_max_grader(work_dir, problem_ws, logs):
+@register_grader("array_max_grader")
+def judge_array_max_grader(work_dir, problem_ws, harness, logs):
     """arrayMax 专用评测器"""
-    build_res = run_command('gcc -o main -pedantic -std=gnu99 -Wall -Werror arrayMax.c', timeout=30, cwd=problem_ws)
+    build_res = compile_command('gcc -o main -pedantic -std=gnu99 -Wall -Werror arrayMax.c', timeout=30, cwd=problem_ws)
     if build_res["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["编译失败:", build_res["stderr"]]}
     
     logs.append("✓ 编译成功")
     
-    run_res = run_command("./main", timeout=5, cwd=problem_ws)
+    run_res = run_command(["./main"], timeout=time_limit(5), cwd=problem_ws)
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
     if run_res["exit_code"] != 0:
@@ -791,7 +1740,11 @@ def judge_array_max_grader(work_dir, problem_ws, logs):
     return {"status": "accepted", "score": 100, "logs": logs + ["✓ 所有测试通过!", "--- 输出 ---", run_res["stdout"]]}
 
 
-def judge_maxseq_grader(work_dir, problem_ws, logs):
+@register_grader("maxseq_grader", harness={
+    "test_driver.c": {"source": load_harness("maxseq_test_driver.c")},
+    "test_driver.o": {"compile": "gcc -c -o test_driver.o -Wall -Werror -std=gnu99 -pedantic test_driver.c"},
+})
+def judge_maxseq_grader(work_dir, problem_ws, harness, logs):
     """maxSeq (最长连续子序列) 专用评测器"""
     
     # 检查 maxSeq.c 是否存在
@@ -804,75 +1757,12 @@ def judge_maxseq_grader(work_dir, problem_ws, logs):
     if student_code is None:
         return {"status": "runtime_error", "score": 0, "logs": ["无法读取 maxSeq.c"]}
     
-    # 创建测试驱动程序
-    test_driver = '''
-#include <stdio.h>
-#include <stdlib.h>
-
-// 学生实现的函数
-size_t maxSeq(int * array, size_t n);
-
-// 测试用例结构
-typedef struct {
-    int *arr;
-    size_t n;
-    size_t expected;
-    const char *desc;
-} TestCase;
-
-int main(void) {
-    int passed = 0;
-    int total = 0;
-    
-    // 测试用例
-    int arr1[] = {1, 2, 3, 4, 5};
-    int arr2[] = {5, 4, 3, 2, 1};
-    int arr3[] = {1, 2, 1, 2, 1};
-    int arr4[] = {1};
-    int arr5[] = {1, 2, 3, 1, 2, 3, 4, 5};
-    int arr6[] = {1, 1, 1, 1};
-    int arr7[] = {-5, -4, -3, -2, -1};
-    int arr8[] = {1, 3, 5, 4, 7};
-    
-    TestCase tests[] = {
-        {arr1, 5, 5, "递增序列 [1,2,3,4,5]"},
-        {arr2, 5, 1, "递减序列 [5,4,3,2,1]"},
-        {arr3, 5, 2, "交替序列 [1,2,1,2,1]"},
-        {arr4, 1, 1, "单元素 [1]"},
-        {NULL, 0, 0, "空数组"},
-        {arr5, 8, 5, "后半段更长 [1,2,3,1,2,3,4,5]"},
-        {arr6, 4, 1, "全相等 [1,1,1,1]"},
-        {arr7, 5, 5, "负数递增 [-5,-4,-3,-2,-1]"},
-        {arr8, 5, 3, "中间下降 [1,3,5,4,7]"},
-    };
-    
-    total = sizeof(tests) / sizeof(tests[0]);
-    
-    for (int i = 0; i < total; i++) {
-        size_t result = maxSeq(tests[i].arr, tests[i].n);
-        if (result == tests[i].expected) {
-            printf("✓ 测试 %d: %s - 正确 (got %zu)\\n", i+1, tests[i].desc, result);
-            passed++;
-        } else {
-            printf("✗ 测试 %d: %s - 错误 (expected %zu, got %zu)\\n", 
-                   i+1, tests[i].desc, tests[i].expected, result);
-        }
-    }
-    
-    printf("\\n通过 %d/%d 个测试\\n", passed, total);
-    
-    return (passed == total) ? EXIT_SUCCESS : EXIT_FAILURE;
-}
-'''
-    
-    # 写入测试驱动
-    test_driver_path = os.path.join(problem_ws, "test_driver.c")
-    write_text_file(test_driver_path, test_driver)
-    
-    # 编译：学生代码 + 测试驱动
+    # 编译：学生代码 + 预编译的测试驱动 test_driver.o
     logs.append("正在编译...")
-    compile_cmd = "gcc -o test_maxseq -Wall -Werror -std=gnu99 -pedantic maxSeq.c test_driver.c"
-    build_res = run_command(compile_cmd, timeout=30, cwd=problem_ws)
+    build_res = build_harness_object(problem_ws, harness, "maxseq_grader", "test_driver.o")
+    if build_res is None:
+        build_res = compile_command("gcc -o test_maxseq -Wall -Werror -std=gnu99 -pedantic maxSeq.c test_driver.o",
+                                    timeout=30, cwd=problem_ws)
     
     if build_res["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["编译失败:", build_res["stderr"]]}
@@ -881,8 +1771,10 @@ int main(void) {
     
     # 运行测试
     logs.append("正在运行测试...")
-    run_res = run_command("./test_maxseq", timeout=5, cwd=problem_ws)
+    run_res = run_command(["./test_maxseq"], timeout=time_limit(5), cwd=problem_ws)
     
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
     
@@ -894,7 +1786,14 @@ int main(void) {
     return {"status": "accepted", "score": 100, "logs": logs + ["✓ 所有测试通过!"]}
 
 
-def judge_cards_grader(work_dir, problem_ws, logs):
+@register_grader("cards_grader", harness={
+    "auto_test.c": {"source": load_harness("cards_auto_test.c")},
+    "auto_test.o": {
+        "compile": "gcc -c -o auto_test.o -Wall -Werror -std=gnu99 -pedantic auto_test.c",
+        "depends": ["cards.h"],
+    },
+})
+def judge_cards_grader(work_dir, problem_ws, harness, logs):
     """cards (扑克牌) 专用评测器"""
     
     # 检查必要文件
@@ -906,111 +1805,12 @@ def judge_cards_grader(work_dir, problem_ws, logs):
     if not os.path.exists(cards_h):
         return {"status": "runtime_error", "score": 0, "logs": ["缺少文件: cards.h"]}
     
-    # 创建测试程序
-    test_code = '''
-#include <stdio.h>
-#include <stdlib.h>
-#include <string.h>
-#include <assert.h>
-#include "cards.h"
-
-int passed = 0;
-int total = 0;
-
-void test(int condition, const char *name) {
-    total++;
-    if (condition) {
-        printf("✓ %s\\n", name);
-        passed++;
-    } else {
-        printf("✗ %s\\n", name);
-    }
-}
-
-int main(void) {
-    printf("=== 扑克牌测试 ===\\n\\n");
-    
-    // 测试 card_from_num
-    printf("--- card_from_num 测试 ---\\n");
-    
-    // 验证 52 张牌都不同
-    int seen[52] = {0};
-    int unique = 1;
-    for (unsigned i = 0; i < 52; i++) {
-        card_t c = card_from_num(i);
-        // 验证牌值有效
-        if (c.value < 2 || c.value > VALUE_ACE || c.suit < SPADES || c.suit > CLUBS) {
-            unique = 0;
-            break;
-        }
-        int idx = (c.value - 2) * 4 + c.suit;
-        if (idx < 0 || idx >= 52 || seen[idx]) {
-            unique = 0;
-            break;
-        }
-        seen[idx] = 1;
-    }
-    test(unique, "card_from_num 生成 52 张不同的牌");
-    
-    // 测试 value_letter
-    printf("\\n--- value_letter 测试 ---\\n");
-    card_t c2 = {2, SPADES};
-    card_t c10 = {10, HEARTS};
-    card_t cJ = {VALUE_JACK, DIAMONDS};
-    card_t cQ = {VALUE_QUEEN, CLUBS};
-    card_t cK = {VALUE_KING, SPADES};
-    card_t cA = {VALUE_ACE, HEARTS};
-    
-    test(value_letter(c2) == '2', "value_letter(2) == '2'");
-    test(value_letter(c10) == '0', "value_letter(10) == '0'");
-    test(value_letter(cJ) == 'J', "value_letter(Jack) == 'J'");
-    test(value_letter(cQ) == 'Q', "value_letter(Queen) == 'Q'");
-    test(value_letter(cK) == 'K', "value_letter(King) == 'K'");
-    test(value_letter(cA) == 'A', "value_letter(Ace) == 'A'");
-    
-    // 测试 suit_letter
-    printf("\\n--- suit_letter 测试 ---\\n");
-    card_t cs = {5, SPADES};
-    card_t ch = {5, HEARTS};
-    card_t cd = {5, DIAMONDS};
-    card_t cc = {5, CLUBS};
-    
-    test(suit_letter(cs) == 's', "suit_letter(SPADES) == 's'");
-    test(suit_letter(ch) == 'h', "suit_letter(HEARTS) == 'h'");
-    test(suit_letter(cd) == 'd', "suit_letter(DIAMONDS) == 'd'");
-    test(suit_letter(cc) == 'c', "suit_letter(CLUBS) == 'c'");
-    
-    // 测试 card_from_letters
-    printf("\\n--- card_from_letters 测试 ---\\n");
-    card_t as = card_from_letters('A', 's');
-    test(as.value == VALUE_ACE && as.suit == SPADES, "card_from_letters('A', 's')");
-    
-    card_t kc = card_from_letters('K', 'c');
-    test(kc.value == VALUE_KING && kc.suit == CLUBS, "card_from_letters('K', 'c')");
-    
-    card_t ten_d = card_from_letters('0', 'd');
-    test(ten_d.value == 10 && ten_d.suit == DIAMONDS, "card_from_letters('0', 'd')");
-    
-    // 测试 ranking_to_string
-    printf("\\n--- ranking_to_string 测试 ---\\n");
-    test(strcmp(ranking_to_string(STRAIGHT_FLUSH), "STRAIGHT_FLUSH") == 0, "STRAIGHT_FLUSH");
-    test(strcmp(ranking_to_string(FOUR_OF_A_KIND), "FOUR_OF_A_KIND") == 0, "FOUR_OF_A_KIND");
-    test(strcmp(ranking_to_string(NOTHING), "NOTHING") == 0, "NOTHING");
-    
-    printf("\\n=== 结果: %d/%d 通过 ===\\n", passed, total);
-    
-    return (passed == total) ? EXIT_SUCCESS : EXIT_FAILURE;
-}
-'''
-    
-    # 写入测试程序
-    test_path = os.path.join(problem_ws, "auto_test.c")
-    write_text_file(test_path, test_code)
-    
-    # 编译
+    # 编译：只编译 cards.c，与预编译的 auto_test.o 链接（提交修改了 cards.h 时 auto_test.o 按其内容重新编译并缓存）
     logs.append("正在编译 cards.c...")
-    compile_cmd = "gcc -o auto_test -Wall -Werror -std=gnu99 -pedantic cards.c auto_test.c"
-    build_res = run_command(compile_cmd, timeout=30, cwd=problem_ws)
+    build_res = build_harness_object(problem_ws, harness, "cards_grader", "auto_test.o")
+    if build_res is None:
+        build_res = compile_command("gcc -o auto_test -Wall -Werror -std=gnu99 -pedantic cards.c auto_test.o",
+                                    timeout=30, cwd=problem_ws)
     
     if build_res["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["编译失败:", build_res["stderr"]]}
@@ -1019,8 +1819,10 @@ int main(void) {
     
     # 运行测试
     logs.append("正在运行测试...")
-    run_res = run_command("./auto_test", timeout=10, cwd=problem_ws)
+    run_res = run_command(["./auto_test"], timeout=time_limit(10), cwd=problem_ws)
     
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
     
@@ -1046,135 +1848,190 @@ int main(void) {
     return {"status": "accepted", "score": 100, "logs": logs + ["✓ 所有测试通过!"]}
 
 
-def judge_code_with_grader(config, work_dir, resource_dir, problem_id):
-    """带评测器的代码题"""
-    logs = []
+def code_with_grader_run(ctx):
+    """带评测器的代码题：由题目配置中的评测程序编译、运行并评分"""
+    grader = ctx["config"]["grader"]
     
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
-    
-    grader = config["grader"]
-    
-    if grader == "code1_grader":
-        return judge_code1_grader(work_dir, problem_ws, logs)
-    elif grader == "code2_grader":
-        return judge_code2_grader(work_dir, problem_ws, logs)
-    elif grader == "array_max_grader":
-        return judge_array_max_grader(work_dir, problem_ws, logs)
-    elif grader == "maxseq_grader":
-        return judge_maxseq_grader(work_dir, problem_ws, logs)
-    elif grader == "cards_grader":
-        return judge_cards_grader(work_dir, problem_ws, logs)
-    else:
+    if grader not in GRADERS:
         return {"status": "system_error", "score": 0, "logs": ["Unknown grader: " + grader]}
+    return GRADERS[grader](ctx["work_dir"], ctx["problem_ws"], ctx["harness"], ctx["logs"])
 
 
-def judge_reading(config, work_dir, resource_dir, problem_id):
-    """阅读理解题"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
-    
-    answer_file = config.get("answer_file", "answer.txt")
-    answer_path = os.path.join(problem_ws, answer_file)
+# 评测程序的编译、运行和隐藏测试相互交错（前一步通过才进行下一步），整体作为 run 阶段
+register_judger("code_with_grader", resources=("workspace", "compiler", "sandbox"), cacheable=True,
+                prepare=prepare_workspace, run=code_with_grader_run)
+
+
+def reading_prepare(ctx):
+    """阅读理解题：准备工作空间并检查答案文件"""
+    result = prepare_workspace(ctx)
+    if result is not None:
+        return result
     
-    if not os.path.exists(answer_path):
+    answer_file = ctx["config"].get("answer_file", "answer.txt")
+    if not os.path.exists(os.path.join(ctx["problem_ws"], answer_file)):
         return {"status": "runtime_error", "score": 0, "logs": ["缺少答案文件: " + answer_file]}
+    return None
+
+
+def reading_build(ctx):
+    """检查 Makefile 并编译测试程序"""
+    if not ctx["config"].get("verify_makefile"):
+        return None
+    problem_ws = ctx["problem_ws"]
+    logs = ctx["logs"]
+    if not os.path.exists(os.path.join(problem_ws, "Makefile")):
+        return {"status": "wrong_answer", "score": 0, "logs": ["缺少 Makefile"]}
     
-    # 检查 Makefile
-    if config.get("verify_makefile"):
-        if not os.path.exists(os.path.join(problem_ws, "Makefile")):
-            return {"status": "wrong_answer", "score": 0, "logs": ["缺少 Makefile"]}
-        
-        logs.append("正在使用 Makefile 编译测试程序...")
-        make_res = run_command("make", timeout=30, cwd=problem_ws)
-        if make_res["exit_code"] != 0:
-            return {"status": "compile_error", "score": 0, "logs": logs + ["Make 失败:", make_res["stderr"]]}
-        logs.append("✓ 编译成功")
-    
-    # 运行测试程序并比较答案
-    test_program = config.get("test_program", "test")
+    logs.append("正在使用 Makefile 编译测试程序...")
+    make_res = run_command(["make"], timeout=30, cwd=problem_ws, limits=None)
+    if make_res["exit_code"] != 0:
+        return {"status": "compile_error", "score": 0, "logs": logs + ["Make 失败:", make_res["stderr"]]}
+    logs.append("✓ 编译成功")
+    return None
+
+
+def reading_run(ctx):
+    """运行测试程序（ctx["run_res"] 为其结果，没有测试程序时为 None）"""
+    problem_ws = ctx["problem_ws"]
+    test_program = ctx["config"].get("test_program", "test")
+    ctx["run_res"] = None
     if os.path.exists(os.path.join(problem_ws, test_program)):
-        run_command("chmod +x {}".format(test_program), cwd=problem_ws)
-        run_res = run_command("./{}".format(test_program), timeout=5, cwd=problem_ws)
-    
+        make_executable(os.path.join(problem_ws, test_program))
+        run_res = run_command(["./" + test_program], timeout=time_limit(5), cwd=problem_ws)
         if run_res["exit_code"] != 0:
-            return {"status": "runtime_error", "score": 0, "logs": logs + ["测试程序运行失败:", run_res["stderr"]]}
-        
-        student_answer = read_text_file(answer_path)
-        expected_output = run_res["stdout"]
-        
-        if student_answer and student_answer.strip() == expected_output.strip():
-            return {"status": "accepted", "score": 100, "logs": logs + ["✓ 答案正确!", "--- 你的答案 ---", student_answer.strip()]}
-        else:
-            return {
-                "status": "wrong_answer",
-                "score": 0,
-                "logs": logs + ["✗ 答案不匹配", "--- 你的答案 ---", student_answer.strip() if student_answer else "(空)", "--- 正确答案 ---", expected_output.strip()]
-            }
-    
-    return {"status": "accepted", "score": 100, "logs": logs + ["✓ 答案文件已提交"]}
+            return {"status": "runtime_error", "score": 0, "logs": ctx["logs"] + ["测试程序运行失败:", run_res["stderr"]]}
+        ctx["run_res"] = run_res
+    return None
 
 
-def judge_project_with_test(config, work_dir, resource_dir, problem_id):
-    """综合项目（使用 make test）"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
+def reading_score(ctx):
+    """比较学生答案和测试程序的输出"""
+    logs = ctx["logs"]
+    run_res = ctx["run_res"]
+    if run_res is None:
+        return {"status": "accepted", "score": 100, "logs": logs + ["✓ 答案文件已提交"]}
     
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    student_answer = read_text_file(os.path.join(ctx["problem_ws"], ctx["config"].get("answer_file", "answer.txt")))
+    return reading_verdict(logs, student_answer, run_res["stdout"])
+
+
+def reading_verdict(logs, student_answer, expected_output):
+    """学生答案与测试程序的输出一致时通过"""
+    if student_answer and student_answer.strip() == expected_output.strip():
+        return {"status": "accepted", "score": 100, "logs": logs + ["✓ 答案正确!", "--- 你的答案 ---", student_answer.strip()]}
+    else:
+        return {
+            "status": "wrong_answer",
+            "score": 0,
+            "logs": logs + ["✗ 答案不匹配", "--- 你的答案 ---", student_answer.strip() if student_answer else "(空)", "--- 正确答案 ---", expected_output.strip()]
+        }
+
+
+def reading_template(config, template_dir, manifest):
+    """
+    题目模板中按判题时的步骤编译并运行测试程序，把输出记录在清单中测试程序的条目里（expected_output），
+    测试程序的输出只取决于题目资源，每个资源版本只运行一次
+    """
+    test_program = config.get("test_program", "test")
+    if config.get("verify_makefile"):
+        if not os.path.exists(os.path.join(template_dir, "Makefile")):
+            return
+        make_res = run_command(["make"], timeout=30, cwd=template_dir, limits=None)
+        if make_res["exit_code"] != 0:
+            return
+    path = os.path.join(template_dir, test_program)
+    if not os.path.exists(path):
+        return
+    make_executable(path)
+    run_res = run_command(["./" + test_program], timeout=time_limit(5), cwd=template_dir)
+    if run_res["timeout"] or run_res["exit_code"] != 0 or run_res.get("output_limit_exceeded"):
+        return
+    manifest[test_program] = {"digest": file_digest(path), "depends": {}, "expected_output": run_res["stdout"]}
+
+
+def reading_fast(ctx):
+    """
+    快速通道：提交中只有答案文件、且题目模板中已有测试程序的输出时，直接比较答案
+    （提交了其他文件可能改变测试程序，按流水线判题）
+    """
+    config = ctx["config"]
+    answer_file = config.get("answer_file", "answer.txt")
+    if [name for name in os.listdir(ctx["work_dir"]) if name != "problem"] != [answer_file]:
+        return None
+    _, manifest = find_problem_template(ctx["problem_id"], ctx["resource_dir"], config)
+    entry = manifest.get(config.get("test_program", "test"))
+    if entry is None or "expected_output" not in entry:
+        return None
     
-    make_target = config.get("make_target", "test")
-    test_executable = config.get("test_executable", "test")
+    logs = ["正在使用 Makefile 编译测试程序...", "✓ 编译成功"] if config.get("verify_makefile") else []
+    student_answer = read_text_file(os.path.join(ctx["work_dir"], answer_file))
+    return reading_verdict(logs, student_answer, entry["expected_output"])
+
+
+register_judger("reading", resources=("workspace", "compiler", "sandbox"), cacheable=True,
+                fast=reading_fast, template=reading_template,
+                prepare=reading_prepare, build=reading_build, run=reading_run, score=reading_score)
+
+
+def project_with_test_build(ctx):
+    """综合项目（使用 make test）：编译"""
+    logs = ctx["logs"]
+    make_target = ctx["config"].get("make_target", "test")
     
-    # 编译
     logs.append("正在编译项目...")
-    make_res = run_command("make {}".format(make_target), timeout=60, cwd=problem_ws)
+    make_res = run_command(["make", make_target], timeout=60, cwd=ctx["problem_ws"], limits=None)
     if make_res["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["Make 失败:", make_res["stderr"], make_res["stdout"]]}
     logs.append("✓ 编译成功")
+    return None
+
+
+def project_with_test_run(ctx):
+    """运行测试程序"""
+    problem_ws = ctx["problem_ws"]
+    test_executable = ctx["config"].get("test_executable", "test")
     
-    # 运行测试
-    logs.append("正在运行测试...")
-    run_command("chmod +x {}".format(test_executable), cwd=problem_ws)
-    run_res = run_command("./{}".format(test_executable), timeout=10, cwd=problem_ws)
-    
+    ctx["logs"].append("正在运行测试...")
+    make_executable(os.path.join(problem_ws, test_executable))
+    ctx["run_res"] = run_command(["./" + test_executable], timeout=time_limit(10), cwd=problem_ws)
+    return None
+
+
+def project_with_test_score(ctx):
+    """测试程序的退出码为 0 即通过"""
+    logs = ctx["logs"]
+    run_res = ctx["run_res"]
     if run_res["exit_code"] != 0:
         return {"status": "wrong_answer", "score": 0, "logs": logs + ["测试未通过 (退出码 {})".format(run_res["exit_code"]), run_res["stdout"], run_res["stderr"]]}
     
     return {"status": "accepted", "score": 100, "logs": logs + ["✓ 所有测试通过!", "--- 输出 ---", run_res["stdout"]]}
 
 
-def judge_testgen_multi(config, work_dir, resource_dir, problem_id):
+register_judger("project_with_test", resources=("workspace", "compiler", "sandbox"),
+                prepare=prepare_workspace, build=project_with_test_build, run=project_with_test_run,
+                score=project_with_test_score)
+
+
+def unittest_prepare(ctx):
+    """单元测试题：按综合项目判题（不指定 make 目标，运行 test_runner）"""
+    ctx["config"] = {
+        "make_target": "",
+        "test_executable": ctx["config"].get("test_runner", "run_all.sh")
+    }
+    return prepare_workspace(ctx)
+
+
+register_judger("unittest", resources=("workspace", "compiler", "sandbox"),
+                prepare=unittest_prepare, build=project_with_test_build, run=project_with_test_run,
+                score=project_with_test_score)
+
+
+def testgen_multi_run(ctx):
     """多文件测试生成题（如 08_testing）"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    config = ctx["config"]
+    problem_ws = ctx["problem_ws"]
+    logs = ctx["logs"]
     
     input_files = config.get("files", [])
     correct_program = config.get("correct_program", "isPrime-correct")
@@ -1184,50 +2041,71 @@ def judge_testgen_multi(config, work_dir, resource_dir, problem_id):
         return {"status": "system_error", "score": 0, "logs": ["配置错误: 缺少输入文件或错误程序列表"]}
     
     # 确保程序可执行
-    run_command("chmod +x {}".format(correct_program), cwd=problem_ws)
+    make_executable(os.path.join(problem_ws, correct_program))
     for prog in broken_programs:
-        run_command("chmod +x {}".format(prog), cwd=problem_ws)
+        make_executable(os.path.join(problem_ws, prog))
     
     bugs_found = 0
     total_tests = len(input_files)
+    policy = TestRunPolicy(config, total_tests)
     
-    for i, input_file in enumerate(input_files):
+    def run_case(i, input_file):
+        """运行单个测试，返回 None 表示没有对应的错误程序，返回 error 表示输入文件无效"""
         broken_prog = broken_programs[i] if i < len(broken_programs) else None
         if not broken_prog:
-            continue
-            
-        input_path = os.path.join(problem_ws, input_file)
+            return None
         
+        input_path = os.path.join(problem_ws, input_file)
         if not os.path.exists(input_path):
-            logs.append("✗ {} - 文件不存在".format(input_file))
-            continue
+            return {"error": "文件不存在"}
         
         # 读取输入
         test_input = read_text_file(input_path)
         if not test_input or not test_input.strip():
-            logs.append("✗ {} - 文件为空".format(input_file))
-            continue
+            return {"error": "文件为空"}
         
         test_arg = test_input.strip().split()[0]  # 取第一个数字
-        logs.append("测试 {}: 输入 = {}".format(input_file, test_arg))
         
-        # 运行正确程序
-        correct_res = run_command("./{} {}".format(correct_program, test_arg), timeout=5, cwd=problem_ws)
-        correct_output = correct_res["stdout"].strip()
+        # 分别运行正确程序和错误程序
+        return {
+            "arg": test_arg,
+            "correct": run_reference(correct_program, [test_arg], timeout=policy.timeout(time_limit(5)), cwd=problem_ws),
+            "broken": run_command(["./" + broken_prog, test_arg], timeout=policy.timeout(time_limit(5)), cwd=problem_ws),
+        }
+    
+    for i, input_file, case in run_test_cases(policy, input_files, run_case):
+        if case is None:
+            continue
+        
+        if "error" in case:
+            logs.append("✗ {} - {}".format(input_file, case["error"]))
+            policy.record(False)
+            emit_progress("test", index=i + 1, total=total_tests, passed=False, message=logs[-1])
+            continue
         
-        # 运行错误程序
-        broken_res = run_command("./{} {}".format(broken_prog, test_arg), timeout=5, cwd=problem_ws)
+        logs.append("测试 {}: 输入 = {}".format(input_file, case["arg"]))
+        correct_res = case["correct"]
+        correct_output = correct_res["stdout"].strip()
+        broken_res = case["broken"]
         broken_output = broken_res["stdout"].strip()
+        timed_out = correct_res["timeout"] or broken_res["timeout"]
         
         if correct_output != broken_output:
             logs.append("  ✓ 发现差异!")
             logs.append("    正确输出: {}".format(correct_output))
             logs.append("    错误输出: {}".format(broken_output))
             bugs_found += 1
+            policy.record(True, timed_out)
+            emit_progress("test", index=i + 1, total=total_tests, passed=True,
+                          message="✓ {} - 发现差异".format(input_file))
         else:
             logs.append("  ✗ 输出相同 (未能发现 bug)")
             logs.append("    输出: {}".format(correct_output))
+            policy.record(False, timed_out)
+            emit_progress("test", index=i + 1, total=total_tests, passed=False,
+                          message="✗ {} - 输出相同 (未能发现 bug)".format(input_file))
     
+    logs.extend(policy.finish(ctx))
     score = int(100 * bugs_found / total_tests)
     
     if bugs_found == total_tests:
@@ -1238,33 +2116,123 @@ def judge_testgen_multi(config, work_dir, resource_dir, problem_id):
         return {"status": "wrong_answer", "score": 0, "logs": logs + ["未能发现任何 bug"]}
 
 
-def judge_unittest_subseq(config, work_dir, resource_dir, problem_id):
+register_judger("testgen_multi", resources=("workspace", "sandbox", "parallel_tests"), cacheable=True,
+                prepare=prepare_workspace, run=testgen_multi_run)
+
+
+def run_unit_tests_against(config, problem_ws, test_file, objects, logs):
+    """
+    用学生的单元测试检验各个实现（代替 run_all.sh）
+    测试文件只编译一次为 .o，再分别与每个实现的 .o 链接并运行（不再为每个实现重新编译）；
+    按每个程序的退出状态判断：正确实现必须通过（退出码 0），错误实现必须被判为失败
+    objects 中文件名为 <prefix>.o 的是正确实现，<prefix><后缀>.o 为错误实现
+    """
+    prefix = config.get("implementation_prefix", "subseq")
+    base = os.path.splitext(test_file)[0]
+    compile_res = compile_command("gcc -c -o {0}.o {0}.c".format(base), timeout=30, cwd=problem_ws)
+    if compile_res["exit_code"] != 0:
+        logs.append("编译失败:")
+        logs.append(compile_res["stderr"][:1000])
+        return {"status": "compile_error", "score": 0, "logs": logs}
+    emit_progress("compiled", message="编译成功")
+
+    impls = []
+    for obj in objects:
+        suffix = os.path.basename(obj)[len(prefix):-len(".o")]
+        impls.append({"name": suffix or "correct", "object": obj, "correct": suffix == ""})
+    impls.sort(key=lambda impl: not impl["correct"])
+    policy = TestRunPolicy(config, len(impls))
+
+    def run_case(i, impl):
+        exe = "{}-{}".format(base, impl["name"])
+        link_res = compile_command("gcc -o {} {}.o {}".format(exe, base, shlex.quote(impl["object"])),
+                                   timeout=30, cwd=problem_ws)
+        if link_res["exit_code"] != 0:
+            return {"linked": False, "stderr": link_res["stderr"]}
+        res = run_command(["./" + exe], timeout=policy.timeout(time_limit(10)), cwd=problem_ws, merge_stderr=True)
+        return {
+            "linked": True,
+            "passed": res["exit_code"] == 0 and not res["timeout"],
+            "exit_code": res["exit_code"],
+            "timeout": res["timeout"],
+            "output_limit_exceeded": res.get("output_limit_exceeded", False),
+            "output": res["stdout"] or ""
+        }
+
+    logs.append("正在用 {} 个实现运行测试...".format(len(impls)))
+    correct_passed = None
+    detected = 0
+    total_broken = sum(1 for impl in impls if not impl["correct"])
+    for i, impl, res in run_test_cases(policy, impls, run_case):
+        label = "正确实现" if impl["correct"] else "错误实现 {}".format(impl["name"])
+        if not res["linked"]:
+            logs.append("无法与 {} 链接:".format(os.path.basename(impl["object"])))
+            logs.append(res["stderr"][:1000])
+            return {"status": "compile_error", "score": 0, "logs": logs}
+
+        if res["timeout"]:
+            outcome = "超时"
+        elif res["output_limit_exceeded"]:
+            outcome = "输出超限"
+        elif res["exit_code"] < 0:
+            outcome = "被信号 {} 终止".format(-res["exit_code"])
+        else:
+            outcome = "退出码 {}".format(res["exit_code"])
+        # 正确实现应通过，错误实现应失败
+        ok = res["passed"] if impl["correct"] else not res["passed"]
+        logs.append("{} {} - {}".format("✓" if ok else "✗", label, outcome))
+        if not ok:
+            output = res["output"].strip()
+            if output:
+                logs.append("    " + output[-300:].replace("\n", "\n    "))
+        policy.record(ok, res["timeout"])
+        emit_progress("test", index=i + 1, total=len(impls), passed=ok, message=logs[-1])
+
+        if impl["correct"]:
+            correct_passed = ok
+        elif ok:
+            detected += 1
+
+    logs.extend(policy.stop_logs())
+    if correct_passed is False:
+        return {"status": "wrong_answer", "score": 0, "logs": logs + ["✗ 你的测试代码无法通过正确实现!"]}
+    if total_broken and detected == total_broken:
+        return {"status": "accepted", "score": 100, "logs": logs + ["✓ 所有测试通过! 成功识别所有错误实现!"]}
+    score = int(100 * detected / total_broken) if total_broken else 0
+    return {"status": "wrong_answer", "score": score, "logs": logs + [
+        "部分通过: 识别了 {}/{} 个错误实现".format(detected, total_broken),
+        "提示: 尝试更多边缘情况，如先长后短的序列、负数等"
+    ]}
+
+
+def unittest_subseq_run(ctx):
     """单元测试题（如 15_tests_subseq）"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    config = ctx["config"]
+    problem_ws = ctx["problem_ws"]
+    logs = ctx["logs"]
     
     test_file = config.get("filename", "test-subseq.c")
     test_path = os.path.join(problem_ws, test_file)
     
     if not os.path.exists(test_path):
         return {"status": "runtime_error", "score": 0, "logs": ["缺少测试文件: " + test_file]}
-    
+
+    # 各实现的目标文件已安装时直接链接运行
+    objects = sorted(glob.glob(config.get("implementations", "")))
+    if objects:
+        return run_unit_tests_against(config, problem_ws, test_file, objects, logs)
+
     # 检查 run_all.sh 是否存在
     run_all_script = os.path.join(problem_ws, "run_all.sh")
     if os.path.exists(run_all_script):
-        run_command("chmod +x run_all.sh", cwd=problem_ws)
+        make_executable(run_all_script)
         
         logs.append("正在运行测试套件...")
-        run_res = run_command("./run_all.sh 2>&1", timeout=60, cwd=problem_ws)
+        run_res = run_command(["./run_all.sh"], timeout=60, cwd=problem_ws, merge_stderr=True, limits=None,
+                              phase="run")
         
+        if run_res.get("output_limit_exceeded"):
+            return output_limit_result(run_res, logs)
         if run_res["timeout"]:
             return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["测试超时"]}
         
@@ -1315,7 +2283,7 @@ def judge_unittest_subseq(config, work_dir, resource_dir, problem_id):
     
     # 首先尝试与正确实现链接
     compile_cmd = "gcc -o test_runner -Wall -std=gnu99 {} -lm".format(test_file)
-    compile_res = run_command(compile_cmd, timeout=30, cwd=problem_ws)
+    compile_res = compile_command(compile_cmd, timeout=30, cwd=problem_ws)
     
     if compile_res["exit_code"] != 0:
         logs.append("编译失败:")
@@ -1323,8 +2291,10 @@ def judge_unittest_subseq(config, work_dir, resource_dir, problem_id):
         return {"status": "compile_error", "score": 0, "logs": logs}
     
     logs.append("编译成功，运行测试...")
-    run_res = run_command("./test_runner", timeout=10, cwd=problem_ws)
+    run_res = run_command(["./test_runner"], timeout=time_limit(10), cwd=problem_ws)
     
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
     
@@ -1337,19 +2307,20 @@ def judge_unittest_subseq(config, work_dir, resource_dir, problem_id):
         return {"status": "wrong_answer", "score": 50, "logs": logs + ["测试失败，exit code: {}".format(run_res["exit_code"])]}
 
 
-def judge_gdb_challenge(config, work_dir, resource_dir, problem_id):
-    """GDB 调试题（如 10_gdb）"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+# 依赖 /usr/local/l2p 下的各实现，判题结果不缓存；编译测试文件与运行各实现交错进行，整体作为 run 阶段
+register_judger("unittest_subseq", resources=("workspace", "compiler", "sandbox", "parallel_tests", "external"),
+                prepare=prepare_workspace, run=unittest_subseq_run)
+
+
+def gdb_challenge_prepare(ctx):
+    """GDB 调试题（如 10_gdb）：准备工作空间并读取答案"""
+    result = prepare_workspace(ctx)
+    if result is not None:
+        return result
     
+    config = ctx["config"]
+    problem_ws = ctx["problem_ws"]
+    logs = ctx["logs"]
     input_file = config.get("filename", "input.txt")
     game_program = config.get("game_program", "game")
     input_path = os.path.join(problem_ws, input_file)
@@ -1370,20 +2341,33 @@ def judge_gdb_challenge(config, work_dir, resource_dir, problem_id):
     logs.append(user_input.strip())
     
     # 确保程序可执行
-    run_command("chmod +x {}".format(game_program), cwd=problem_ws)
-    
-    # 运行游戏程序
+    make_executable(game_path)
+    return None
+
+
+def gdb_challenge_run(ctx):
+    """以答案文件为输入运行游戏程序"""
+    config = ctx["config"]
+    logs = ctx["logs"]
     logs.append("正在验证答案...")
-    run_res = run_command("./{} < {}".format(game_program, input_file), timeout=10, cwd=problem_ws)
+    run_res = run_command(["./" + config.get("game_program", "game")], timeout=time_limit(10), cwd=ctx["problem_ws"],
+                          stdin_file=config.get("filename", "input.txt"))
     
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
-    
-    output = run_res["stdout"]
+    ctx["output"] = run_res["stdout"]
+    return None
+
+
+def gdb_challenge_score(ctx):
+    """检查是否通过两轮"""
+    logs = ctx["logs"]
+    output = ctx["output"]
     logs.append("--- 游戏输出 ---")
     logs.append(output)
     
-    # 检查是否通过两轮
     round1_pass = "win round" in output.lower() or "correct" in output.lower()
     round2_pass = "win round 2" in output.lower()
     
@@ -1395,18 +2379,15 @@ def judge_gdb_challenge(config, work_dir, resource_dir, problem_id):
         return {"status": "wrong_answer", "score": 0, "logs": logs + ["答案错误。提示：使用 GDB 的 print 命令查看变量值。"]}
 
 
-def judge_testgen(config, work_dir, resource_dir, problem_id):
+register_judger("gdb_challenge", resources=("workspace", "sandbox"), cacheable=True,
+                prepare=gdb_challenge_prepare, run=gdb_challenge_run, score=gdb_challenge_score)
+
+
+def testgen_run(ctx):
     """测试生成题（黑盒测试）"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    config = ctx["config"]
+    problem_ws = ctx["problem_ws"]
+    logs = ctx["logs"]
     
     input_file = os.path.join(problem_ws, config.get("filename", "input.txt"))
     
@@ -1428,15 +2409,15 @@ def judge_testgen(config, work_dir, resource_dir, problem_id):
             return {"status": "wrong_answer", "score": 0, "logs": logs + ["未能发现 bug (模拟模式)"]}
     
     # 运行正确程序
-    run_command("chmod +x isPrime-correct", cwd=problem_ws)
-    correct_res = run_command("./isPrime-correct < {}".format(config.get("filename", "input.txt")), timeout=5, cwd=problem_ws)
+    make_executable(os.path.join(problem_ws, "isPrime-correct"))
+    correct_res = run_reference("isPrime-correct", timeout=time_limit(5), cwd=problem_ws, stdin_file=config.get("filename", "input.txt"))
     
     # 运行错误程序并检查差异
     bugs_found = 0
     for broken in broken_programs:
         name = os.path.basename(broken)
-        run_command("chmod +x {}".format(name), cwd=problem_ws)
-        broken_res = run_command("./{} < {}".format(name, config.get("filename", "input.txt")), timeout=5, cwd=problem_ws)
+        make_executable(os.path.join(problem_ws, name))
+        broken_res = run_command(["./" + name], timeout=time_limit(5), cwd=problem_ws, stdin_file=config.get("filename", "input.txt"))
         
         if broken_res["stdout"] != correct_res["stdout"]:
             logs.append("✓ {} - 发现差异!".format(name))
@@ -1453,18 +2434,135 @@ def judge_testgen(config, work_dir, resource_dir, problem_id):
         return {"status": "wrong_answer", "score": 0, "logs": logs + ["未能发现任何 bug"]}
 
 
-def judge_testgen_advanced(config, work_dir, resource_dir, problem_id):
+register_judger("testgen", resources=("workspace", "sandbox"), prepare=prepare_workspace, run=testgen_run)
+
+
+def split_output_blocks(output, separator):
+    """按分隔行切分输出，返回 (完整的块列表, 最后不完整的部分)"""
+    blocks = []
+    current = []
+    for line in output.splitlines(True):
+        current.append(line)
+        if line.strip() == separator:
+            blocks.append("".join(current))
+            current = []
+    return blocks, "".join(current)
+
+
+def evaluate_test_lines(program, lines, cwd, separator, policy):
+    """
+    用 program 逐行评估测试，返回 ({测试行: 输出}, 运行失败的测试行集合)
+    已缓存的行直接取缓存；其余行先写入同一个文件一次运行，按分隔行把输出切分给各行。
+    只有程序正常退出、输出块数与行数一致时才采用切分结果；否则（某一行崩溃、超时、输出超限，
+    或某一行没有输出分隔行，如 test-eval 的 "Invalid input line"）各块与行的对应关系不可靠，
+    这一批的行改为每行单独运行一次，切分结果不写入缓存。
+    运行失败（超时、输出超限、退出码非 0）的行在输出后附加原因；超出总运行时间预算而未运行的行不在返回的输出中。
+    要求程序对每行的处理相互独立（如 test-eval 每行输出一个以分隔行结尾的结果块）
+    """
+    cache = get_oracle_cache()
+    outputs = {}
+    failed = set()
+    keys = {}
+    pending = []
+    digest = file_digest(program) if cache is not None else None
+    for line in lines:
+        if cache is not None:
+            # 键中的 "aligned" 使旧版本按未对齐的切分结果写入的缓存失效
+            keys[line] = cache.make_key(program, ["<line>", "aligned"], line + "\n", program_digest=digest)
+            meta = cache.get(keys[line])
+            if meta is not None:
+                outputs[line] = meta["stdout"]
+                if meta.get("failed"):
+                    failed.add(line)
+                continue
+        pending.append(line)
+
+    input_name = "lines-{}.txt".format(os.getpid())
+    if len(pending) > 1 and not policy.out_of_time():
+        write_text_file(os.path.join(cwd, input_name), "".join(line + "\n" for line in pending))
+        res = run_command([program, input_name], timeout=policy.timeout(time_limit(10)), cwd=cwd, merge_stderr=True)
+        blocks, rest = split_output_blocks(res["stdout"] or "", separator)
+        if (not res["timeout"] and not res.get("output_limit_exceeded") and res["exit_code"] == 0
+                and len(blocks) == len(pending) and not rest.strip()):
+            for line, block in zip(pending, blocks):
+                outputs[line] = block
+                if cache is not None:
+                    cache.put(keys[line], {"stdout": block})
+            pending = []
+
+    # 每行单独运行：输出不需要切分，整个输出都属于这一行
+    for line in pending:
+        if policy.out_of_time():
+            break
+        write_text_file(os.path.join(cwd, input_name), line + "\n")
+        res = run_command([program, input_name], timeout=policy.timeout(time_limit(10)), cwd=cwd, merge_stderr=True)
+        output = res["stdout"] or ""
+        if res["timeout"]:
+            output += "[超时]\n"
+        elif res.get("output_limit_exceeded"):
+            output += "[输出超限]\n"
+        elif res["exit_code"] != 0:
+            output += "[退出码 {}]\n".format(res["exit_code"])
+        outputs[line] = output
+        if res["timeout"] or res.get("output_limit_exceeded") or res["exit_code"] != 0:
+            failed.add(line)
+        # 超时、输出超限、被信号终止的结果可能与负载有关，不缓存
+        if cache is not None and not res["timeout"] and not res.get("output_limit_exceeded") and res["exit_code"] >= 0:
+            cache.put(keys[line], {"stdout": output, "failed": line in failed})
+    return outputs, failed
+
+
+def judge_test_lines(config, problem_ws, test_lines, logs):
+    """
+    逐行测试评估引擎（代替 run_all.sh）
+    每个测试行在正确实现和每个错误实现上的输出分别缓存，学生只修改少量行时只需运行这些行；
+    错误实现被某一行发现 = 该行输出与正确实现不同（正确实现在该行超时或出错时不计）
+    """
+    separator = config.get("output_separator", "")
+    correct = config.get("correct_program")
+    broken = sorted(glob.glob(config.get("broken_programs", "")))
+    lines = list(dict.fromkeys(line.strip() for line in test_lines))
+    policy = TestRunPolicy(config, len(broken) + 1)
+
+    logs.append("正在逐行评估 {} 个测试用例（{} 个错误实现）...".format(len(lines), len(broken)))
+    expected, reference_failed = evaluate_test_lines(correct, lines, problem_ws, separator, policy)
+    # 正确实现运行失败或未运行的行没有可比较的输出，不用于发现错误实现
+    usable = [line in expected and line not in reference_failed for line in lines]
+    if not all(usable):
+        skipped = [str(n + 1) for n, ok in enumerate(usable) if not ok]
+        logs.append("正确实现在第 {} 行运行失败或未运行，这些行不计入".format(
+            ", ".join(skipped[:10]) + (" ..." if len(skipped) > 10 else "")))
+
+    detected = 0
+    for i, program in enumerate(broken):
+        outputs, _ = evaluate_test_lines(program, lines, problem_ws, separator, policy)
+        caught = [n + 1 for n, line in enumerate(lines) if usable[n] and line in outputs and outputs[line] != expected[line]]
+        name = os.path.basename(program)
+        if caught:
+            detected += 1
+            shown = ", ".join(str(n) for n in caught[:10]) + (" ..." if len(caught) > 10 else "")
+            logs.append("✓ {} - 被第 {} 行发现".format(name, shown))
+        else:
+            logs.append("✗ {} - 未能发现问题".format(name))
+        emit_progress("test", index=i + 1, total=len(broken), passed=bool(caught), message=logs[-1])
+    if policy.out_of_time():
+        logs.append("已超出总运行时间预算，未运行的行不计入")
+
+    score = int(100 * detected / len(broken))
+    if detected == len(broken):
+        return {"status": "accepted", "score": 100, "logs": logs + ["✓ 成功发现所有 {} 个错误实现!".format(detected)]}
+    return {
+        "status": "wrong_answer",
+        "score": score,
+        "logs": logs + ["发现 {}/{} 个错误实现".format(detected, len(broken))]
+    }
+
+
+def testgen_advanced_run(ctx):
     """高级测试生成题（如 c2prj2_testing 扑克牌评估）"""
-    logs = []
-    
-    # 准备工作空间
-    problem_ws, prep_logs = prepare_problem_workspace(problem_id, work_dir, resource_dir)
-    if problem_ws is None:
-        return {"status": "system_error", "score": 0, "logs": prep_logs}
-    
-    overlay_logs = overlay_submission(work_dir, problem_ws)
-    if overlay_logs and overlay_logs[0].startswith("Failed"):
-        return {"status": "system_error", "score": 0, "logs": overlay_logs}
+    config = ctx["config"]
+    problem_ws = ctx["problem_ws"]
+    logs = ctx["logs"]
     
     test_file = config.get("filename", "tests.txt")
     test_path = os.path.join(problem_ws, test_file)
@@ -1479,39 +2577,21 @@ def judge_testgen_advanced(config, work_dir, resource_dir, problem_id):
     test_lines = [l for l in test_content.strip().split('\n') if l.strip()]
     logs.append("提交了 {} 个测试用例".format(len(test_lines)))
     
-    # 检查 run_all.sh 是否存在
-    run_all_script = os.path.join(problem_ws, "run_all.sh")
-    if os.path.exists(run_all_script):
-        run_command("chmod +x run_all.sh", cwd=problem_ws)
-        run_command("chmod +x test-eval", cwd=problem_ws)
-        
-        # 运行测试脚本
-        logs.append("正在运行测试...")
-        run_res = run_command("./run_all.sh 2>&1", timeout=60, cwd=problem_ws)
-        
-        if run_res["timeout"]:
-            return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["测试超时"]}
-        
-        output = run_res["stdout"]
-        logs.append("--- 测试输出 ---")
-        logs.append(output[:2000] if len(output) > 2000 else output)
-        
-        # 分析输出查找"发现差异"或"不同"的情况
-        # run_all.sh 通常会对比正确实现和错误实现
-        if run_res["exit_code"] == 0:
-            return {"status": "accepted", "score": 100, "logs": logs + ["✓ 测试通过!"]}
-        else:
-            # 部分通过或全部失败
-            return {"status": "wrong_answer", "score": 50, "logs": logs + ["部分测试未通过"]}
+    # 正确实现和错误实现都已安装时逐行评估
+    correct = config.get("correct_program")
+    if correct and os.path.isfile(correct) and glob.glob(config.get("broken_programs", "")):
+        return judge_test_lines(config, problem_ws, test_lines, logs)
     
-    # 如果没有 run_all.sh，检查 test-eval 是否存在
+    # 没有错误实现时，检查 test-eval 是否存在
     test_eval = os.path.join(problem_ws, "test-eval")
     if os.path.exists(test_eval):
-        run_command("chmod +x test-eval", cwd=problem_ws)
+        make_executable(test_eval)
         
         logs.append("正在使用 test-eval 运行测试...")
-        run_res = run_command("./test-eval {}".format(test_file), timeout=30, cwd=problem_ws)
+        run_res = run_command(["./test-eval", test_file], timeout=30, cwd=problem_ws)
         
+        if run_res.get("output_limit_exceeded"):
+            return output_limit_result(run_res, logs)
         if run_res["timeout"]:
             return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["测试超时"]}
         
@@ -1546,70 +2626,154 @@ def judge_testgen_advanced(config, work_dir, resource_dir, problem_id):
         return {"status": "wrong_answer", "score": 0, "logs": logs + ["没有有效的测试用例"]}
 
 
-def judge_io_test(config, work_dir, resource_dir, problem_id):
-    """输入输出测试 - 验证程序输出是否符合预期"""
-    logs = []
+# 依赖 /usr/local/l2p 下的正确 / 错误实现，判题结果不缓存
+register_judger("testgen_advanced", resources=("workspace", "sandbox", "parallel_tests", "external"),
+                prepare=prepare_workspace, run=testgen_advanced_run)
+
+
+def io_test_prepare(ctx):
+    """输入输出测试 - 检查配置和提交的源文件（直接在提交目录中编译运行）"""
+    config = ctx["config"]
     filename = config.get("filename")
-    test_cases = config.get("test_cases", [])
     
     if not filename:
         return {"status": "system_error", "score": 0, "logs": ["配置错误：缺少 filename"]}
     
-    if not test_cases:
+    if not config.get("test_cases", []):
         return {"status": "system_error", "score": 0, "logs": ["配置错误：缺少测试用例"]}
     
-    src_file = os.path.join(work_dir, filename)
-    if not os.path.exists(src_file):
+    if not os.path.exists(os.path.join(ctx["work_dir"], filename)):
         return {"status": "runtime_error", "score": 0, "logs": ["缺少文件: " + filename]}
+    return None
+
+
+def io_test_build(ctx):
+    """编译（fork server 模式额外链接桩代码，链接失败时退回普通编译）"""
+    config = ctx["config"]
+    work_dir = ctx["work_dir"]
+    logs = ctx["logs"]
+    filename = config["filename"]
     
-    # 编译
     logs.append("正在编译 {}...".format(filename))
-    compile_res = run_command(
-        "gcc -o main -Wall -Werror -std=gnu99 {}".format(filename),
-        cwd=work_dir
-    )
+    compile_cmd = "gcc -o main -Wall -Werror -std=gnu99 {}".format(filename)
+    compile_res = None
+    ctx["forkserver"] = False
+    
+    stub = forkserver_object() if config.get("exec_mode", EXEC_MODE) == EXEC_FORKSERVER else None
+    if stub is not None:
+        compile_res = compile_command("{} {}".format(compile_cmd, shlex.quote(stub)), cwd=work_dir)
+        if compile_res["exit_code"] == 0:
+            ctx["forkserver"] = True
+        else:
+            compile_res = None
+    if compile_res is None:
+        compile_res = compile_command(compile_cmd, cwd=work_dir)
     
     if compile_res["exit_code"] != 0:
+        emit_progress("compiled", ok=False)
         return {
             "status": "compile_error",
             "score": 0,
             "logs": logs + ["编译失败:", compile_res["stderr"]]
         }
     logs.append("✓ 编译成功")
+    emit_progress("compiled", ok=True)
+    return None
+
+
+def io_test_run(ctx):
+    """运行测试用例并比较输出（ctx["passed"] 为通过的用例数）"""
+    config = ctx["config"]
+    work_dir = ctx["work_dir"]
+    logs = ctx["logs"]
+    test_cases = config.get("test_cases", [])
+    
+    # fork server 模式：程序只启动一次，每个测试用例 fork 一次；启动失败时退回普通执行
+    server = None
+    if ctx["forkserver"]:
+        server = ForkServer("./main", work_dir, limits=_problem_limits["limits"])
+        with StepTimer("run", "forkserver start"):
+            started = server.start()
+        if not started:
+            server = None
     
-    # 运行测试用例
     passed = 0
     total = len(test_cases)
+    policy = TestRunPolicy(config, total)
+    output_limited = False
+    
+    def run_case(i, tc):
+        # 默认忽略输出末尾的空白
+        comparator = output_comparator(config, expected=tc.get("expected", ""), default_mode="whitespace")
+        if server is not None:
+            with StepTimer("run", "./main (forkserver)") as step:
+                run_res = server.run(tc.get("input", ""), policy.timeout(time_limit(5)), comparator=comparator)
+                if run_res is not None:
+                    record_usage(run_res)
+                    step.finish(run_res)
+            if run_res is not None:
+                return run_res
+        return run_command(["./main"], timeout=policy.timeout(time_limit(5)), cwd=work_dir, input_data=tc.get("input", ""),
+                           comparator=comparator)
     
-    for i, tc in enumerate(test_cases):
-        input_data = tc.get("input", "")
-        expected = tc.get("expected", "")
+    try:
+        for i, tc, run_res in run_test_cases(policy, test_cases, run_case):
+            input_data = tc.get("input", "")
+            expected = tc.get("expected", "")
         
-        run_res = run_command("./main", timeout=5, cwd=work_dir, input_data=input_data)
+            if run_res["timeout"]:
+                logs.append("✗ 测试 {}: 超时".format(i + 1))
+                policy.record(False, timed_out=True)
+                emit_progress("test", index=i + 1, total=total, passed=False, message=logs[-1])
+                continue
         
-        if run_res["timeout"]:
-            logs.append("✗ 测试 {}: 超时".format(i + 1))
-            continue
+            if run_res.get("output_limit_exceeded"):
+                logs.append("✗ 测试 {}: 输出超限".format(i + 1))
+                output_limited = True
+                policy.record(False)
+                emit_progress("test", index=i + 1, total=total, passed=False, message=logs[-1])
+                continue
         
-        if run_res["exit_code"] != 0:
-            logs.append("✗ 测试 {}: 运行时错误 (退出码 {})".format(i + 1, run_res["exit_code"]))
-            continue
+            if run_res["exit_code"] != 0 and not run_res.get("output_mismatch"):
+                logs.append("✗ 测试 {}: 运行时错误 (退出码 {})".format(i + 1, run_res["exit_code"]))
+                policy.record(False)
+                emit_progress("test", index=i + 1, total=total, passed=False, message=logs[-1])
+                continue
         
-        actual = run_res["stdout"]
+            actual = run_res["stdout"]
+            ok, diff = check_output(config, run_res, expected=expected, default_mode="whitespace")
         
-        # 比较输出（去除尾部空白）
-        if actual.rstrip() == expected.rstrip():
-            logs.append("✓ 测试 {}: 通过".format(i + 1))
-            passed += 1
-        else:
-            logs.append("✗ 测试 {}: 输出不匹配".format(i + 1))
-            logs.append("  输入: {}".format(repr(input_data)))
-            logs.append("  期望: {}".format(repr(expected.rstrip())))
-            logs.append("  实际: {}".format(repr(actual.rstrip())))
-    
-    # 计算分数
+            if ok:
+                logs.append("✓ 测试 {}: 通过".format(i + 1))
+                passed += 1
+                policy.record(True)
+                emit_progress("test", index=i + 1, total=total, passed=True, message=logs[-1])
+            else:
+                logs.append("✗ 测试 {}: 输出不匹配".format(i + 1))
+                policy.record(False)
+                emit_progress("test", index=i + 1, total=total, passed=False, message=logs[-1])
+                logs.append("  输入: {}".format(repr(input_data)))
+                logs.append("  期望: {}".format(repr(expected.rstrip())))
+                logs.append("  实际: {}".format(repr(actual.rstrip())))
+                logs.append("  差异: {}".format(diff))
+    finally:
+        if server is not None:
+            server.close()
+    
+    logs.extend(policy.finish(ctx))
+    ctx["passed"] = passed
+    ctx["output_limited"] = output_limited
+    return None
+
+
+def io_test_score(ctx):
+    """按通过的测试用例数给分"""
+    logs = ctx["logs"]
+    passed = ctx["passed"]
+    total = len(ctx["config"].get("test_cases", []))
     score = int(100 * passed / total) if total > 0 else 0
-    status = "accepted" if passed == total else "wrong_answer"
+    # 有测试点输出超限时以输出超限作为结果（分数仍按通过的测试点计算）
+    status = "accepted" if passed == total else "output_limit_exceeded" if ctx["output_limited"] else "wrong_answer"
     
     logs.append("")
     logs.append("通过 {}/{} 个测试".format(passed, total))
@@ -1617,6 +2781,10 @@ def judge_io_test(config, work_dir, resource_dir, problem_id):
     return {"status": status, "score": score, "logs": logs}
 
 
+register_judger("io_test", resources=("compiler", "sandbox", "parallel_tests"), cacheable=True,
+                prepare=io_test_prepare, build=io_test_build, run=io_test_run, score=io_test_score)
+
+
 def judge_standard(work_dir, resource_dir, problem_id):
     """通用判题（fallback）- 未配置的题目编译运行后需要联系管理员配置"""
     logs = []
@@ -1631,13 +2799,15 @@ def judge_standard(work_dir, resource_dir, problem_id):
     
     # 编译
     logs.append("正在编译 {}...".format(src_file))
-    compile_res = run_command("gcc -o main -Wall -Werror {}".format(src_file), cwd=work_dir)
+    compile_res = compile_command("gcc -o main -Wall -Werror {}".format(src_file), cwd=work_dir)
     if compile_res["exit_code"] != 0:
         return {"status": "compile_error", "score": 0, "logs": logs + ["编译失败:", compile_res["stderr"]]}
     logs.append("✓ 编译成功")
     
     # 运行
-    run_res = run_command("./main", timeout=5, cwd=work_dir)
+    run_res = run_command(["./main"], timeout=time_limit(5), cwd=work_dir)
+    if run_res.get("output_limit_exceeded"):
+        return output_limit_result(run_res, logs)
     if run_res["timeout"]:
         return {"status": "time_limit_exceeded", "score": 0, "logs": logs + ["运行超时"]}
     
@@ -1659,59 +2829,208 @@ def judge_standard(work_dir, resource_dir, problem_id):
 # 主入口 (Main Entry)
 # ============================================================
 
-def judge_submission(problem_id, work_dir, resource_dir):
-    """判题主入口"""
-    config = PROBLEM_CONFIG.get(problem_id)
-    
-    if not config:
-        # 未知题目，使用通用判题
-        return judge_standard(work_dir, resource_dir, problem_id)
-    
-    problem_type = config.get("type")
+# 流水线阶段及各阶段执行的判题器阶段；调度器为每个流水线阶段使用单独的进程池（见 scheduler.py），
+# 不同提交的阶段可以重叠执行（编译提交 B 的同时运行提交 A 的测试）
+#   prep     确定题目配置、查判题结果缓存、准备工作空间（所有提交都从此阶段开始）
+#   compile  编译
+#   exec     运行并评分（未配置的题目在此阶段使用通用判题）
+PIPELINE_STAGES = {
+    "prep": ("prepare",),
+    "compile": ("build",),
+    "exec": ("run", "score"),
+}
+
+
+def new_judge_context(problem_id, work_dir, resource_dir):
+    """创建判题上下文：各阶段之间传递的状态，stages 为尚未执行的流水线阶段"""
+    return {
+        "problem_id": problem_id,
+        "work_dir": work_dir,
+        "resource_dir": resource_dir,
+        "logs": [],
+        "stages": ["prep"],
+    }
+
+
+def judger_stages(judger):
+    """判题器在 prep 之后需要经过的流水线阶段"""
+    if judger is None:
+        return ["exec"]
+    return [stage for stage, phases in PIPELINE_STAGES.items()
+            if stage != "prep" and any(phase in judger.phases for phase in phases)]
+
+
+def begin_judge(ctx):
+    """
+    prep 阶段开始时确定题目配置（整个判题过程使用同一版本的配置，期间配置快照变化不影响本次判题）
+    确定性题型先查判题结果缓存，命中时返回缓存的结果
+    """
+    problem_id = ctx["problem_id"]
+    index = get_config_store().current()
+    config = index.configs.get(problem_id)
+    judger = JUDGERS.get(config.get("type")) if config else None
+    ctx.update({
+        "config": config,
+        "config_version": index.version,
+        "time_limit": index.time_limits.get(problem_id),
+        "limits": index.limits.get(problem_id),
+        "judger": judger.problem_type if judger else None,
+    })
+    ctx["stages"] = judger_stages(judger)
+    if not config or not is_verdict_cacheable(config):
+        return None
     
+    cache = get_verdict_cache()
+    if cache is None:
+        return None
     try:
-        if problem_type == "text_exact":
-            return judge_text_exact(config, work_dir, resource_dir)
-        elif problem_type == "compile_run":
-            return judge_compile_run(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "code_with_grader":
-            return judge_code_with_grader(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "link_object":
-            return judge_link_object(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "makefile_project":
-            return judge_makefile_project(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "reading":
-            return judge_reading(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "project_with_test":
-            return judge_project_with_test(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "testgen":
-            return judge_testgen(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "testgen_multi":
-            return judge_testgen_multi(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "testgen_advanced":
-            return judge_testgen_advanced(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "gdb_challenge":
-            return judge_gdb_challenge(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "unittest_subseq":
-            return judge_unittest_subseq(config, work_dir, resource_dir, problem_id)
-        elif problem_type == "unittest":
-            # 单元测试题
-            return judge_project_with_test({
-                "make_target": "",
-                "test_executable": config.get("test_runner", "run_all.sh")
-            }, work_dir, resource_dir, problem_id)
-        elif problem_type == "io_test":
-            # 输入输出测试题
-            return judge_io_test(config, work_dir, resource_dir, problem_id)
-        else:
-            return judge_standard(work_dir, resource_dir, problem_id)
+        key = cache.make_key(problem_id, config, ctx["work_dir"], ctx["resource_dir"], JUDGER_VERSION)
+    except Exception:
+        return None
+    meta = cache.get(key)
+    if meta is not None:
+        result = meta["result"]
+        result["cached"] = True
+        return result
+    ctx["verdict_key"] = key
+    return None
+
+
+def run_stage_phases(ctx, stage):
+    """执行判题器在流水线阶段 stage 中的各阶段，返回结果字典（判题结束）或 None"""
+    judger = JUDGERS.get(ctx["judger"])
+    if judger is None:
+        # 未配置或未知题型，使用通用判题
+        if stage == "exec":
+            return judge_standard(ctx["work_dir"], ctx["resource_dir"], ctx["problem_id"])
+        return None
+    for phase in PIPELINE_STAGES[stage]:
+        result = run_judger_phase(judger, phase, ctx)
+        if result is not None:
+            return result
+    return None
+
+
+def merge_metrics(total, part):
+    """合并两个流水线阶段的 metrics（资源用量、耗时累加，峰值内存取最大值，步骤明细依次拼接）"""
+    if total is None:
+        return part
+    for field in ("processes", "cpu_user_ms", "cpu_sys_ms", "judge_ms"):
+        total[field] += part[field]
+    total["max_rss_kb"] = max(total["max_rss_kb"], part["max_rss_kb"])
+    total["compile_saved_ms"] = round(total["compile_saved_ms"] + part["compile_saved_ms"], 3)
+    for phase, ms in part["phases_ms"].items():
+        total["phases_ms"][phase] = round(total["phases_ms"].get(phase, 0) + ms, 3)
+    total["stages_ms"].update(part["stages_ms"])
+    room = max(0, METRICS_MAX_STEPS - len(total["steps"]))
+    dropped = total.get("steps_dropped", 0) + part.get("steps_dropped", 0) + max(0, len(part["steps"]) - room)
+    total["steps"].extend(part["steps"][:room])
+    if dropped:
+        total["steps_dropped"] = dropped
+    return total
+
+
+def judge_stage(ctx):
+    """
+    在当前进程中执行 ctx["stages"] 中的下一个流水线阶段，返回更新后的 ctx
+    判题结束时 ctx["result"] 为判题结果，其 metrics 字段为各阶段的资源用量和耗时合计（见 judge_metrics），
+    不写入判题结果缓存
+    """
+    stage = ctx["stages"].pop(0)
+    # 步骤的开始时间都相对于第一个阶段的开始时间
+    reset_usage(ctx.get("started_at"))
+    ctx.setdefault("started_at", _timings["started"])
+    stage_started = time.time()
+    result = None
+    try:
+        if _cancel_check is not None and _cancel_check():
+            raise JudgeCancelled()
+        if stage == "prep":
+            result = begin_judge(ctx)
+        if result is None:
+            set_problem_limits(ctx["time_limit"], ctx["limits"])
+            result = run_stage_phases(ctx, stage)
+    except JudgeCancelled:
+        result = {"status": "system_error", "score": 0, "logs": ["判题已取消"]}
     except Exception as e:
         import traceback
-        return {
+        result = {
             "status": "system_error",
             "score": 0,
             "logs": ["判题异常: " + str(e), traceback.format_exc()]
         }
+    finally:
+        set_problem_limits()
+    
+    metrics = judge_metrics()
+    metrics["judge_ms"] = int((time.time() - stage_started) * 1000)
+    metrics["stages_ms"] = {stage: metrics["judge_ms"]}
+    ctx["metrics"] = merge_metrics(ctx.get("metrics"), metrics)
+    
+    if result is None and not ctx["stages"]:
+        result = {"status": "system_error", "score": 0, "logs": ctx["logs"] + ["判题器未给出结果: {}".format(ctx["judger"])]}
+    if result is not None:
+        if ctx.get("verdict_key") and not ctx.get("verdict_unstable") and result.get("status") in VERDICT_CACHE_STATUSES:
+            get_verdict_cache().put(ctx["verdict_key"], {"problem_id": ctx["problem_id"], "result": result})
+        if "template_lease" in ctx:
+            release_template(ctx.pop("template_lease"))
+        result["metrics"] = ctx["metrics"]
+        result["metrics"]["config_version"] = ctx.get("config_version")
+        ctx["result"] = result
+        ctx["stages"] = []
+    return ctx
+
+
+def judge_submission(problem_id, work_dir, resource_dir):
+    """判题主入口：在当前进程中依次执行全部流水线阶段"""
+    ctx = new_judge_context(problem_id, work_dir, resource_dir)
+    while "result" not in ctx:
+        ctx = judge_stage(ctx)
+    return ctx["result"]
+
+
+def judge_fast(problem_id, work_dir, resource_dir):
+    """
+    快速通道：题型提供了 fast 钩子时在当前进程中直接判题（调度器在 HTTP 服务进程中调用，不经过进程池）
+    返回判题结果，不适用时返回 None（按流水线判题）
+    fast 钩子不运行程序，结果的 metrics 中只有判题耗时；不查也不写判题结果缓存（直接比较比查缓存更快）
+    """
+    started = time.time()
+    index = get_config_store().current()
+    config = index.configs.get(problem_id)
+    judger = JUDGERS.get(config.get("type")) if config else None
+    if judger is None or judger.fast is None:
+        return None
+    
+    ctx = new_judge_context(problem_id, work_dir, resource_dir)
+    ctx.update({"config": config, "config_version": index.version, "judger": judger.problem_type, "stages": []})
+    try:
+        result = judger.fast(ctx)
+    except Exception:
+        return None
+    if result is None:
+        return None
+    
+    judge_ms = round((time.time() - started) * 1000, 3)
+    result["metrics"] = {
+        "processes": 0,
+        "cpu_user_ms": 0,
+        "cpu_sys_ms": 0,
+        "max_rss_kb": 0,
+        "compile_saved_ms": 0,
+        "judge_ms": judge_ms,
+        "phases_ms": {phase: 0 for phase in PHASES},
+        "steps": [],
+        "stages_ms": {"fast": judge_ms},
+        "config_version": index.version,
+    }
+    return result
+
+
+def warm_fast_path():
+    """预先加载题目配置并查询 gcc 版本（模板版本的一部分），避免第一个快速通道请求承担这些耗时"""
+    get_config_store()
+    gcc_version()
 
 
 def main():
@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Judge Sandbox - 受限运行判题程序
+每次运行的程序在独立的会话 / 进程组中启动，超时时杀死整个进程组（包括它创建的子进程）；
+学生程序额外用 rlimit 限制 CPU 时间、地址空间、进程数和写入文件大小，
+配置了 cgroup v2 目录时再为每次运行创建子 cgroup（内存、进程数，逃出进程组的进程也能清理）
+输出边运行边读取，超过上限时立即杀死程序，只保留开头和结尾片段
+结果中附带用户态 / 内核态 CPU 时间、峰值内存和终止信号
+"""
+
+import os
+import math
+import time
+import uuid
+import select
+import signal
+import resource
+import subprocess
+
+# ============================================================
+# 沙箱配置 (Sandbox Configuration)
+# ============================================================
+
+# 学生程序的默认资源限制：
+#   cpu_seconds   CPU 时间上限（实际取该值与本次超时 +1 秒中较小者，超出时收到 SIGXCPU）
+#   memory_mb     地址空间上限（RLIMIT_AS；cgroup 可用时同时作为 memory.max）
+#   processes     进程数上限（RLIMIT_NPROC 按用户计数，以 root 运行时内核不检查，cgroup 的 pids.max 不受影响）
+#   file_size_mb  单个写入文件的大小上限（超出时收到 SIGXFSZ）
+SANDBOX_LIMITS = {
+    "cpu_seconds": int(os.environ.get("JUDGE_RUN_CPU_SECONDS", "10")),
+    "memory_mb": int(os.environ.get("JUDGE_RUN_MEMORY_MB", "256")),
+    "processes": int(os.environ.get("JUDGE_RUN_PROCESSES", "64")),
+    "file_size_mb": int(os.environ.get("JUDGE_RUN_FILE_SIZE_MB", "16")),
+}
+
+# cgroup v2 父目录（需要已委派给判题服务、且已在 cgroup.subtree_control 中启用 memory / pids 控制器）
+# 为空时只使用 rlimit；创建失败一次后不再尝试
+CGROUP_ROOT = os.environ.get("JUDGE_CGROUP_ROOT", "")
+_cgroup_available = bool(CGROUP_ROOT)
+
+# 输出上限：每个输出流（标准输出 / 标准错误）最多读取的字节数，超出时停止读取并杀死进程组，
+# 避免死循环打印的程序占满判题进程的内存、撑大判题结果；超出后结果中只保留开头和结尾各一段
+OUTPUT_LIMIT_BYTES = int(os.environ.get("JUDGE_OUTPUT_LIMIT_KB", "1024")) * 1024
+OUTPUT_EXCERPT_BYTES = int(os.environ.get("JUDGE_OUTPUT_EXCERPT_KB", "4")) * 1024
+
+# 由资源限制引起的终止信号
+LIMIT_SIGNALS = {signal.SIGXCPU: "cpu", signal.SIGXFSZ: "file_size"}
+
+
+def decode_output(data):
+    """与 subprocess 的文本模式一致：解码并统一换行符"""
+    return data.decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def output_excerpt(data):
+    """超出输出上限时保留的内容：开头和结尾各 OUTPUT_EXCERPT_BYTES 字节，中间注明省略的字节数"""
+    if len(data) <= 2 * OUTPUT_EXCERPT_BYTES:
+        return data
+    omitted = len(data) - 2 * OUTPUT_EXCERPT_BYTES
+    marker = "\n... 输出超过上限，省略 {} 字节 ...\n".format(omitted).encode()
+    return data[:OUTPUT_EXCERPT_BYTES] + marker + data[-OUTPUT_EXCERPT_BYTES:]
+
+
+def communicate(in_w, out_r, err_r, input_data, deadline, output_limit=OUTPUT_LIMIT_BYTES, stdout_sink=None):
+    """
+    写入标准输入（in_w 为 None 时不写）并读取 out_r / err_r（err_r 可为 None）直到管道关闭或到达 deadline
+    某个输出流超过 output_limit 字节（None 表示不限制）时立即停止读取，由调用方杀死进程
+    stdout_sink: 依次接收标准输出的每个数据块（如比较器的 feed），返回 False 时同样立即停止读取
+    传入的文件描述符全部由本函数关闭；返回 (stdout, stderr, 停止原因)，
+    停止原因为 None（管道全部关闭）、"timeout"、"output_limit" 或 "sink"
+    """
+    pending = memoryview(input_data or b"")
+    readers = [fd for fd in (out_r, err_r) if fd is not None]
+    chunks = {fd: [] for fd in readers}
+    sizes = dict.fromkeys(readers, 0)
+    writers = []
+    stopped = None
+    if in_w is not None:
+        if pending:
+            writers = [in_w]
+        else:
+            os.close(in_w)
+    try:
+        while readers and stopped is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                stopped = "timeout"
+                break
+            readable, writable, _ = select.select(readers, writers, [], remaining)
+            for fd in readable:
+                chunk = os.read(fd, 65536)
+                if chunk:
+                    chunks[fd].append(chunk)
+                    sizes[fd] += len(chunk)
+                    if output_limit is not None and sizes[fd] > output_limit:
+                        stopped = "output_limit"
+                    elif fd == out_r and stdout_sink is not None and not stdout_sink(chunk):
+                        stopped = "sink"
+                else:
+                    readers.remove(fd)
+            if writable:
+                try:
+                    pending = pending[os.write(in_w, pending[:65536]):]
+                except BrokenPipeError:
+                    pending = pending[:0]
+                if not pending:
+                    writers = []
+                    os.close(in_w)
+    finally:
+        if writers:
+            os.close(in_w)
+        for fd in chunks:
+            os.close(fd)
+    stdout = b"".join(chunks[out_r])
+    stderr = b"".join(chunks[err_r]) if err_r is not None else b""
+    if stopped == "output_limit":
+        # 只截断超出上限的输出流
+        if sizes[out_r] > output_limit:
+            stdout = output_excerpt(stdout)
+        if err_r is not None and sizes[err_r] > output_limit:
+            stderr = output_excerpt(stderr)
+    return stdout, stderr, stopped
+
+
+# ============================================================
+# cgroup v2
+# ============================================================
+
+def _cgroup_write(path, name, value):
+    with open(os.path.join(path, name), "w") as f:
+        f.write(str(value))
+
+
+def _cgroup_read(path, name):
+    try:
+        with open(os.path.join(path, name), "r") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def _create_cgroup(limits):
+    """为一次运行创建子 cgroup 并写入限制，返回目录；cgroup 不可用时返回 None"""
+    global _cgroup_available
+    if not _cgroup_available:
+        return None
+    path = os.path.join(CGROUP_ROOT, "run-{}".format(uuid.uuid4().hex[:12]))
+    try:
+        os.mkdir(path)
+        _cgroup_write(path, "memory.max", limits["memory_mb"] * 1024 * 1024)
+        _cgroup_write(path, "pids.max", limits["processes"])
+    except OSError:
+        _cgroup_available = False
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+        return None
+    try:
+        _cgroup_write(path, "memory.swap.max", 0)
+    except OSError:
+        pass
+    return path
+
+
+def _release_cgroup(path):
+    """读取 cgroup 的统计信息，杀死其中剩余的进程并删除，返回统计信息"""
+    stats = {}
+    peak = _cgroup_read(path, "memory.peak").strip()
+    if peak.isdigit():
+        stats["max_rss_kb"] = int(peak) // 1024
+    for line in _cgroup_read(path, "memory.events").splitlines():
+        name, _, value = line.partition(" ")
+        if name == "oom_kill" and value.strip().isdigit():
+            stats["oom_kill"] = int(value)
+    for line in _cgroup_read(path, "cpu.stat").splitlines():
+        name, _, value = line.partition(" ")
+        if name in ("user_usec", "system_usec") and value.strip().isdigit():
+            stats[name] = int(value)
+
+    try:
+        _cgroup_write(path, "cgroup.kill", 1)
+    except OSError:
+        for pid in _cgroup_read(path, "cgroup.procs").split():
+            try:
+                os.kill(int(pid), signal.SIGKILL)
+            except OSError:
+                pass
+    for _ in range(50):
+        try:
+            os.rmdir(path)
+            break
+        except OSError:
+            time.sleep(0.01)
+    return stats
+
+
+# ============================================================
+# 受限运行 (Limited Execution)
+# ============================================================
+
+def limit_preexec(limits, timeout=None, cgroup=None):
+    """返回在子进程 exec 之前执行的函数：加入 cgroup 并设置 rlimit（limits 为 None 时不限制）"""
+    if limits is None:
+        return None
+    cpu = limits["cpu_seconds"]
+    if timeout is not None:
+        cpu = min(cpu, int(math.ceil(timeout)) + 1)
+    rlimits = [
+        (resource.RLIMIT_CPU, (cpu, cpu + 1)),
+        (resource.RLIMIT_AS, (limits["memory_mb"] * 1024 * 1024,) * 2),
+        (resource.RLIMIT_NPROC, (limits["processes"],) * 2),
+        (resource.RLIMIT_FSIZE, (limits["file_size_mb"] * 1024 * 1024,) * 2),
+    ]
+
+    def preexec():
+        if cgroup is not None:
+            try:
+                _cgroup_write(cgroup, "cgroup.procs", 0)
+            except OSError:
+                pass
+        for which, value in rlimits:
+            try:
+                resource.setrlimit(which, value)
+            except (OSError, ValueError):
+                pass
+
+    return preexec
+
+
+def kill_group(pid):
+    """杀死进程组 pid（进程组不存在时只杀死该进程）"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def _wait(pid, deadline):
+    """等待进程退出直到 deadline，返回 (waitpid 状态, rusage)；超时返回 None"""
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        pidfd = None
+    try:
+        while True:
+            waited, status, usage = os.wait4(pid, os.WNOHANG)
+            if waited == pid:
+                return status, usage
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            if pidfd is not None:
+                select.select([pidfd], [], [], remaining)
+            else:
+                time.sleep(min(remaining, 0.005))
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def usage_fields(status, cpu_user_ms, cpu_sys_ms, max_rss_kb):
+    """由 waitpid 状态和资源用量生成结果中的退出码、信号和资源统计字段"""
+    sig = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+    return {
+        # 与 subprocess 的 returncode 一致：被信号终止时为负的信号编号
+        "exit_code": -sig if sig is not None else os.WEXITSTATUS(status),
+        "signal": signal.Signals(sig).name if sig is not None else None,
+        "limit_exceeded": LIMIT_SIGNALS.get(sig),
+        "cpu_user_ms": cpu_user_ms,
+        "cpu_sys_ms": cpu_sys_ms,
+        "max_rss_kb": max_rss_kb,
+    }
+
+
+def comparison_fields(comparator, stopped):
+    """
+    比较器的结果字段：
+        output_mismatch  发现不同后程序被提前终止
+        output_match / output_diff  比较结果和第一处不同的说明（超时、输出超限时没有这两个字段）
+        compare_ms       比较所用的时间（包含在程序运行时间内）
+    """
+    match = comparator.finish()
+    fields = {"output_mismatch": stopped == "sink", "compare_ms": round(comparator.elapsed * 1000, 3)}
+    if stopped in (None, "sink"):
+        fields.update(output_match=match, output_diff=comparator.describe())
+    return fields
+
+
+def run_limited(cmd, timeout=10, cwd=None, input_data=None, stdin_file=None, merge_stderr=False, limits=SANDBOX_LIMITS,
+                output_limit=OUTPUT_LIMIT_BYTES, comparator=None):
+    """
+    在沙箱中执行命令，返回 run_command 格式的结果，另附：
+        signal          终止信号名（如 "SIGSEGV"），正常退出时为 None
+        limit_exceeded  触发的资源限制（"cpu" / "memory" / "file_size" / "output"），未触发时为 None
+        output_limit_exceeded  输出超过 output_limit 字节被杀死（stdout / stderr 只保留开头和结尾）
+        cpu_user_ms / cpu_sys_ms / max_rss_kb  CPU 时间和峰值内存
+    cmd 为字符串时经 /bin/sh 执行；limits 为 None 时不设资源限制（编译器、make 等判题工具）
+    comparator: 流式比较器（见 comparator.py），标准输出边读取边比较，发现不同时立即终止程序，
+    结果中另附 comparison_fields() 的字段
+    """
+    cgroup = _create_cgroup(limits) if limits is not None else None
+    stdin = out_r = err_r = in_w = None
+    child_fds = []
+    proc = None
+    try:
+        if stdin_file is not None:
+            stdin = os.open(os.path.join(cwd or ".", stdin_file), os.O_RDONLY)
+            child_fds.append(stdin)
+        elif input_data is not None:
+            stdin, in_w = os.pipe()
+            child_fds.append(stdin)
+        else:
+            stdin = subprocess.DEVNULL
+        out_r, out_w = os.pipe()
+        child_fds.append(out_w)
+        if merge_stderr:
+            err_w = subprocess.STDOUT
+        else:
+            err_r, err_w = os.pipe()
+            child_fds.append(err_w)
+
+        proc = subprocess.Popen(
+            cmd,
+            shell=isinstance(cmd, str),
+            stdin=stdin,
+            stdout=out_w,
+            stderr=err_w,
+            cwd=cwd,
+            start_new_session=True,
+            preexec_fn=limit_preexec(limits, timeout, cgroup)
+        )
+        for fd in child_fds:
+            os.close(fd)
+        child_fds = []
+
+        deadline = time.time() + timeout
+        fds = (in_w, out_r, err_r)
+        in_w = out_r = err_r = None  # 由 communicate 关闭
+        stdout, stderr, stopped = communicate(*fds, (input_data or "").encode(), deadline, output_limit,
+                                              comparator.feed if comparator is not None else None)
+        waited = None if stopped is not None else _wait(proc.pid, deadline)
+        if waited is None:
+            # 超时、输出超限或输出已不同：杀死整个进程组
+            if stopped is None:
+                stopped = "timeout"
+            kill_group(proc.pid)
+            waited = _wait(proc.pid, time.time() + 5)
+        else:
+            # 程序已退出，清理它留在进程组中的后台进程（进程本身已回收，不能再按 pid 杀死）
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        if waited is not None:
+            proc.returncode = os.waitstatus_to_exitcode(waited[0])
+
+        timed_out = stopped == "timeout"
+        result = {
+            "stdout": decode_output(stdout),
+            "stderr": decode_output(stderr),
+            "exit_code": -1,
+            "timeout": timed_out,
+            "signal": None,
+            "limit_exceeded": None,
+            "output_limit_exceeded": stopped == "output_limit",
+        }
+        if waited is not None:
+            status, usage = waited
+            result.update(usage_fields(status, int(usage.ru_utime * 1000), int(usage.ru_stime * 1000), usage.ru_maxrss))
+        if timed_out:
+            result["stderr"] = "Execution timed out after {} seconds".format(timeout)
+            result["exit_code"] = -1
+        if stopped == "output_limit":
+            result["limit_exceeded"] = "output"
+        if comparator is not None:
+            result.update(comparison_fields(comparator, stopped))
+        if cgroup is not None:
+            stats = _release_cgroup(cgroup)
+            cgroup = None
+            # cgroup 的统计包括程序创建的所有子进程
+            if "max_rss_kb" in stats:
+                result["max_rss_kb"] = stats["max_rss_kb"]
+            if "user_usec" in stats and "system_usec" in stats:
+                result["cpu_user_ms"] = stats["user_usec"] // 1000
+                result["cpu_sys_ms"] = stats["system_usec"] // 1000
+            if stats.get("oom_kill"):
+                result["limit_exceeded"] = "memory"
+        return result
+    except Exception as e:
+        if proc is not None and proc.returncode is None:
+            kill_group(proc.pid)
+            proc.wait()
+        return {
+            "stdout": "",
+            "stderr": str(e),
+            "exit_code": -1,
+            "timeout": False
+        }
+    finally:
+        for fd in child_fds + [fd for fd in (in_w, out_r, err_r) if fd is not None]:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if cgroup is not None:
+            _release_cgroup(cgroup)
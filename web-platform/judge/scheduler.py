@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Judge Scheduler - 判题调度器
+判题按流水线阶段（prep 准备 / compile 编译 / exec 运行评分，见 run_job.PIPELINE_STAGES）执行，
+每个阶段使用单独的固定大小进程池，一个阶段结束后把判题上下文交给下一阶段的进程池，
+不同提交的阶段可以重叠执行，编译密集的提交也不会挡住不需要编译的提交
+排队 + 判题中的任务总数有上限，超出时拒绝请求（由 HTTP 层返回 503 + Retry-After）
+工作进程通过事件队列回传判题进度，支持取消尚未结束的任务
+不编译、不运行程序的题型（text_exact，以及题目模板中已有测试程序输出的 reading）走快速通道，
+在提交的线程中直接判题，不占用队列名额
+"""
+
+import os
+import math
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import JudgeMetrics, CACHE_COUNTERS
+from judge_cpu import JUDGE_WORKERS, default_stage_workers
+from workspace import release_template
+
+# ============================================================
+# 调度配置 (Scheduler Configuration)
+# ============================================================
+
+# 统计窗口：最近 N 个请求的排队 / 运行耗时
+METRICS_WINDOW = 500
+
+JUDGE_QUEUE_SIZE = int(os.environ.get("JUDGE_QUEUE_SIZE", "0")) or JUDGE_WORKERS * 4
+
+# 快速通道：题型提供了 fast 钩子时在提交的线程中直接判题（见 run_job.judge_fast），JUDGE_FAST_LANE=0 关闭
+FAST_LANE_ENABLED = os.environ.get("JUDGE_FAST_LANE", "1") != "0"
+
+# 流水线阶段（与 run_job.PIPELINE_STAGES 一致，所有提交从第一个阶段开始）
+PIPELINE_STAGES = ("prep", "compile", "exec")
+
+
+class QueueFull(Exception):
+    """判题队列已满"""
+
+    def __init__(self, retry_after):
+        super().__init__("Judge queue is full")
+        self.retry_after = retry_after
+
+
+# ============================================================
+# 工作进程 (Worker Process)
+# ============================================================
+
+# 工作进程内的事件队列和已取消任务集合（由进程池 initializer 设置）
+_event_queue = None
+_cancelled_jobs = None
+
+
+def _init_worker(event_queue, cancelled_jobs):
+    """工作进程初始化"""
+    global _event_queue, _cancelled_jobs
+    _event_queue = event_queue
+    _cancelled_jobs = cancelled_jobs
+
+
+def _stage_worker(ctx, enqueued_at, job_id=None, request=None):
+    """
+    在工作进程中执行 ctx 的下一个流水线阶段（第一个阶段传入 request = (problem_id, work_dir, resource_dir)），
+    返回更新后的判题上下文、该阶段的排队 / 运行耗时和上报的进度事件
+    进度事件带有任务内唯一的 seq，经事件队列实时上报的同时随阶段结果返回：
+    事件队列由后台线程异步转交，任务结束时可能还有事件未送达，结束时按 seq 补齐（见 JobStore.finish）
+    """
+    from run_job import judge_stage, new_judge_context, set_progress_hook, get_config_store
+    from judge_cache import cache_stats
+
+    if ctx is None:
+        ctx = new_judge_context(*request)
+    stage = ctx["stages"][0]
+    started_at = time.time()
+    events = []
+
+    def report(event):
+        event["seq"] = "{}:{}".format(stage, len(events))
+        events.append(event)
+        _event_queue.put((job_id, event))
+
+    if job_id is not None and _event_queue is not None:
+        set_progress_hook(report, lambda: job_id in _cancelled_jobs)
+        if request is not None:
+            report({"type": "started", "queue_wait_ms": int((started_at - enqueued_at) * 1000)})
+    try:
+        ctx = judge_stage(ctx)
+    finally:
+        set_progress_hook(None)
+    finished_at = time.time()
+
+    return {
+        "stage": stage,
+        "ctx": ctx,
+        "queue_wait_ms": int((started_at - enqueued_at) * 1000),
+        "run_ms": int((finished_at - started_at) * 1000),
+        "events": events,
+        "pid": os.getpid(),
+        "cache": cache_stats(),
+        "config": get_config_store().stats(),
+    }
+
+
+def _warm_up():
+    """预热工作进程：提前导入判题模块"""
+    import run_job  # noqa: F401
+    return os.getpid()
+
+
+def _prepare_templates(resource_dir):
+    """生成全部题目模板（预编译评测程序），返回模板数"""
+    from run_job import prepare_templates
+    return prepare_templates(resource_dir)
+
+
+# ============================================================
+# 调度器 (Scheduler)
+# ============================================================
+
+def _percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class JudgeScheduler:
+    """
+    判题调度器
+    - 每个流水线阶段的工作进程数固定（见 judge_cpu.default_stage_workers），避免突发请求同时 fork 大量 gcc
+    - 排队 + 判题中的任务总数有上限（各阶段进程数之和 + queue_size），超出时立即拒绝
+    """
+
+    def __init__(self, workers=JUDGE_WORKERS, queue_size=JUDGE_QUEUE_SIZE, stage_workers=None, fast_lane=FAST_LANE_ENABLED):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.stage_workers = stage_workers or default_stage_workers(workers)
+        # 同时在各阶段执行的任务数上限
+        self.capacity = sum(self.stage_workers.values())
+        self.lock = threading.Lock()
+        self.executors = {stage: None for stage in PIPELINE_STAGES}
+        self.pending = 0  # 排队中 + 判题中的任务数
+        self.counters = {"submitted": 0, "completed": 0, "rejected": 0, "failed": 0, "fast_path": 0}
+        self.fast_lane = fast_lane
+        self.fast_times = deque(maxlen=METRICS_WINDOW)  # 快速通道的判题耗时（毫秒）
+        self.queue_waits = deque(maxlen=METRICS_WINDOW)
+        self.run_times = deque(maxlen=METRICS_WINDOW)
+        # 各阶段：in_flight 为已交给该阶段进程池、尚未结束的任务数
+        self.stages = {stage: {
+            "in_flight": 0,
+            "completed": 0,
+            "queue_waits": deque(maxlen=METRICS_WINDOW),
+            "run_times": deque(maxlen=METRICS_WINDOW),
+        } for stage in PIPELINE_STAGES}
+        self.worker_cache_stats = {}  # (阶段, pid) -> 该工作进程最近一次上报的缓存统计
+        self.worker_config_stats = {}  # (阶段, pid) -> 该工作进程最近一次上报的题目配置版本
+        # 各阶段已退出的工作进程最后一次上报的缓存计数器合计 {阶段: {缓存名: {计数器: 值}}}，
+        # 进程池重建后计数器仍单调递增
+        self.retired_cache_counters = {stage: {} for stage in PIPELINE_STAGES}
+        self.metrics = JudgeMetrics()  # /metrics 接口的累计指标
+        self.jobs = {}  # job_id -> 任务（用于取消）
+        self.event_sink = None  # 进度事件回调 event_sink(job_id, event)
+        self.mp_context = multiprocessing.get_context("spawn")
+        self.manager = None
+        self.event_queue = None
+        self.cancelled_jobs = None
+
+    def _get_executor(self, stage):
+        """懒加载阶段 stage 的进程池（spawn 模式，避免在多线程的 Flask 进程中 fork）"""
+        if self.executors[stage] is None:
+            if self.manager is None:
+                self.manager = self.mp_context.Manager()
+                self.cancelled_jobs = self.manager.dict()
+                self.event_queue = self.mp_context.Queue()
+                threading.Thread(target=self._drain_events, name="judge-events", daemon=True).start()
+            self.executors[stage] = ProcessPoolExecutor(
+                max_workers=self.stage_workers[stage],
+                mp_context=self.mp_context,
+                initializer=_init_worker,
+                initargs=(self.event_queue, self.cancelled_jobs)
+            )
+        return self.executors[stage]
+
+    def _drain_events(self):
+        """后台线程：把工作进程上报的进度事件转交给 event_sink"""
+        while True:
+            try:
+                job_id, event = self.event_queue.get()
+            except (EOFError, OSError):
+                return
+            sink = self.event_sink
+            if sink is not None:
+                try:
+                    sink(job_id, event)
+                except Exception:
+                    pass
+
+    def _reset_executor(self, stage, only_if_broken=False):
+        """工作进程异常退出（如 OOM）后重建该阶段的进程池"""
+        with self.lock:
+            executor = self.executors[stage]
+            if only_if_broken and not getattr(executor, "_broken", False):
+                return
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executors[stage] = None
+            retired = self.retired_cache_counters[stage]
+            for key in [key for key in self.worker_cache_stats if key[0] == stage]:
+                for name, stats in self.worker_cache_stats.pop(key).items():
+                    if not isinstance(stats, dict):
+                        continue
+                    total = retired.setdefault(name, {})
+                    for field in CACHE_COUNTERS:
+                        total[field] = total.get(field, 0) + stats.get(field, 0)
+            for key in [key for key in self.worker_config_stats if key[0] == stage]:
+                del self.worker_config_stats[key]
+
+    def start(self, resource_dir=None):
+        """
+        启动时预先拉起全部工作进程，避免首批请求承担进程启动耗时
+        传入 resource_dir 时先生成题目模板，返回模板数
+        """
+        with self.lock:
+            executors = {stage: self._get_executor(stage) for stage in PIPELINE_STAGES}
+        templates = executors["prep"].submit(_prepare_templates, resource_dir).result() if resource_dir else 0
+        if self.fast_lane:
+            from run_job import warm_fast_path
+            warm_fast_path()
+        futures = [executor.submit(_warm_up)
+                   for stage, executor in executors.items() for _ in range(self.stage_workers[stage])]
+        for future in futures:
+            future.result()
+        return templates
+
+    def retry_after(self):
+        """
+        估算队列腾出空位所需的秒数：超出执行容量的任务数 / 流水线的处理速度
+        处理速度取各阶段（进程数 / 平均运行耗时）中最慢的一个，还没有耗时数据的阶段按每个任务 1 秒估计
+        """
+        rate = None
+        for stage, stats in self.stages.items():
+            runs = stats["run_times"]
+            avg_run = (sum(runs) / len(runs) / 1000.0) if runs else 1.0
+            stage_rate = self.stage_workers[stage] / max(avg_run, 0.001)
+            rate = stage_rate if rate is None else min(rate, stage_rate)
+        backlog = max(1, self.pending - self.capacity + 1)
+        return max(1, int(math.ceil(backlog / rate)))
+
+    def submit(self, problem_id, work_dir, resource_dir, job_id=None):
+        """
+        提交判题任务，返回 Future（结果为判题结果及排队 / 运行耗时）；队列已满时抛出 QueueFull
+        传入 job_id 时工作进程会上报进度事件，且任务可以通过 cancel(job_id) 取消
+        快速通道判出结果时返回已完成的 Future
+        """
+        future = self._judge_fast(problem_id, work_dir, resource_dir)
+        if future is not None:
+            return future
+
+        with self.lock:
+            if self.pending >= self.capacity + self.queue_size:
+                self.counters["rejected"] += 1
+                raise QueueFull(self.retry_after())
+            self.pending += 1
+            self.counters["submitted"] += 1
+
+        job = {
+            "problem_id": problem_id,
+            "job_id": job_id,
+            "future": Future(),
+            "stage_future": None,
+            "ctx": None,
+            "stages": {},
+            "events": [],
+        }
+        try:
+            self._submit_stage(job, None, (problem_id, work_dir, resource_dir))
+        except Exception:
+            with self.lock:
+                self.pending -= 1
+                self.counters["failed"] += 1
+            raise
+
+        future = job["future"]
+        if job_id is not None:
+            with self.lock:
+                self.jobs[job_id] = job
+            future.add_done_callback(lambda f: self._forget(job_id))
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _judge_fast(self, problem_id, work_dir, resource_dir):
+        """快速通道：在当前线程中直接判题，返回已完成的 Future；不适用时返回 None"""
+        if not self.fast_lane:
+            return None
+        from run_job import judge_fast
+        result = judge_fast(problem_id, work_dir, resource_dir)
+        if result is None:
+            return None
+
+        payload = {
+            "problem_id": problem_id,
+            "result": result,
+            "queue_wait_ms": 0,
+            "run_ms": result["metrics"]["judge_ms"],
+            "stages": {},
+            "events": [],
+            "fast_path": True,
+        }
+        with self.lock:
+            self.counters["fast_path"] += 1
+            self.fast_times.append(payload["run_ms"])
+        self.metrics.observe(payload)
+        future = Future()
+        future.set_result(payload)
+        return future
+
+    def _submit_stage(self, job, ctx, request=None):
+        """把任务交给下一个阶段（ctx["stages"][0]，第一个阶段为 prep）的进程池"""
+        stage = ctx["stages"][0] if ctx is not None else PIPELINE_STAGES[0]
+        try:
+            with self.lock:
+                executor = self._get_executor(stage)
+            stage_future = executor.submit(_stage_worker, ctx, time.time(), job["job_id"], request)
+        except (BrokenProcessPool, RuntimeError):
+            self._reset_executor(stage)
+            with self.lock:
+                executor = self._get_executor(stage)
+            stage_future = executor.submit(_stage_worker, ctx, time.time(), job["job_id"], request)
+        with self.lock:
+            self.stages[stage]["in_flight"] += 1
+            job["stage_future"] = stage_future
+            job["ctx"] = ctx
+        stage_future.add_done_callback(lambda f: self._on_stage_done(job, stage, f, executor))
+
+    def _on_stage_done(self, job, stage, stage_future, executor=None):
+        """
+        阶段结束回调：判题已结束时完成任务，否则交给下一阶段
+        executor 为执行该阶段的进程池，进程池已被重建时不再记录其工作进程的缓存统计（已计入 retired_cache_counters）
+        """
+        future = job["future"]
+        error = stage_future.exception() if not stage_future.cancelled() else None
+        if isinstance(error, BrokenProcessPool):
+            self._reset_executor(stage, only_if_broken=True)
+        with self.lock:
+            self.stages[stage]["in_flight"] -= 1
+        if (stage_future.cancelled() or error is not None) and job["ctx"] and "template_lease" in job["ctx"]:
+            # 判题中途结束，释放 prep 阶段登记的模板租约（见 run_job.prepare_problem_workspace）
+            release_template(job["ctx"]["template_lease"])
+        if stage_future.cancelled():
+            future.cancel()
+            return
+        if error is not None:
+            self._fail(future, error)
+            return
+
+        payload = stage_future.result()
+        with self.lock:
+            stats = self.stages[stage]
+            stats["completed"] += 1
+            stats["queue_waits"].append(payload["queue_wait_ms"])
+            stats["run_times"].append(payload["run_ms"])
+            if executor is None or self.executors[stage] is executor:
+                self.worker_cache_stats[(stage, payload["pid"])] = payload["cache"]
+                self.worker_config_stats[(stage, payload["pid"])] = payload["config"]
+        job["stages"][stage] = {"queue_wait_ms": payload["queue_wait_ms"], "run_ms": payload["run_ms"]}
+        job["events"].extend(payload["events"])
+
+        ctx = payload["ctx"]
+        if "result" not in ctx:
+            try:
+                self._submit_stage(job, ctx)
+            except Exception as e:
+                self._fail(future, e)
+            return
+
+        stages = job["stages"]
+        try:
+            future.set_result({
+                "problem_id": job["problem_id"],
+                "result": ctx["result"],
+                "queue_wait_ms": sum(s["queue_wait_ms"] for s in stages.values()),
+                "run_ms": sum(s["run_ms"] for s in stages.values()),
+                "stages": stages,
+                "events": job["events"],
+            })
+        except Exception:
+            # 任务已被取消
+            pass
+
+    @staticmethod
+    def _fail(future, error):
+        try:
+            future.set_exception(error)
+        except Exception:
+            pass
+
+    def _forget(self, job_id):
+        with self.lock:
+            self.jobs.pop(job_id, None)
+        if self.cancelled_jobs is not None:
+            try:
+                self.cancelled_jobs.pop(job_id, None)
+            except Exception:
+                pass
+
+    def cancel(self, job_id):
+        """
+        取消任务：在阶段队列中等待的直接移除，执行中的在下一个进度点（或下一个阶段开始时）中止
+        返回 False 表示任务不存在或已结束
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            stage_future = job["stage_future"] if job is not None else None
+        if job is None or job["future"].done():
+            return False
+        if stage_future is not None and stage_future.cancel():
+            return True
+        self.cancelled_jobs[job_id] = True
+        return True
+
+    def _on_done(self, future):
+        """任务结束回调：释放队列名额并记录耗时"""
+        with self.lock:
+            self.pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.counters["failed"] += 1
+                return
+            payload = future.result()
+            self.counters["completed"] += 1
+            self.queue_waits.append(payload["queue_wait_ms"])
+            self.run_times.append(payload["run_ms"])
+        self.metrics.observe(payload)
+
+    @staticmethod
+    def unpack(payload):
+        """
+        从任务结果中取出判题结果，在 metrics（判题中的资源用量、各阶段耗时，见 run_job.judge_stage）
+        中补充排队 / 运行耗时（各流水线阶段合计）
+        """
+        result = payload["result"]
+        result.setdefault("metrics", {}).update({
+            "queue_wait_ms": payload["queue_wait_ms"],
+            "run_ms": payload["run_ms"],
+        })
+        return result
+
+    def judge(self, problem_id, work_dir, resource_dir, timeout=None):
+        """同步判题：提交并等待结果"""
+        future = self.submit(problem_id, work_dir, resource_dir)
+        return self.unpack(future.result(timeout=timeout))
+
+    def cache_stats(self):
+        """
+        汇总各工作进程上报的缓存统计
+        计数器（见 metrics.CACHE_COUNTERS）包含已退出工作进程的最后一次上报，进程池重建后不会减少
+        """
+        with self.lock:
+            snapshots = list(self.worker_cache_stats.values())
+            retired = [dict((name, dict(total)) for name, total in caches.items())
+                       for caches in self.retired_cache_counters.values()]
+        merged = {"enabled": any(s.get("enabled") for s in snapshots) if snapshots else None}
+        for caches in retired:
+            for name, counters in caches.items():
+                total = merged.setdefault(name, {})
+                for field, value in counters.items():
+                    total[field] = total.get(field, 0) + value
+        for snapshot in snapshots:
+            for name, stats in snapshot.items():
+                if not isinstance(stats, dict):
+                    continue
+                total = merged.setdefault(name, {})
+                for field, value in stats.items():
+                    if field == "hit_rate":
+                        continue
+                    if field in ("entries", "bytes", "max_bytes"):
+                        # 磁盘缓存目录由各进程共享，取最大值而不是累加
+                        total[field] = max(total.get(field, 0), value)
+                    else:
+                        total[field] = total.get(field, 0) + value
+        for name, total in merged.items():
+            if isinstance(total, dict):
+                lookups = total.get("hits", 0) + total.get("misses", 0)
+                total["hit_rate"] = round(total.get("hits", 0) / lookups, 4) if lookups else 0.0
+        return merged
+
+    def config_stats(self):
+        """各工作进程正在使用的题目配置版本（配置热加载后各进程在下一次判题时各自切换）"""
+        with self.lock:
+            snapshots = list(self.worker_config_stats.values())
+        versions = sorted({s["version"] for s in snapshots})
+        latest = max(snapshots, key=lambda s: s["loaded_at"]) if snapshots else None
+        return {"versions": versions, "latest": latest}
+
+    def prometheus_metrics(self):
+        """Prometheus 文本格式的指标（供 /metrics 接口使用）"""
+        return self.metrics.render(self.stats(), self.cache_stats())
+
+    def stage_stats(self):
+        """
+        各流水线阶段的统计：进程数、队列深度（queued 为等待空闲进程的任务数）、执行中的任务数，
+        以及最近的排队 / 运行耗时
+        """
+        stages = {}
+        with self.lock:
+            for stage, stats in self.stages.items():
+                workers = self.stage_workers[stage]
+                waits = list(stats["queue_waits"])
+                runs = list(stats["run_times"])
+                stages[stage] = {
+                    "workers": workers,
+                    "in_flight": stats["in_flight"],
+                    "running": min(stats["in_flight"], workers),
+                    "queued": max(0, stats["in_flight"] - workers),
+                    "completed": stats["completed"],
+                    "queue_wait_ms": {"p50": _percentile(waits, 50), "p95": _percentile(waits, 95), "max": max(waits) if waits else 0},
+                    "run_ms": {"p50": _percentile(runs, 50), "p95": _percentile(runs, 95), "max": max(runs) if runs else 0},
+                }
+        return stages
+
+    def stats(self):
+        """调度器统计信息（供 /stats 接口使用）"""
+        stages = self.stage_stats()
+        with self.lock:
+            waits = list(self.queue_waits)
+            runs = list(self.run_times)
+            stats = dict(self.counters)
+            stats.update({
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "queue_size": self.queue_size,
+                "in_flight": self.pending,
+                "queued": sum(stage["queued"] for stage in stages.values()),
+            })
+        stats["queue_wait_ms"] = {"p50": _percentile(waits, 50), "p95": _percentile(waits, 95), "max": max(waits) if waits else 0}
+        stats["run_ms"] = {"p50": _percentile(runs, 50), "p95": _percentile(runs, 95), "max": max(runs) if runs else 0}
+        stats["stages"] = stages
+        with self.lock:
+            fast_times = list(self.fast_times)
+        stats["fast_path_ms"] = {"p50": _percentile(fast_times, 50), "p95": _percentile(fast_times, 95), "max": max(fast_times) if fast_times else 0}
+        return stats
@@ -4,26 +4,37 @@ Judge HTTP Server - 持久运行的判题服务
 通过 HTTP API 接收判题请求，避免每次创建新容器
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import os
 import json
 import traceback
-from run_job import judge_submission
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeoutError
+from scheduler import JudgeScheduler, QueueFull
+from metrics import PROMETHEUS_CONTENT_TYPE
+from jobs import JobStore, JOB_FAILED, JOB_ACTIVE_STATES
 
 app = Flask(__name__)
 
 WORKSPACE_BASE = "/workspace"
 RESOURCE_DIR = "/resources"
 
-@app.route("/health", methods=["GET"])
-def health():
-    """健康检查接口"""
-    return jsonify({"status": "ok", "message": "Judge service is running"})
+# 单次 /judge 请求最长等待时间（需小于前端 60 秒超时）
+JUDGE_REQUEST_TIMEOUT = int(os.environ.get("JUDGE_REQUEST_TIMEOUT", "55"))
 
-@app.route("/judge", methods=["POST"])
-def judge():
+# 判题调度器：分阶段进程池 + 有界队列，不需要编译运行的题型走快速通道
+scheduler = JudgeScheduler()
+
+# 异步判题任务表（工作进程上报的进度事件写入对应任务）
+job_store = JobStore()
+scheduler.event_sink = job_store.add_event
+
+# SSE 心跳间隔（秒），防止代理断开空闲连接
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def parse_judge_request():
     """
-    判题接口
+    解析判题请求体，返回 (problem_id, submission_id, work_dir, error_response)
     请求体:
     {
         "problem_id": "02_code1",
@@ -31,37 +42,89 @@ def judge():
     }
     submission_id 用于定位 /workspace/<submission_id>/ 目录
     """
+    data = request.get_json(silent=True)
+    if not data:
+        return None, None, None, (jsonify({"status": "error", "message": "No JSON data"}), 400)
+
+    problem_id = data.get("problem_id")
+    submission_id = data.get("submission_id")
+
+    if not problem_id or not submission_id:
+        return None, None, None, (jsonify({
+            "status": "error",
+            "message": "Missing problem_id or submission_id"
+        }), 400)
+
+    work_dir = os.path.join(WORKSPACE_BASE, str(submission_id))
+
+    if not os.path.isdir(work_dir):
+        return None, None, None, (jsonify({
+            "status": "error",
+            "message": f"Submission directory not found: {submission_id}"
+        }), 404)
+
+    return problem_id, submission_id, work_dir, None
+
+
+def busy_response(e):
+    """队列已满：返回 503 + Retry-After"""
+    response = jsonify({
+        "status": "system_error",
+        "score": 0,
+        "logs": ["判题服务繁忙，请稍后重试", "建议 {} 秒后重新提交".format(e.retry_after)]
+    })
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 503
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """健康检查接口"""
+    return jsonify({"status": "ok", "message": "Judge service is running"})
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    """判题统计接口（调度队列、异步任务、编译缓存命中/未命中、题目配置版本等）"""
+    return jsonify({
+        "status": "ok",
+        "scheduler": scheduler.stats(),
+        "jobs": job_store.stats(),
+        "cache": scheduler.cache_stats(),
+        "config": scheduler.config_stats()
+    })
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus 指标接口（排队 / 判题耗时、各阶段耗时、资源用量、判题结果计数、缓存统计）"""
+    return Response(scheduler.prometheus_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route("/judge", methods=["POST"])
+def judge():
+    """同步判题接口：等待判题结束后返回结果"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"status": "error", "message": "No JSON data"}), 400
-        
-        problem_id = data.get("problem_id")
-        submission_id = data.get("submission_id")
-        
-        if not problem_id or not submission_id:
-            return jsonify({
-                "status": "error", 
-                "message": "Missing problem_id or submission_id"
-            }), 400
-        
-        work_dir = os.path.join(WORKSPACE_BASE, str(submission_id))
-        
-        if not os.path.isdir(work_dir):
-            return jsonify({
-                "status": "error",
-                "message": f"Submission directory not found: {submission_id}"
-            }), 404
-        
+        problem_id, submission_id, work_dir, error = parse_judge_request()
+        if error:
+            return error
+
         print(f"[Judge] Processing: problem={problem_id}, submission={submission_id}")
-        
-        # 调用判题逻辑
-        result = judge_submission(problem_id, work_dir, RESOURCE_DIR)
-        
-        print(f"[Judge] Result: {result['status']}")
-        
+
+        # 交给调度器判题（队列满时立即拒绝）
+        result = scheduler.judge(problem_id, work_dir, RESOURCE_DIR, timeout=JUDGE_REQUEST_TIMEOUT)
+
+        print(f"[Judge] Result: {result['status']} (queue {result['metrics']['queue_wait_ms']}ms, run {result['metrics']['run_ms']}ms)")
+
         return jsonify(result)
-        
+
+    except QueueFull as e:
+        return busy_response(e)
+
+    except FutureTimeoutError:
+        return jsonify({
+            "status": "system_error",
+            "score": 0,
+            "logs": ["判题等待超时（超过 {} 秒），请稍后重试".format(JUDGE_REQUEST_TIMEOUT)]
+        }), 504
+
     except Exception as e:
         traceback.print_exc()
         return jsonify({
@@ -70,8 +133,105 @@ def judge():
             "logs": ["Judge server error", str(e)]
         }), 500
 
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    异步判题接口：立即返回 job_id，判题在后台进行
+    请求体与 /judge 相同，结果通过 GET /jobs/<job_id> 查询
+    """
+    try:
+        problem_id, submission_id, work_dir, error = parse_judge_request()
+        if error:
+            return error
+
+        job_id = job_store.create(problem_id, submission_id)
+        try:
+            future = scheduler.submit(problem_id, work_dir, RESOURCE_DIR, job_id=job_id)
+        except QueueFull as e:
+            job_store.finish(job_id, None, JOB_FAILED)
+            return busy_response(e)
+
+        def on_done(f):
+            try:
+                payload = f.result()
+                job_store.finish(job_id, scheduler.unpack(payload), events=payload["events"])
+            except CancelledError:
+                job_store.finish(job_id, {"status": "system_error", "score": 0, "logs": ["判题已取消"]}, JOB_FAILED)
+            except Exception as e:
+                job_store.finish(job_id, {
+                    "status": "system_error",
+                    "score": 0,
+                    "logs": ["Judge server error", str(e)]
+                }, JOB_FAILED)
+        future.add_done_callback(on_done)
+
+        print(f"[Judge] Job {job_id}: problem={problem_id}, submission={submission_id}")
+
+        return jsonify({"job_id": job_id, "state": "pending"}), 202
+
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    查询异步判题任务
+    ?wait=N 为长轮询：任务未结束时最多等待 N 秒（上限 30 秒）再返回
+    """
+    try:
+        wait = float(request.args.get("wait", "0"))
+    except ValueError:
+        wait = 0
+
+    job = job_store.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job not found: {job_id}"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """取消判题任务（排队中的直接移除，运行中的在下一个测试点中止）"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Job not found: {job_id}"}), 404
+    cancelled = scheduler.cancel(job_id)
+    return jsonify({"job_id": job_id, "cancelled": cancelled})
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    判题进度流（Server-Sent Events）
+    - event: progress  编译完成、单个测试通过/失败等进度事件
+    - event: verdict   最终判题结果，随后关闭连接
+    """
+    if job_store.get(job_id) is None:
+        return jsonify({"status": "error", "message": f"Job not found: {job_id}"}), 404
+
+    def stream():
+        cursor = 0
+        while True:
+            waited = job_store.wait_events(job_id, cursor, SSE_HEARTBEAT_SECONDS)
+            if waited is None:
+                return
+            events, cursor, job = waited
+            for event in events:
+                yield "event: progress\ndata: {}\n\n".format(json.dumps(event, ensure_ascii=False))
+            if job["state"] not in JOB_ACTIVE_STATES:
+                yield "event: verdict\ndata: {}\n\n".format(json.dumps(job["result"], ensure_ascii=False))
+                return
+            if not events:
+                yield ": keepalive\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
 if __name__ == "__main__":
     print("[Judge Server] Starting on port 9090...")
-    # 使用多线程模式以支持并发请求
+    print("[Judge Server] Stage workers: {}, queue size: {}".format(scheduler.stage_workers, scheduler.queue_size))
+    templates = scheduler.start(RESOURCE_DIR)
+    print("[Judge Server] Problem templates ready: {}".format(templates))
+    # 多线程只负责接收请求和等待结果，实际判题由调度器的进程池执行
     app.run(host="0.0.0.0", port=9090, debug=False, threaded=True)
-
@@ -0,0 +1,6 @@
+"""判题服务单元测试：被测模块是 judge/ 目录下的顶层模块，从测试目录运行时加入导入路径"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
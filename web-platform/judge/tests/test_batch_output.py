@@ -0,0 +1,73 @@
+"""run_job.parse_batch_output：批量测试驱动输出按分隔行切分为各用例的输出和返回值"""
+
+import pytest
+
+import run_job
+from run_job import parse_batch_output
+
+TAG = "@@x1"
+
+
+def begin(i):
+    return "\n{} begin {}\n".format(TAG, i)
+
+
+def end(i, result=0):
+    return "\n{} end {} {}\n".format(TAG, i, result)
+
+
+def test_complete_cases():
+    output = begin(0) + "1 4 9" + end(0, 14) + begin(1) + "" + end(1, -3)
+    done, current, partial = parse_batch_output(output, TAG)
+    assert done == {0: ("1 4 9", 14), 1: ("", -3)}
+    assert current is None
+    assert partial == ""
+
+
+def test_case_output_keeps_newlines():
+    output = begin(0) + "a\nb\n" + end(0)
+    done, _, _ = parse_batch_output(output, TAG)
+    assert done[0] == ("a\nb\n", 0)
+
+
+def test_unfinished_case():
+    """崩溃或超时的用例只有开始分隔行：返回其序号和已有输出，调用方从下一个用例继续"""
+    output = begin(0) + "ok" + end(0) + begin(1) + "partial out"
+    done, current, partial = parse_batch_output(output, TAG)
+    assert done == {0: ("ok", 0)}
+    assert current == 1
+    assert partial == "partial out"
+
+
+def test_forged_separator_with_other_tag_is_output():
+    """学生代码输出的分隔行标记不同，不会被当作用例边界"""
+    fake = "\n@@other end 0 99\n"
+    output = begin(0) + fake + end(0, 1)
+    done, current, _ = parse_batch_output(output, TAG)
+    assert done == {0: (fake, 1)}
+    assert current is None
+
+
+def test_end_without_matching_begin_is_ignored():
+    output = end(5) + begin(0) + "x" + end(0)
+    done, _, _ = parse_batch_output(output, TAG)
+    assert done == {0: ("x", 0)}
+
+
+def test_tag_is_regex_escaped():
+    tag = "a.b+"
+    output = "\n{} begin 0\nx\n{} end 0 1\n".format(tag, tag)
+    done, _, _ = parse_batch_output(output, tag)
+    assert done == {0: ("x", 1)}
+    assert parse_batch_output(output.replace("a.b+", "axbb"), tag)[0] == {}
+
+
+def test_batch_call_args_typed_literals():
+    spec = {"function": "f", "params": ["int", "long", "double"]}
+    assert run_job.batch_call_args(spec, "1 -2 3.5e2") == ["1", "-2L", "3.5e2"]
+
+
+@pytest.mark.parametrize("args", ["1 2", "1 2 3 4", "1 2 exit(0)", "1+1 2 3", "0x10 2 3"])
+def test_batch_call_args_rejects_non_literals(args):
+    with pytest.raises(ValueError):
+        run_job.batch_call_args({"function": "f", "params": ["int", "long", "double"]}, args)
@@ -0,0 +1,103 @@
+"""comparator：各比较方式，以及程序输出和期望输出在任意位置分块时的结果"""
+
+import pytest
+
+import comparator
+from comparator import make_comparator
+
+
+def compare(mode, expected, output, chunk=None, **kwargs):
+    """按 chunk 字节分块把 output 传给比较器，返回 (是否相同, 差异说明)"""
+    cmp = make_comparator(mode, expected=expected, **kwargs)
+    data = output.encode()
+    chunk = chunk or max(1, len(data))
+    for i in range(0, len(data), chunk):
+        cmp.feed(data[i:i + chunk])
+    return cmp.finish(), cmp.describe()
+
+
+@pytest.mark.parametrize("mode, expected, output, ok", [
+    ("exact", "1 2\n3\n", "1 2\n3\n", True),
+    ("exact", "1 2\n3\n", "1 2\r\n3\r\n", True),
+    ("exact", "1 2\n3\n", "1 2\r3\r", True),
+    ("exact", "1 2\n3\n", "1 2\n3", False),
+    ("exact", "1 2\n3\n", "1  2\n3\n", False),
+    ("whitespace", "1 2\n3\n", "1 2\n3", True),
+    ("whitespace", "1 2\n3", "1 2\n3 \n\n\t", True),
+    ("whitespace", "1 2\n3\n", "1 2 \n3\n", False),
+    ("whitespace", "1 2\n3\n4", "1 2\n3\n", False),
+    ("token", "1 2\n3\n", "1\t2 3", True),
+    ("token", "1 2\n3\n", "  1\n\n2\n3\n\n", True),
+    ("token", "1 2\n3\n", "1 2", False),
+    ("token", "1 2\n3\n", "1 2 3 4", False),
+    ("token", "12 3", "1 23", False),
+    ("float", "0.5 x", "0.5000000001 x", True),
+    ("float", "0.5 x", "0.5 y", False),
+    ("float", "nan inf", "nan inf", True),
+    ("float", "inf", "1e308", False),
+    ("float", "nan", "0", False),
+])
+def test_modes(mode, expected, output, ok):
+    assert compare(mode, expected, output)[0] is ok
+
+
+def test_float_tolerance_absolute_and_relative():
+    assert compare("float", "1.0", "1.01", tolerance=0.02)[0]
+    assert not compare("float", "1.0", "1.03", tolerance=0.02)[0]
+    # 大数按相对误差比较
+    assert compare("float", "1000000", "1000100", tolerance=1e-3)[0]
+    assert not compare("float", "1000000", "1002000", tolerance=1e-3)[0]
+
+
+@pytest.mark.parametrize("mode", comparator.COMPARE_MODES)
+@pytest.mark.parametrize("chunk", [1, 2, 3, 7])
+def test_chunk_boundaries(monkeypatch, mode, chunk):
+    """输出按任意字节数分块、期望输出按很小的块读取时，结果与整体比较相同"""
+    monkeypatch.setattr(comparator, "READ_SIZE", 3)
+    expected = "10 200\r\n3000 4\n\n"
+    assert compare(mode, expected, "10 200\n3000 4\n\n", chunk=chunk)[0]
+    assert not compare(mode, expected, "10 200\n3001 4\n\n", chunk=chunk)[0]
+    assert not compare(mode, expected, "10 200\n3000", chunk=chunk)[0]
+    assert not compare(mode, expected, "10 200\n3000 4 5\n", chunk=chunk)[0]
+
+
+def test_split_crlf_is_one_newline():
+    """\\r 和 \\n 分在两个数据块中时仍算一个换行"""
+    assert compare("exact", "a\nb\n", "a\r\nb\r\n", chunk=2)[0]
+
+
+def test_token_split_across_chunks():
+    """单词被分块切开时拼接后再比较"""
+    assert compare("token", "12345 678", "12345 678", chunk=2)[0]
+    assert not compare("token", "12345 678", "123 45 678", chunk=2)[0]
+
+
+def test_describe_reports_first_difference():
+    ok, message = compare("exact", "a\nb\nc\n", "a\nx\nc\n")
+    assert not ok
+    assert message.startswith("第 2 行")
+    ok, message = compare("token", "1 2 3", "1 2")
+    assert message == "第 3 个单词: 输出提前结束, 期望 '3'"
+    ok, message = compare("token", "1 2", "1 2 3")
+    assert message == "第 3 个单词: 输出比期望多 '3'"
+    assert compare("exact", "a", "a")[1] is None
+
+
+def test_feed_stops_after_mismatch():
+    cmp = make_comparator("exact", expected="abc")
+    assert not cmp.feed(b"x")
+    assert not cmp.feed(b"bc")
+    assert not cmp.finish()
+
+
+def test_expected_file(tmp_path):
+    path = tmp_path / "expected.txt"
+    path.write_bytes(b"1 2\r\n3\r\n")
+    cmp = make_comparator("exact", expected_file=str(path))
+    cmp.feed(b"1 2\n3\n")
+    assert cmp.finish()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        make_comparator("fuzzy", expected="")
@@ -0,0 +1,146 @@
+"""jobs.JobStore：任务状态、长轮询等待任务结束、进度事件的去重和等待，以及已结束任务的清理"""
+
+import threading
+import time
+
+import jobs
+from jobs import JobStore
+
+
+def finish_later(store, job_id, delay, result):
+    timer = threading.Timer(delay, store.finish, (job_id, result))
+    timer.start()
+    return timer
+
+
+def test_create_and_get():
+    store = JobStore()
+    job_id = store.create("p", 7)
+    job = store.get(job_id)
+    assert job["state"] == jobs.JOB_PENDING
+    assert (job["problem_id"], job["submission_id"], job["result"]) == ("p", 7, None)
+    assert "events" not in job and "seqs" not in job
+    assert store.get("missing") is None
+
+
+def test_started_event_marks_running():
+    store = JobStore()
+    job_id = store.create("p", 1)
+    store.add_event(job_id, {"type": "started"})
+    assert store.get(job_id)["state"] == jobs.JOB_RUNNING
+    assert store.stats()["running"] == 1
+
+
+def test_long_poll_returns_when_job_finishes():
+    store = JobStore()
+    job_id = store.create("p", 1)
+    timer = finish_later(store, job_id, 0.1, {"status": "accepted"})
+    started = time.time()
+    job = store.get(job_id, wait=5)
+    timer.join()
+    assert job["state"] == jobs.JOB_FINISHED
+    assert job["result"] == {"status": "accepted"}
+    assert time.time() - started < 2
+
+
+def test_long_poll_times_out_with_active_job():
+    store = JobStore()
+    job_id = store.create("p", 1)
+    started = time.time()
+    assert store.get(job_id, wait=0.2)["state"] == jobs.JOB_PENDING
+    assert 0.15 <= time.time() - started < 2
+
+
+def test_long_poll_wait_is_capped(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_WAIT", 0.1)
+    store = JobStore()
+    job_id = store.create("p", 1)
+    started = time.time()
+    store.get(job_id, wait=60)
+    assert time.time() - started < 2
+
+
+def test_finished_job_returns_immediately():
+    store = JobStore()
+    job_id = store.create("p", 1)
+    store.finish(job_id, {"status": "system_error"}, state=jobs.JOB_FAILED)
+    started = time.time()
+    assert store.get(job_id, wait=5)["state"] == jobs.JOB_FAILED
+    assert time.time() - started < 0.5
+
+
+def test_prune_expired_finished_jobs(monkeypatch):
+    store = JobStore(retention=10)
+    done = store.create("p", 1)
+    active = store.create("p", 2)
+    store.finish(done, {})
+    now = time.time()
+    monkeypatch.setattr(jobs.time, "time", lambda: now + 11)
+    store.create("p", 3)
+    assert store.get(done) is None
+    # 未结束的任务不会被清理
+    assert store.get(active) is not None
+
+
+def test_prune_over_max_entries_keeps_active_jobs():
+    store = JobStore(max_entries=2)
+    ids = [store.create("p", i) for i in range(3)]
+    for job_id in ids[:2]:
+        store.finish(job_id, {})
+    store.create("p", 3)
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) is not None
+
+
+def test_events_are_deduplicated_by_seq():
+    """事件队列送达的事件和随判题结果返回的全部事件有重叠，同一 seq 只保留一次"""
+    store = JobStore()
+    job_id = store.create("p", 1)
+    store.add_event(job_id, {"type": "started", "seq": 0})
+    store.add_event(job_id, {"type": "test", "seq": 1})
+    store.add_event(job_id, {"type": "test", "seq": 1})
+    store.finish(job_id, {}, events=[{"type": "started", "seq": 0}, {"type": "test", "seq": 1},
+                                     {"type": "test", "seq": 2}, {"type": "done", "seq": 3}])
+    events, cursor, job = store.wait_events(job_id, 0, 0)
+    assert [event["seq"] for event in events] == [0, 1, 2, 3]
+    assert cursor == 4
+    assert job["state"] == jobs.JOB_FINISHED
+
+
+def test_events_after_finish_are_dropped():
+    store = JobStore()
+    job_id = store.create("p", 1)
+    store.finish(job_id, {}, events=[{"type": "done", "seq": 0}])
+    store.add_event(job_id, {"type": "test", "seq": 5})
+    assert store.wait_events(job_id, 0, 0)[1] == 1
+
+
+def test_event_limit(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_EVENTS", 3)
+    store = JobStore()
+    job_id = store.create("p", 1)
+    for seq in range(5):
+        store.add_event(job_id, {"type": "test", "seq": seq})
+    assert store.wait_events(job_id, 0, 0)[1] == 3
+
+
+def test_wait_events_wakes_on_new_event():
+    store = JobStore()
+    job_id = store.create("p", 1)
+    store.add_event(job_id, {"type": "started", "seq": 0})
+    timer = threading.Timer(0.1, store.add_event, (job_id, {"type": "test", "seq": 1}))
+    timer.start()
+    started = time.time()
+    events, cursor, job = store.wait_events(job_id, 1, 5)
+    timer.join()
+    assert events == [{"type": "test", "seq": 1}]
+    assert cursor == 2
+    assert job["state"] == jobs.JOB_RUNNING
+    assert time.time() - started < 2
+
+
+def test_wait_events_times_out():
+    store = JobStore()
+    job_id = store.create("p", 1)
+    assert store.wait_events(job_id, 0, 0.1)[0] == []
+    assert store.wait_events("missing", 0, 0) is None
@@ -0,0 +1,105 @@
+"""judge_cache.DiskLRUCache：按条目数和字节数淘汰最久未使用的条目，容量限制对共享目录的所有实例整体生效"""
+
+import os
+
+import pytest
+
+import judge_cache
+
+
+@pytest.fixture
+def cache_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(judge_cache, "CACHE_ROOT", str(tmp_path))
+    return tmp_path
+
+
+def put(cache, key, size=100, when=None):
+    """写入 size 字节的元数据条目；when 为访问时间（元数据文件的 mtime）"""
+    assert cache.put(key, {"data": "x" * (size - len('{"data": ""}'))})
+    if when is not None:
+        os.utime(cache._paths(key)[0], (when, when))
+
+
+def keys(cache):
+    return sorted(name[:-len(".json")] for name in os.listdir(cache.root) if name.endswith(".json"))
+
+
+def test_get_put(cache_root, tmp_path):
+    cache = judge_cache.DiskLRUCache("t", 1 << 20, 10)
+    src = tmp_path / "a.out"
+    src.write_bytes(b"\x7fELF")
+    assert cache.get("k") is None
+    assert cache.put("k", {"exit_code": 0}, str(src))
+    dst = tmp_path / "copy"
+    assert cache.get("k", str(dst)) == {"exit_code": 0}
+    assert dst.read_bytes() == b"\x7fELF"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["stores"], stats["entries"]) == (1, 1, 1, 1)
+    assert stats["bytes"] == os.path.getsize(cache._paths("k")[0]) + 4
+
+
+def test_evicts_least_recently_used_by_entries(cache_root):
+    cache = judge_cache.DiskLRUCache("t", 1 << 20, 10)
+    for i in range(10):
+        put(cache, "k{}".format(i), when=1000 + i)
+    # k0 最近被访问过，不应被淘汰
+    cache.get("k0")
+    put(cache, "k10")
+    # 超出限制时淘汰到限制的 EVICT_LOW_WATER 以下
+    assert keys(cache) == ["k0", "k10"] + ["k{}".format(i) for i in range(3, 10)]
+    assert cache.stats()["entries"] == 9
+    assert cache.stats()["evictions"] == 2
+
+
+def test_evicts_by_bytes(cache_root):
+    cache = judge_cache.DiskLRUCache("t", 1000, 100)
+    for i in range(10):
+        put(cache, "k{}".format(i), when=1000 + i)
+    assert cache.stats()["bytes"] == 1000
+    put(cache, "k10", size=300)
+    assert keys(cache) == ["k10"] + ["k{}".format(i) for i in range(4, 10)]
+    assert cache.stats()["bytes"] == 900
+
+
+def test_overwrite_does_not_double_count(cache_root):
+    cache = judge_cache.DiskLRUCache("t", 1000, 100)
+    for _ in range(20):
+        put(cache, "k", size=100)
+    assert cache.stats()["bytes"] == 100
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["evictions"] == 0
+
+
+def test_limit_holds_across_instances(cache_root):
+    """各判题进程各有一个实例：其他实例写入的条目也计入容量，超出时统一按访问时间淘汰"""
+    a = judge_cache.DiskLRUCache("t", 1000, 100)
+    b = judge_cache.DiskLRUCache("t", 1000, 100)
+    for i in range(8):
+        put(a if i % 2 else b, "k{}".format(i), when=1000 + i)
+    put(a, "k8", when=1008)
+    put(b, "k9", when=1009)
+    assert len(keys(a)) == 10
+    put(a, "k10")
+    assert keys(a) == ["k10"] + ["k{}".format(i) for i in range(2, 10)]
+    assert a.stats()["bytes"] == b.stats()["bytes"] == 900
+    assert a.stats()["evictions"] == 2
+
+
+def test_startup_rescans_existing_entries(cache_root):
+    cache = judge_cache.DiskLRUCache("t", 1 << 20, 100)
+    for i in range(5):
+        put(cache, "k{}".format(i), when=1000 + i)
+    os.remove(os.path.join(cache.root, ".usage"))
+    # 重启时按新的限制淘汰
+    restarted = judge_cache.DiskLRUCache("t", 1 << 20, 3)
+    assert keys(restarted) == ["k3", "k4"]
+    assert restarted.stats()["entries"] == 2
+
+
+def test_missing_usage_file_is_rebuilt(cache_root):
+    cache = judge_cache.DiskLRUCache("t", 1 << 20, 100)
+    put(cache, "k0")
+    os.remove(os.path.join(cache.root, ".usage"))
+    assert cache.stats()["entries"] == 0
+    put(cache, "k1")
+    assert cache.stats()["entries"] == 2
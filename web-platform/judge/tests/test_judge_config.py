@@ -0,0 +1,112 @@
+"""judge_config：judge_configs 行转换为题目配置、配置校验，以及校验失败的行不生效"""
+
+import os
+
+import pytest
+
+import judge_config
+from judge_config import row_to_config, validate_config, build_index
+
+BASE = {"type": "compile_run", "filename": "hello.c", "expected_output": "Hello\n", "time_limit_ms": 2000}
+GRADERS = {"code1_grader", "cards_grader"}
+
+
+def test_null_columns_keep_builtin_config():
+    row = {"problem_id": "p", "config": None, "main_file": None, "expected_output": None,
+           "test_cases": None, "compile_cmd": None, "time_limit_ms": None, "memory_limit_mb": None}
+    assert row_to_config(row, BASE) == BASE
+
+
+def test_columns_override_builtin_config():
+    row = {"config": '{"compare": "token"}', "main_file": "main.c", "expected_output": "Hi\\n",
+           "time_limit_ms": 5000, "memory_limit_mb": 256}
+    config = row_to_config(row, BASE)
+    assert config == dict(BASE, compare="token", filename="main.c", expected_output="Hi\n",
+                          time_limit_ms=5000, memory_limit_mb=256)
+    # 内置配置不被修改
+    assert BASE["time_limit_ms"] == 2000
+
+
+def test_prisma_field_names():
+    config = row_to_config({"mainFile": "a.c", "timeLimitMs": 3000, "testCases": '[{"args": "1"}]'}, BASE)
+    assert config["filename"] == "a.c"
+    assert config["time_limit_ms"] == 3000
+    assert config["test_cases"] == [{"args": "1"}]
+
+
+def test_empty_test_cases_do_not_override():
+    base = dict(BASE, test_cases=[{"args": "1"}])
+    assert row_to_config({"test_cases": "[]"}, base)["test_cases"] == [{"args": "1"}]
+
+
+def test_main_file_by_problem_type():
+    assert row_to_config({"main_file": "answer.txt"}, {"type": "reading"})["answer_file"] == "answer.txt"
+    multi = {"type": "code_with_grader", "grader": "cards_grader", "filenames": ["a.c", "b.c"]}
+    assert "filename" not in row_to_config({"main_file": "a.c"}, multi)
+
+
+def test_expected_output_of_text_problem():
+    config = row_to_config({"expected_output": "a\\tb\\\\n"}, {"type": "text_exact", "filename": "a.txt"})
+    assert config["expected"] == "a\tb\\n"
+    assert "expected_output" not in config
+
+
+def test_grader_code_column_is_ignored():
+    assert "grader_code" not in row_to_config({"grader_code": "int main() {}"}, BASE)
+
+
+def test_valid_config():
+    assert validate_config(BASE) == []
+    assert validate_config({"type": "code_with_grader", "grader": "code1_grader", "filename": "a.c"}, GRADERS) == []
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"type": "nope"}, "未知题型: 'nope'"),
+    ({"type": "compile_run", "filename": "a.c"}, "缺少字段: expected_output"),
+    ({"type": "code_with_grader", "grader": "x", "filename": "a.c"}, "未知评测程序: 'x'"),
+    ({"type": "code_with_grader", "grader": "code1_grader"}, "缺少字段: filename / filenames"),
+    (dict(BASE, compare="fuzzy"), "未知比较方式: 'fuzzy'"),
+    (dict(BASE, policy=[]), "policy 应为对象"),
+    (dict(BASE, time_limit_ms=50), "time_limit_ms 应为 100 到 60000 之间的整数: 50"),
+    (dict(BASE, time_limit_ms="5000"), "time_limit_ms 应为 100 到 60000 之间的整数: '5000'"),
+    (dict(BASE, memory_limit_mb=True), "memory_limit_mb 应为 16 到 4096 之间的整数: True"),
+    (dict(BASE, test_cases={}), "test_cases 应为数组"),
+    ({"type": "io_test", "filename": "a.c", "test_cases": [{"input": "1"}]}, "测试 1 缺少 expected"),
+    ({"type": "link_object", "compile_cmd": "gcc", "test_cases": ["x"]}, "测试 1 应为对象"),
+])
+def test_invalid_config(config, message):
+    assert message in validate_config(config, GRADERS)
+
+
+def test_invalid_row_keeps_previous_config():
+    builtin = {"p": BASE}
+    previous = build_index(builtin, [{"problem_id": "p", "time_limit_ms": 3000}])
+    assert previous.errors == []
+    assert previous.time_limits["p"] == 3.0
+
+    index = build_index(builtin, [{"problem_id": "p", "time_limit_ms": 10}, {"time_limit_ms": 1}], previous=previous)
+    assert index.configs["p"]["time_limit_ms"] == 3000
+    assert index.errors == ["p: time_limit_ms 应为 100 到 60000 之间的整数: 10", "缺少 problem_id 的行"]
+
+
+def test_grader_suffix_is_optional():
+    row = {"problem_id": "p", "config": '{"type": "code_with_grader", "grader": "code1", "filename": "a.c"}'}
+    index = build_index({}, [row], graders=GRADERS)
+    assert index.errors == []
+    assert index.configs["p"]["grader"] == "code1_grader"
+
+
+def test_limits_from_config():
+    index = build_index({"p": dict(BASE, time_limit_ms=2500, memory_limit_mb=128)})
+    assert index.time_limits["p"] == 2.5
+    assert index.limits["p"]["memory_mb"] == 128
+    assert index.limits["p"]["cpu_seconds"] >= 4
+
+
+def test_seed_rows_do_not_change_builtin_configs():
+    """database/init.sql 插入的行导出为快照后与内置配置一致"""
+    import run_job
+    seed = os.path.join(os.path.dirname(__file__), "..", "..", "database", "init.sql")
+    rows = judge_config.read_seed_rows(seed)
+    assert rows
+    assert judge_config.snapshot_changes(run_job.PROBLEM_CONFIG, rows, graders=run_job.GRADERS) == []
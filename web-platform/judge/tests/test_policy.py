@@ -0,0 +1,125 @@
+"""run_job.TestRunPolicy / run_test_cases：提前停止的条件、总时间预算和并发运行时的结果顺序"""
+
+import threading
+
+import pytest
+
+import run_job
+
+
+def make_policy(total, **policy):
+    policy.setdefault("parallel", 1)
+    return run_job.TestRunPolicy({"policy": policy}, total)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的 time.time()"""
+    now = [1000.0]
+    monkeypatch.setattr(run_job.time, "time", lambda: now[0])
+    return now
+
+
+def test_run_all_never_stops_on_failure():
+    policy = make_policy(3)
+    for _ in range(2):
+        policy.record(False)
+        assert not policy.should_stop()
+    assert policy.stop_logs() == []
+
+
+def test_fail_fast_stops_after_first_failure():
+    policy = make_policy(3, mode=run_job.POLICY_FAIL_FAST)
+    policy.record(True)
+    assert not policy.should_stop()
+    policy.record(False)
+    assert policy.should_stop()
+    assert policy.stop_logs() == ["已停止判题（测试失败），跳过剩余 1 个测试"]
+
+
+def test_last_test_never_sets_stop_reason():
+    """最后一个测试失败时没有可跳过的测试，不算提前停止"""
+    policy = make_policy(1, mode=run_job.POLICY_FAIL_FAST)
+    policy.record(False)
+    assert not policy.should_stop()
+    assert not policy.unstable()
+
+
+def test_max_timeouts():
+    policy = make_policy(5, max_timeouts=2)
+    policy.record(False, timed_out=True)
+    assert not policy.should_stop()
+    policy.record(True)
+    policy.record(False, timed_out=True)
+    assert policy.should_stop()
+    assert policy.stop_reason == "已超时 2 次"
+    assert policy.stop_logs() == ["已停止判题（已超时 2 次），跳过剩余 2 个测试"]
+
+
+def test_max_timeouts_zero_is_unlimited():
+    policy = make_policy(10)
+    for _ in range(9):
+        policy.record(False, timed_out=True)
+    assert not policy.should_stop()
+    assert policy.unstable()
+
+
+def test_wall_budget_caps_timeout(clock):
+    policy = make_policy(3, wall_budget=5)
+    assert policy.timeout(2) == 2
+    clock[0] += 4
+    assert policy.timeout(2) == pytest.approx(1)
+    clock[0] += 0.99
+    # 剩余时间很少时仍给测试一个最小超时
+    assert policy.timeout(2) == 0.1
+
+
+def test_wall_budget_stops(clock):
+    policy = make_policy(3, wall_budget=5)
+    policy.record(True)
+    assert not policy.should_stop()
+    clock[0] += 5
+    assert policy.out_of_time()
+    policy.record(True)
+    assert policy.stop_reason == "超出总运行时间预算"
+
+
+def test_no_wall_budget(clock):
+    policy = make_policy(3)
+    clock[0] += 10 ** 6
+    assert policy.timeout(3) == 3
+    assert not policy.out_of_time()
+
+
+def test_finish_marks_unstable_verdict():
+    ctx = {}
+    policy = make_policy(2)
+    policy.record(True)
+    policy.record(True)
+    assert policy.finish(ctx) == []
+    assert "verdict_unstable" not in ctx
+
+    policy = make_policy(2, max_timeouts=1)
+    policy.record(False, timed_out=True)
+    assert policy.finish(ctx) == ["已停止判题（已超时 1 次），跳过剩余 1 个测试"]
+    assert ctx["verdict_unstable"]
+
+
+@pytest.mark.parametrize("parallel", [1, 3])
+def test_run_test_cases_in_order_and_stops(parallel):
+    policy = make_policy(6, mode=run_job.POLICY_FAIL_FAST, parallel=parallel)
+    started = []
+    lock = threading.Lock()
+
+    def run_case(i, case):
+        with lock:
+            started.append(i)
+        return case
+
+    results = []
+    for i, case, passed in run_job.run_test_cases(policy, [True, True, False, True, True, True], run_case):
+        results.append(i)
+        policy.record(passed)
+    assert results == [0, 1, 2]
+    # 并发运行时最多提前开始 parallel - 1 个测试
+    assert len(started) <= 3 + parallel - 1
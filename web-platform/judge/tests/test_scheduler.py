@@ -0,0 +1,31 @@
+"""scheduler.JudgeScheduler.cache_stats：汇总各工作进程的缓存统计，进程池重建后计数器不减少"""
+
+import scheduler
+
+
+def snapshot(hits, entries=5):
+    return {"enabled": True, "compile": {"hits": hits, "misses": 1, "stores": 1, "errors": 0, "evictions": 0,
+                                         "entries": entries, "bytes": 10 * entries, "max_bytes": 1000, "hit_rate": 0.5}}
+
+
+def test_counters_are_summed_and_gauges_are_not():
+    judge = scheduler.JudgeScheduler()
+    judge.worker_cache_stats[("compile", 1)] = snapshot(3, entries=5)
+    judge.worker_cache_stats[("exec", 2)] = snapshot(4, entries=6)
+    stats = judge.cache_stats()["compile"]
+    assert (stats["hits"], stats["misses"]) == (7, 2)
+    assert (stats["entries"], stats["bytes"]) == (6, 60)
+    assert stats["hit_rate"] == round(7 / 9, 4)
+
+
+def test_counters_survive_executor_reset():
+    judge = scheduler.JudgeScheduler()
+    judge.worker_cache_stats[("compile", 1)] = snapshot(3)
+    judge.worker_cache_stats[("exec", 2)] = snapshot(4)
+    judge._reset_executor("compile")
+    assert judge.cache_stats()["compile"]["hits"] == 7
+    # 其他阶段的工作进程不受影响，新进程的计数器在已退出进程的合计上继续累加
+    assert ("exec", 2) in judge.worker_cache_stats
+    judge.worker_cache_stats[("compile", 3)] = snapshot(1)
+    assert judge.cache_stats()["compile"]["hits"] == 8
+    assert "judge_cache_hits_total{cache=\"compile\"} 8" in judge.prometheus_metrics()
@@ -0,0 +1,87 @@
+"""run_job.split_output_blocks / evaluate_test_lines：test-eval 一次运行多行测试时输出与测试行的对应"""
+
+import stat
+
+import pytest
+
+import run_job
+from run_job import split_output_blocks
+
+SEPARATOR = "----"
+
+# 模拟 test-eval：每行输出一个以分隔行结尾的结果块；"bad" 行只输出错误信息（没有分隔行），
+# "crash" 行使程序异常退出
+EVAL_SCRIPT = """#!/bin/sh
+while IFS= read -r line; do
+  case "$line" in
+    bad) echo "Invalid input line" ;;
+    crash) echo "partial"; exit 3 ;;
+    *) echo "out:$line"; echo "----" ;;
+  esac
+done < "$1"
+"""
+
+
+def test_split_output_blocks():
+    blocks, rest = split_output_blocks("a\n----\nb\nc\n----\ntail", SEPARATOR)
+    assert blocks == ["a\n----\n", "b\nc\n----\n"]
+    assert rest == "tail"
+
+
+def test_split_output_blocks_separator_with_spaces():
+    blocks, rest = split_output_blocks("a\n  ----  \n", SEPARATOR)
+    assert blocks == ["a\n  ----  \n"]
+    assert rest == ""
+
+
+def test_split_output_blocks_empty():
+    assert split_output_blocks("", SEPARATOR) == ([], "")
+
+
+@pytest.fixture
+def program(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_job, "get_oracle_cache", lambda: None)
+    path = tmp_path / "test-eval"
+    path.write_text(EVAL_SCRIPT)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def make_policy(total=1):
+    return run_job.TestRunPolicy({"policy": {"parallel": 1}}, total)
+
+
+def test_evaluate_lines_in_one_run(program, tmp_path):
+    outputs, failed = run_job.evaluate_test_lines(program, ["1", "2", "3"], str(tmp_path), SEPARATOR, make_policy())
+    assert outputs == {line: "out:{}\n----\n".format(line) for line in ("1", "2", "3")}
+    assert failed == set()
+
+
+def test_line_without_separator_falls_back_to_single_runs(program, tmp_path):
+    """某一行没有输出分隔行时切分不可靠，各行单独运行，输出仍与各自的行对应"""
+    outputs, failed = run_job.evaluate_test_lines(program, ["1", "bad", "3"], str(tmp_path), SEPARATOR, make_policy())
+    assert outputs == {"1": "out:1\n----\n", "bad": "Invalid input line\n", "3": "out:3\n----\n"}
+    assert failed == set()
+
+
+def test_crashing_line_is_marked_failed(program, tmp_path):
+    outputs, failed = run_job.evaluate_test_lines(program, ["1", "crash", "3"], str(tmp_path), SEPARATOR, make_policy())
+    assert outputs["1"] == "out:1\n----\n"
+    assert outputs["3"] == "out:3\n----\n"
+    assert outputs["crash"] == "partial\n[退出码 3]\n"
+    assert failed == {"crash"}
+
+
+def test_cached_lines_are_not_rerun(program, tmp_path, monkeypatch):
+    import judge_cache
+    monkeypatch.setattr(judge_cache, "CACHE_ROOT", str(tmp_path / "cache"))
+    cache = judge_cache.OracleCache("oracle", 1 << 20, 100)
+    monkeypatch.setattr(run_job, "get_oracle_cache", lambda: cache)
+    first = run_job.evaluate_test_lines(program, ["1", "2"], str(tmp_path), SEPARATOR, make_policy())
+    assert cache.stats()["stores"] == 2
+
+    def run_command(*args, **kwargs):
+        raise AssertionError("cached line was run again")
+
+    monkeypatch.setattr(run_job, "run_command", run_command)
+    assert run_job.evaluate_test_lines(program, ["2", "1"], str(tmp_path), SEPARATOR, make_policy()) == first
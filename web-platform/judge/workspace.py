@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Judge Workspace - 判题工作空间
+用符号链接把只读的题目资源映射到每个提交的工作目录，不再逐个复制资源文件；
+学生程序可以写入的文件（不在只读文件系统上）仍然复制，学生程序打开资源文件写入时不会修改资源目录或模板
+学生提交的文件和判题生成的文件总是先删除链接再写入
+每道题可以预先生成模板目录（资源 + 评测程序源码 + 预编译目标文件），提交的工作空间从模板生成
+"""
+
+import os
+import re
+import glob
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+from judge_cache import tree_fingerprint
+
+# ============================================================
+# 工作空间配置 (Workspace Configuration)
+# ============================================================
+
+# 资源文件的映射方式：
+#   link     只读文件系统上的文件（如 docker 中 :ro 挂载的 /resources）使用符号链接，其余文件复制
+#   symlink  全部使用符号链接（仅适用于学生程序无权写入资源目录的部署，如沙箱以其他用户运行）
+#   copy     完整复制（与旧版 cp -r 行为一致）
+# 不使用硬链接：工作空间中的硬链接与资源文件是同一个 inode，学生程序以写方式打开就会改坏资源和模板
+WORKSPACE_MODE = os.environ.get("JUDGE_WORKSPACE_MODE", "link")
+WORKSPACE_MODES = ("link", "symlink", "copy")
+
+# 题目模板目录；模板按内容版本命名，资源变化后生成新版本，旧版本在没有判题使用后删除
+TEMPLATE_ROOT = os.environ.get("JUDGE_TEMPLATE_DIR", "/tmp/judge_templates")
+TEMPLATES_ENABLED = os.environ.get("JUDGE_TEMPLATES", "1") != "0"
+# 模板租约的有效期（秒）：判题进程异常退出、没有释放租约时，超过有效期的租约视为失效
+TEMPLATE_LEASE_SECONDS = 3600
+
+
+# 各文件系统（st_dev）是否只读
+_read_only_devices = {}
+
+
+def is_read_only(path):
+    """path 所在的文件系统是否以只读方式挂载（以写方式打开其中的文件会失败，root 也不例外）"""
+    dev = os.stat(path).st_dev
+    if dev not in _read_only_devices:
+        _read_only_devices[dev] = bool(os.statvfs(path).f_flag & os.ST_RDONLY)
+    return _read_only_devices[dev]
+
+
+def materialize_tree(src_dir, dst_dir, mode=WORKSPACE_MODE):
+    """
+    在 dst_dir 下重建 src_dir（dst_dir 不能已存在）
+    目录总是新建的真实目录，判题过程中新生成的文件留在工作空间内；
+    文件按 mode 链接到资源（符号链接指向最终的真实文件）或复制，
+    link 模式下资源在只读文件系统上时耗时与文件数量有关而与文件大小无关
+    """
+    if mode not in WORKSPACE_MODES:
+        raise ValueError("Unknown workspace mode: {}".format(mode))
+    if mode == "copy":
+        shutil.copytree(src_dir, dst_dir)
+        return
+
+    src_dir = os.path.realpath(src_dir)
+    os.makedirs(dst_dir)
+    for root, dirs, files in os.walk(src_dir, followlinks=True):
+        rel = os.path.relpath(root, src_dir)
+        target_root = dst_dir if rel == "." else os.path.join(dst_dir, rel)
+        for name in dirs:
+            os.makedirs(os.path.join(target_root, name), exist_ok=True)
+        for name in files:
+            src = os.path.realpath(os.path.join(root, name))
+            dst = os.path.join(target_root, name)
+            if mode == "symlink" or is_read_only(src):
+                os.symlink(src, dst)
+            else:
+                shutil.copy2(src, dst)
+
+
+def unlink_existing(path):
+    """删除已存在的文件或链接，之后的写入不会穿过链接修改资源文件"""
+    if os.path.islink(path) or os.path.isfile(path):
+        os.remove(path)
+
+
+def replace_file(src, dst):
+    """用 src 的副本替换 dst（dst 为资源链接时只删除链接本身）"""
+    unlink_existing(dst)
+    shutil.copy2(src, dst)
+
+
+# ============================================================
+# 题目模板 (Problem Templates)
+# ============================================================
+
+def lease_template(path):
+    """
+    登记一个正在使用模板 path 的判题（在模板目录旁创建租约文件），返回租约文件路径
+    有租约的旧版本模板不会被删除；判题结束后调用 release_template 释放
+    """
+    lease = "{}.lease-{}".format(path, uuid.uuid4().hex)
+    with open(lease, "w"):
+        pass
+    return lease
+
+
+def release_template(lease):
+    """释放模板租约（租约文件已不存在时忽略）"""
+    try:
+        os.remove(lease)
+    except OSError:
+        pass
+
+
+def _live_leases(path, now):
+    """模板 path 仍在有效期内的租约数，顺带删除已失效的租约"""
+    count = 0
+    for lease in glob.glob(glob.escape(path) + ".lease-*"):
+        try:
+            if now - os.path.getmtime(lease) < TEMPLATE_LEASE_SECONDS:
+                count += 1
+            else:
+                os.remove(lease)
+        except OSError:
+            pass
+    return count
+
+
+def _remove_stale_templates(problem_id, keep):
+    """
+    删除同一题目的旧版本模板，仍有判题持有租约（见 lease_template）的旧模板保留到租约全部释放或失效
+    先把模板改名移走再检查一次租约：检查之后才登记的判题会发现模板不存在，改用资源目录
+    """
+    pattern = re.compile(r"^{}-[0-9a-f]{{16}}$".format(re.escape(problem_id)))
+    now = time.time()
+    for name in os.listdir(TEMPLATE_ROOT):
+        path = os.path.join(TEMPLATE_ROOT, name)
+        if not pattern.match(name) or path == keep or _live_leases(path, now):
+            continue
+        removing = "{}.tmp-{}".format(path, uuid.uuid4().hex)
+        try:
+            os.rename(path, removing)
+        except OSError:
+            # 其他进程正在删除
+            continue
+        if _live_leases(path, now):
+            try:
+                os.rename(removing, path)
+                continue
+            except OSError:
+                # 同一版本已经重新生成
+                pass
+        shutil.rmtree(removing, ignore_errors=True)
+        if not os.path.isdir(path):
+            try:
+                os.remove(path + ".json")
+            except OSError:
+                pass
+
+
+def template_path(problem_id, src_dir, version):
+    """模板目录：目录名由资源目录指纹和 version 决定"""
+    stamp = hashlib.sha256((version + "\0" + tree_fingerprint(src_dir)).encode()).hexdigest()[:16]
+    return os.path.join(TEMPLATE_ROOT, "{}-{}".format(problem_id, stamp))
+
+
+def find_template(problem_id, src_dir, version):
+    """只查找已生成的模板，返回 (模板目录, 清单)；模板尚未生成时返回 (None, {})，不会现场生成"""
+    path = template_path(problem_id, src_dir, version)
+    try:
+        with open(path + ".json", "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, {}
+    if not os.path.isdir(path):
+        return None, {}
+    return path, manifest
+
+
+def get_template(problem_id, src_dir, version, build=None):
+    """
+    返回 (模板目录, 清单)
+    模板目录名由资源目录指纹和 version 决定，资源变化后自动生成新模板
+    build(template_dir) 在模板中生成额外文件并返回清单（写入模板目录旁的 .json 文件）
+    多个工作进程同时生成时先完成者生效，其余丢弃自己的结果
+    """
+    path = template_path(problem_id, src_dir, version)
+    manifest_path = path + ".json"
+
+    if not os.path.isdir(path):
+        os.makedirs(TEMPLATE_ROOT, exist_ok=True)
+        tmp_path = "{}.tmp-{}".format(path, uuid.uuid4().hex)
+        try:
+            materialize_tree(src_dir, tmp_path)
+            manifest = build(tmp_path) if build is not None else {}
+            with open(tmp_path + ".json", "w") as f:
+                json.dump(manifest, f)
+            if not os.path.isdir(path):
+                os.replace(tmp_path + ".json", manifest_path)
+                os.rename(tmp_path, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if os.path.exists(tmp_path + ".json"):
+                os.remove(tmp_path + ".json")
+        _remove_stale_templates(problem_id, path)
+
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    return path, manifest
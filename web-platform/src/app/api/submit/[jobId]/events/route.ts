@@ -0,0 +1,37 @@
+import { NextRequest, NextResponse } from "next/server";
+import { openJudgeJobEvents } from "@/lib/judge-client";
+import { getAuthorizedJudgeJob } from "@/lib/judge-jobs";
+
+interface RouteParams {
+  params: Promise<{ jobId: string }>;
+}
+
+/**
+ * GET /api/submit/[jobId]/events
+ * 转发判题服务的进度事件流（Server-Sent Events），只有提交者本人可以订阅
+ */
+export async function GET(request: NextRequest, { params }: RouteParams) {
+  try {
+    const { jobId } = await params;
+    const found = await getAuthorizedJudgeJob(jobId, 0);
+    if ("response" in found) {
+      return found.response;
+    }
+    const upstream = await openJudgeJobEvents(jobId, request.signal);
+
+    if (!upstream.ok || !upstream.body) {
+      return NextResponse.json({ error: "Judge job not found" }, { status: upstream.status || 502 });
+    }
+
+    return new Response(upstream.body, {
+      headers: {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        Connection: "keep-alive",
+      },
+    });
+  } catch (error) {
+    console.error("Failed to open judge event stream:", error);
+    return NextResponse.json({ error: "Internal server error" }, { status: 500 });
+  }
+}
@@ -0,0 +1,50 @@
+import { NextRequest, NextResponse } from "next/server";
+import { cancelJudgeJob } from "@/lib/judge-client";
+import { getAuthorizedJudgeJob } from "@/lib/judge-jobs";
+
+interface RouteParams {
+  params: Promise<{ jobId: string }>;
+}
+
+/**
+ * GET /api/submit/[jobId]
+ * 查询异步判题结果（长轮询）；只有提交者本人可以查询，提交记录由提交时启动的后台任务更新
+ */
+export async function GET(request: NextRequest, { params }: RouteParams) {
+  try {
+    const { jobId } = await params;
+    const found = await getAuthorizedJudgeJob(jobId);
+    if ("response" in found) {
+      return found.response;
+    }
+    const job = found.job;
+
+    if (job.state === "pending" || job.state === "running" || !job.result) {
+      return NextResponse.json({ status: "pending", jobId, score: 0, logs: ["正在判题..."] });
+    }
+
+    return NextResponse.json(job.result);
+  } catch (error) {
+    console.error("Failed to fetch judge job:", error);
+    return NextResponse.json({ error: "Internal server error" }, { status: 500 });
+  }
+}
+
+/**
+ * DELETE /api/submit/[jobId]
+ * 取消判题任务（例如看到第一个失败的测试后不再等待）
+ */
+export async function DELETE(request: NextRequest, { params }: RouteParams) {
+  try {
+    const { jobId } = await params;
+    const found = await getAuthorizedJudgeJob(jobId, 0);
+    if ("response" in found) {
+      return found.response;
+    }
+    const cancelled = await cancelJudgeJob(jobId);
+    return NextResponse.json({ jobId, cancelled });
+  } catch (error) {
+    console.error("Failed to cancel judge job:", error);
+    return NextResponse.json({ error: "Internal server error" }, { status: 500 });
+  }
+}
@@ -4,9 +4,8 @@ import path from "path";
 import { getProblemById, createSubmission, updateSubmissionResult } from "@/lib/problem-service";
 import { getEditableFilenames, getProblemKind, getQuizProblem } from "@/lib/problems";
 import { getSession } from "@/lib/auth";
-
-// 判题服务地址（docker-compose 服务）
-const JUDGE_SERVICE_URL = process.env.JUDGE_SERVICE_URL || "http://localhost:9090";
+import { submitJudgeJob } from "@/lib/judge-client";
+import { isDatabaseSubmission, recordJudgeJobResult } from "@/lib/judge-jobs";
 
 // 是否使用 Docker 服务（开发模式可以关闭）
 const USE_DOCKER_SERVICE = process.env.USE_DOCKER_SERVICE !== "false";
@@ -178,7 +177,19 @@ export async function POST(req: NextRequest) {
     // 4. 调用判题服务
     let result;
     if (USE_DOCKER_SERVICE) {
-      result = await callJudgeService(problemId, submissionId);
+      // 异步判题：提交任务后立即返回 jobId，前端轮询 /api/submit/[jobId] 获取结果
+      const job = await submitJudgeJob(problemId, submissionId);
+      if ("jobId" in job) {
+        // 提交记录由后台任务在判题结束时更新（前端关闭页面也不影响）
+        if (isDatabaseSubmission(submissionId)) {
+          void recordJudgeJobResult(job.jobId, submissionId);
+        }
+        return NextResponse.json(
+          { status: "pending", jobId: job.jobId, score: 0, logs: ["已提交，正在排队判题..."] },
+          { status: 202 },
+        );
+      }
+      result = job.result;
     } else {
       result = await localJudge(problemId, tmpDir);
     }
@@ -188,7 +199,7 @@ export async function POST(req: NextRequest) {
       // UUID 格式的 submissionId
       try {
         await updateSubmissionResult(submissionId, {
-          status: result.status as "accepted" | "wrong_answer" | "compile_error" | "runtime_error" | "time_limit_exceeded" | "system_error",
+          status: result.status as "accepted" | "wrong_answer" | "compile_error" | "runtime_error" | "time_limit_exceeded" | "output_limit_exceeded" | "system_error",
           score: result.score || 0,
           logs: result.logs || [],
         });
@@ -296,66 +307,6 @@ function handleQuizSubmission(problem: Awaited<ReturnType<typeof getProblemById>
   return NextResponse.json({ status: "wrong_answer", score: 0, logs });
 }
 
-/**
- * 调用 Docker 判题服务
- */
-async function callJudgeService(problemId: string, submissionId: string) {
-  try {
-    console.log(`[API] Calling judge service: ${JUDGE_SERVICE_URL}/judge`);
-
-    const response = await fetch(`${JUDGE_SERVICE_URL}/judge`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        problem_id: problemId,
-        submission_id: submissionId,
-      }),
-      signal: AbortSignal.timeout(60000),
-    });
-
-    if (!response.ok) {
-      const text = await response.text();
-      console.error(`[API] Judge service error: ${response.status} - ${text}`);
-      return {
-        status: "system_error",
-        score: 0,
-        logs: ["判题服务返回错误", `状态码: ${response.status}`, text],
-      };
-    }
-
-    return await response.json();
-  } catch (error) {
-    console.error("[API] Judge service call failed:", error);
-
-    if (error instanceof Error) {
-      if (error.message.includes("ECONNREFUSED") || error.message.includes("fetch failed")) {
-        return {
-          status: "system_error",
-          score: 0,
-          logs: [
-            "❌ 判题服务未启动",
-            "请运行以下命令启动判题服务：",
-            "cd web-platform && docker-compose up -d",
-          ],
-        };
-      }
-      if (error.name === "TimeoutError") {
-        return {
-          status: "time_limit_exceeded",
-          score: 0,
-          logs: ["判题超时（超过 60 秒）"],
-        };
-      }
-    }
-
-    return {
-      status: "system_error",
-      score: 0,
-      logs: ["判题服务调用失败", String(error)],
-    };
-  }
-}
-
 /**
  * 本地判题（开发模式）
  */
@@ -257,12 +257,43 @@ export default function IDEWorkspace({
         throw new Error("服务器返回了非预期的响应格式");
       }
 
-      const data = await res.json();
+      let data = await res.json();
 
       if (data.error) {
         throw new Error(data.error);
       }
 
+      // 异步判题：订阅进度事件（逐个显示测试结果），同时长轮询直到判题结束
+      if (data.status === "pending" && data.jobId) {
+        const progressLogs: string[] = [...(data.logs || [])];
+        setLogs([...progressLogs]);
+        const events = new EventSource(`/api/submit/${data.jobId}/events`);
+        events.addEventListener("progress", (e) => {
+          const event = JSON.parse((e as MessageEvent).data);
+          if (event.type === "compiled") {
+            progressLogs.push(event.ok ? "✓ 编译成功" : "✗ 编译失败");
+          } else if (event.message) {
+            progressLogs.push(event.message);
+          } else {
+            return;
+          }
+          setLogs([...progressLogs]);
+        });
+        events.addEventListener("verdict", () => events.close());
+
+        try {
+          while (data.status === "pending" && data.jobId) {
+            const pollRes = await fetch(`/api/submit/${data.jobId}`);
+            data = await pollRes.json();
+            if (data.error) {
+              throw new Error(data.error);
+            }
+          }
+        } finally {
+          events.close();
+        }
+      }
+
       setLogs(data.logs || []);
       setScore(data.score || 0);
 
@@ -0,0 +1,166 @@
+// ============================================================
+// 判题服务客户端（异步任务：提交 + 轮询 + 进度事件）
+// ============================================================
+
+// 判题服务地址（docker-compose 服务）
+const JUDGE_SERVICE_URL = process.env.JUDGE_SERVICE_URL || "http://localhost:9090";
+
+// 单次长轮询等待秒数（判题服务端上限 30 秒）
+const JOB_POLL_WAIT_SECONDS = 20;
+
+export type JudgeStatus =
+  | "accepted"
+  | "wrong_answer"
+  | "compile_error"
+  | "runtime_error"
+  | "time_limit_exceeded"
+  | "output_limit_exceeded"
+  | "system_error";
+
+export interface JudgeResult {
+  status: JudgeStatus;
+  score: number;
+  logs: string[];
+  metrics?: Record<string, unknown>;
+}
+
+export interface JudgeJob {
+  jobId: string;
+  submissionId: string;
+  state: "pending" | "running" | "finished" | "failed";
+  result: JudgeResult | null;
+}
+
+function systemError(...logs: string[]): JudgeResult {
+  return { status: "system_error", score: 0, logs };
+}
+
+/**
+ * 将调用判题服务时的异常转换为判题结果
+ */
+function judgeServiceError(error: unknown): JudgeResult {
+  console.error("[Judge] Judge service call failed:", error);
+
+  if (error instanceof Error) {
+    if (error.message.includes("ECONNREFUSED") || error.message.includes("fetch failed")) {
+      return systemError(
+        "❌ 判题服务未启动",
+        "请运行以下命令启动判题服务：",
+        "cd web-platform && docker-compose up -d",
+      );
+    }
+    if (error.name === "TimeoutError") {
+      return systemError("判题服务响应超时，请稍后重试");
+    }
+  }
+
+  return systemError("判题服务调用失败", String(error));
+}
+
+/**
+ * 提交异步判题任务
+ * 成功时返回 jobId；服务繁忙或不可用时返回可直接展示的判题结果
+ */
+export async function submitJudgeJob(
+  problemId: string,
+  submissionId: string,
+): Promise<{ jobId: string } | { result: JudgeResult }> {
+  try {
+    console.log(`[Judge] Submitting job: ${JUDGE_SERVICE_URL}/jobs`);
+
+    const response = await fetch(`${JUDGE_SERVICE_URL}/jobs`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        problem_id: problemId,
+        submission_id: submissionId,
+      }),
+      signal: AbortSignal.timeout(10000),
+    });
+
+    // 判题队列已满：判题服务返回 503 + Retry-After
+    if (response.status === 503 || response.status === 429) {
+      const retryAfter = response.headers.get("Retry-After") || "5";
+      console.warn(`[Judge] Judge service busy, retry after ${retryAfter}s`);
+      return { result: systemError("判题服务繁忙，请稍后重试", `建议 ${retryAfter} 秒后重新提交`) };
+    }
+
+    if (!response.ok) {
+      const text = await response.text();
+      console.error(`[Judge] Judge service error: ${response.status} - ${text}`);
+      return { result: systemError("判题服务返回错误", `状态码: ${response.status}`, text) };
+    }
+
+    const data = await response.json();
+    return { jobId: data.job_id };
+  } catch (error) {
+    return { result: judgeServiceError(error) };
+  }
+}
+
+/**
+ * 查询判题任务（长轮询：任务未结束时服务端最多等待 wait 秒，wait 为 0 时立即返回）
+ */
+export async function getJudgeJob(jobId: string, wait = JOB_POLL_WAIT_SECONDS): Promise<JudgeJob | null> {
+  try {
+    const response = await fetch(
+      `${JUDGE_SERVICE_URL}/jobs/${encodeURIComponent(jobId)}?wait=${wait}`,
+      { signal: AbortSignal.timeout((wait + 10) * 1000) },
+    );
+
+    if (response.status === 404) {
+      return null;
+    }
+
+    if (!response.ok) {
+      const text = await response.text();
+      console.error(`[Judge] Job query error: ${response.status} - ${text}`);
+      return {
+        jobId,
+        submissionId: "",
+        state: "failed",
+        result: systemError("判题服务返回错误", `状态码: ${response.status}`, text),
+      };
+    }
+
+    const data = await response.json();
+    return {
+      jobId: data.job_id,
+      submissionId: String(data.submission_id),
+      state: data.state,
+      result: data.result,
+    };
+  } catch (error) {
+    return { jobId, submissionId: "", state: "failed", result: judgeServiceError(error) };
+  }
+}
+
+/**
+ * 打开判题进度事件流（SSE），返回判题服务的原始响应
+ */
+export async function openJudgeJobEvents(jobId: string, signal?: AbortSignal): Promise<Response> {
+  return fetch(`${JUDGE_SERVICE_URL}/jobs/${encodeURIComponent(jobId)}/events`, {
+    headers: { Accept: "text/event-stream" },
+    signal,
+  });
+}
+
+/**
+ * 取消判题任务
+ */
+export async function cancelJudgeJob(jobId: string): Promise<boolean> {
+  try {
+    const response = await fetch(`${JUDGE_SERVICE_URL}/jobs/${encodeURIComponent(jobId)}`, {
+      method: "DELETE",
+      signal: AbortSignal.timeout(10000),
+    });
+    if (!response.ok) {
+      return false;
+    }
+    const data = await response.json();
+    return Boolean(data.cancelled);
+  } catch (error) {
+    console.error("[Judge] Failed to cancel job:", error);
+    return false;
+  }
+}
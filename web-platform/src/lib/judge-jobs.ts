@@ -0,0 +1,103 @@
+// ============================================================
+// 判题任务与提交记录（访问权限校验、判题结束后写回提交记录）
+// ============================================================
+
+import { NextResponse } from "next/server";
+import { getSession } from "@/lib/auth";
+import { getSubmissionOwnerId, updateSubmissionResult } from "@/lib/problem-service";
+import { getJudgeJob, type JudgeJob, type JudgeResult } from "@/lib/judge-client";
+
+// 是否使用数据库（如果数据库未就绪可以临时关闭）
+const USE_DATABASE = process.env.USE_DATABASE !== "false";
+
+// 后台等待判题结束的最长时间（秒），超过后提交记录标记为系统错误
+const JOB_RECORD_TIMEOUT_SECONDS = 600;
+
+// 判题服务暂时不可用时的重试间隔（毫秒）
+const JOB_RECORD_RETRY_MS = 2000;
+
+/**
+ * 是否为数据库中的提交记录（UUID 格式；未登录或数据库不可用时提交 ID 为时间戳）
+ */
+export function isDatabaseSubmission(submissionId: string): boolean {
+  return USE_DATABASE && submissionId.length > 20;
+}
+
+/**
+ * 校验当前用户能否访问判题任务，允许时返回 null，否则返回错误响应
+ * 有提交记录的任务只有提交者本人可以访问；匿名提交没有提交记录，只能凭随机生成的 jobId 访问
+ */
+export async function authorizeJudgeJob(job: JudgeJob): Promise<NextResponse | null> {
+  if (!isDatabaseSubmission(job.submissionId)) {
+    return null;
+  }
+
+  const session = await getSession();
+  if (!session?.user?.id) {
+    return NextResponse.json({ error: "未登录" }, { status: 401 });
+  }
+
+  const ownerId = await getSubmissionOwnerId(job.submissionId);
+  if (ownerId !== session.user.id) {
+    // 不区分任务不存在和无权访问，避免泄露其他用户的任务
+    return NextResponse.json({ error: "Judge job not found" }, { status: 404 });
+  }
+  return null;
+}
+
+/**
+ * 查询判题任务并校验访问权限，返回任务或错误响应
+ */
+export async function getAuthorizedJudgeJob(
+  jobId: string,
+  wait?: number,
+): Promise<{ job: JudgeJob } | { response: NextResponse }> {
+  const job = await getJudgeJob(jobId, wait);
+  if (!job) {
+    return { response: NextResponse.json({ error: "Judge job not found" }, { status: 404 }) };
+  }
+  const denied = await authorizeJudgeJob(job);
+  if (denied) {
+    return { response: denied };
+  }
+  return { job };
+}
+
+/**
+ * 在后台等待判题任务结束并写回提交记录（提交时启动，不依赖前端轮询）
+ */
+export async function recordJudgeJobResult(jobId: string, submissionId: string): Promise<void> {
+  const deadline = Date.now() + JOB_RECORD_TIMEOUT_SECONDS * 1000;
+  let result: JudgeResult = {
+    status: "system_error",
+    score: 0,
+    logs: ["判题超时，请重新提交"],
+  };
+
+  while (Date.now() < deadline) {
+    const job = await getJudgeJob(jobId);
+    if (!job) {
+      result = { status: "system_error", score: 0, logs: ["判题任务不存在"] };
+      break;
+    }
+    if (!job.submissionId) {
+      // 判题服务暂时无法访问（不是任务本身失败），稍后重试
+      await new Promise((resolve) => setTimeout(resolve, JOB_RECORD_RETRY_MS));
+      continue;
+    }
+    if (job.state !== "pending" && job.state !== "running" && job.result) {
+      result = job.result;
+      break;
+    }
+  }
+
+  try {
+    await updateSubmissionResult(submissionId, {
+      status: result.status,
+      score: result.score || 0,
+      logs: result.logs || [],
+    });
+  } catch (e) {
+    console.warn("[API] Failed to update submission record:", e);
+  }
+}
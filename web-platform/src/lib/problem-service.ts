@@ -253,7 +253,7 @@ export async function createSubmission(data: {
 export async function updateSubmissionResult(
   id: string,
   result: {
-    status: "accepted" | "wrong_answer" | "compile_error" | "runtime_error" | "time_limit_exceeded" | "system_error";
+    status: "accepted" | "wrong_answer" | "compile_error" | "runtime_error" | "time_limit_exceeded" | "output_limit_exceeded" | "system_error";
     score: number;
     logs: string[];
     compileTimeMs?: number;
@@ -275,6 +275,17 @@ export async function updateSubmissionResult(
   });
 }
 
+/**
+ * 获取提交记录的所属用户，记录不存在时返回 null
+ */
+export async function getSubmissionOwnerId(id: string): Promise<string | null> {
+  const submission = await prisma.submission.findUnique({
+    where: { id },
+    select: { userId: true },
+  });
+  return submission?.userId ?? null;
+}
+
 /**
  * 获取题目提交历史
  */